@@ -1,31 +1,303 @@
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
 import yaml
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+from config import POLICY_PATH, load_policy_config
+from policy_compiler import MEMBER, PROJECT_MEMBER, ROLE_BITS, compile_policy_config
+from policy_layer import ProjectPolicy, TaskPolicy, UserPolicy
+
+# Code generation from websubmit.yml / policy.yml through the Jinja
+# templates in templates/:
+#   generated_k9db.sql     K9db schema, rendered one table at a time
+#   generated_policies.rs  Sesame policy
+#   generated_policies.py  straight-line Python policy classes
+#
+# Runs are incremental. Each target records a hash of its inputs (source
+# files, template sources) in .codegen_cache/manifest.json and is skipped
+# when nothing changed; per-table schema fragments are cached by content
+# hash, so editing one table re-renders only that table; compiled templates
+# are cached on disk by Jinja's FileSystemBytecodeCache; and outputs whose
+# text did not change are not rewritten.
+#
+#   python Final.py
+#   python Final.py --jobs 4 --force
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(ROOT, ".codegen_cache")
+
+# policy_layer classes that generated_policies.py replaces, in output order
+PYTHON_POLICY_CLASSES = [TaskPolicy, UserPolicy, ProjectPolicy]
+
+SUBJECT_TABLE_TEMPLATE = "k9db_subject_table.j2"
+TABLE_TEMPLATE = "k9db_table.j2"
+
+
+def python_policy_specs(policy_config):
+    """
+    Template input for python_policies.j2: per policy class, its constructor
+    fields and, per purpose, which roles / the owner / project members are
+    allowed (from the compiled policy.yml decision table).
+    """
+    table = compile_policy_config(policy_config)
+    specs = []
+    for cls in PYTHON_POLICY_CLASSES:
+        params = list(inspect.signature(cls.__init__).parameters.values())[1:]
+        fields = [
+            {"name": p.name, "default": None if p.default is p.empty else repr(p.default)}
+            for p in params
+        ]
+        member_optional = any(f["name"] == cls.member_field and f["default"] == "None" for f in fields)
+        rules = []
+        for (category, purpose), mask in table.items():
+            if category != cls.category:
+                continue
+            rules.append({
+                "purpose": purpose,
+                "roles": [name for name, bit in ROLE_BITS.items() if mask & bit],
+                "owner": bool(mask & cls.owner_bits),
+                "member": bool(mask & (MEMBER | PROJECT_MEMBER)) and cls.member_field is not None,
+            })
+        specs.append({
+            "name": cls.__name__,
+            "category": cls.category,
+            "fields": fields,
+            "key_fields": cls.key_fields,
+            "owner_field": cls.owner_field,
+            "member_field": cls.member_field,
+            "member_optional": member_optional,
+            "rules": rules,
+        })
+    return specs
+
+
+def table_template(table: Dict[str, Any]) -> str:
+    return SUBJECT_TABLE_TEMPLATE if table.get("kind") == "data_subject" else TABLE_TEMPLATE
+
+
+def content_hash(*parts) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def make_env(templates_dir: str, cache_dir: Optional[str]) -> Environment:
+    """Jinja environment; with a cache_dir, compiled templates persist across runs."""
+    bytecode_cache = None
+    if cache_dir:
+        path = os.path.join(cache_dir, "jinja")
+        os.makedirs(path, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(path)
+    return Environment(loader=FileSystemLoader(templates_dir), bytecode_cache=bytecode_cache)
+
+
+# ---- parallel fragment rendering (worker processes) ----
+_worker_env: Optional[Environment] = None
+
+
+def _init_worker(templates_dir: str, cache_dir: Optional[str]):
+    global _worker_env
+    _worker_env = make_env(templates_dir, cache_dir)
+
+
+def _render_fragment(name: str, table: Dict[str, Any]) -> str:
+    return _worker_env.get_template(table_template(table)).render(name=name, t=table)
+
+
+@dataclass
+class StepReport:
+    target: str
+    status: str      # skipped (inputs unchanged) / written / unchanged (same text)
+    seconds: float
+    detail: str = ""
+
+
+class CodeGenerator:
+    def __init__(
+        self,
+        root: str = ROOT,
+        schema_path: Optional[str] = None,
+        policy_path: str = POLICY_PATH,
+        templates_dir: Optional[str] = None,
+        out_dir: Optional[str] = None,
+        cache_dir: Optional[str] = CACHE_DIR,
+        jobs: int = 1,
+        force: bool = False,
+    ):
+        self.schema_path = schema_path or os.path.join(root, "websubmit.yml")
+        self.policy_path = policy_path
+        self.templates_dir = templates_dir or os.path.join(root, "templates")
+        self.out_dir = out_dir or root
+        self.cache_dir = cache_dir
+        self.jobs = jobs
+        self.force = force
+
+        self.env = make_env(self.templates_dir, cache_dir)
+        self.manifest_path = os.path.join(cache_dir, "manifest.json") if cache_dir else None
+        self.manifest: Dict[str, Dict[str, str]] = {}
+        if self.manifest_path and os.path.exists(self.manifest_path) and not force:
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+        self._tables: Optional[Dict[str, Any]] = None
+        self.reports: List[StepReport] = []
+
+    # ---- inputs ----
+    def _read(self, path: str) -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+
+    def template_source(self, name: str) -> bytes:
+        return self._read(os.path.join(self.templates_dir, name))
+
+    def tables(self) -> Dict[str, Any]:
+        """websubmit.yml tables, parsed on first use only."""
+        if self._tables is None:
+            self._tables = yaml.safe_load(self._read(self.schema_path))["tables"]
+        return self._tables
+
+    # ---- outputs ----
+    def _up_to_date(self, target: str, path: str, inputs: str) -> bool:
+        entry = self.manifest.get(target)
+        if self.force or entry is None or entry.get("inputs") != inputs or not os.path.exists(path):
+            return False
+        return content_hash(self._read(path)) == entry.get("output")
+
+    def _write(self, target: str, path: str, inputs: str, text: str) -> str:
+        """Write `text` unless the file already holds it; record it in the manifest."""
+        data = text.encode()
+        self.manifest[target] = {"inputs": inputs, "output": content_hash(data)}
+        if os.path.exists(path) and self._read(path) == data:
+            return "unchanged"
+        with open(path, "wb") as f:
+            f.write(data)
+        return "written"
+
+    def _run(self, target: str, filename: str, inputs_fn, render_fn):
+        start = time.perf_counter()
+        path = os.path.join(self.out_dir, filename)
+        inputs = inputs_fn()
+        if self._up_to_date(target, path, inputs):
+            self.reports.append(StepReport(target, "skipped", time.perf_counter() - start, "inputs unchanged"))
+            return
+        text, detail = render_fn()
+        status = self._write(target, path, inputs, text)
+        self.reports.append(StepReport(target, status, time.perf_counter() - start, detail))
+
+    # ---- targets ----
+    def k9db(self):
+        templates = ("k9db.j2", SUBJECT_TABLE_TEMPLATE, TABLE_TEMPLATE)
+        self._run(
+            "generated_k9db.sql", "generated_k9db.sql",
+            lambda: content_hash(self._read(self.schema_path), *map(self.template_source, templates)),
+            self._render_k9db,
+        )
+
+    def _render_k9db(self):
+        tables = self.tables()
+        frag_dir = os.path.join(self.cache_dir, "fragments") if self.cache_dir else None
+        if frag_dir:
+            os.makedirs(frag_dir, exist_ok=True)
+
+        sources = {name: self.template_source(name) for name in (SUBJECT_TABLE_TEMPLATE, TABLE_TEMPLATE)}
+        fragments: Dict[str, str] = {}
+        missing: Dict[str, str] = {}  # table name -> fragment cache key
+        for name, table in tables.items():
+            key = content_hash(sources[table_template(table)], name, json.dumps(table, sort_keys=True))
+            path = frag_dir and os.path.join(frag_dir, key)
+            if path and not self.force and os.path.exists(path):
+                fragments[name] = self._read(path).decode()
+            else:
+                missing[name] = key
+
+        if self.jobs > 1 and len(missing) > 1:
+            with ProcessPoolExecutor(
+                self.jobs, initializer=_init_worker, initargs=(self.templates_dir, self.cache_dir)
+            ) as pool:
+                names = list(missing)
+                for name, text in zip(names, pool.map(_render_fragment, names, [tables[n] for n in names])):
+                    fragments[name] = text
+        else:
+            for name in missing:
+                table = tables[name]
+                fragments[name] = self.env.get_template(table_template(table)).render(name=name, t=table)
+
+        if frag_dir:
+            for name, key in missing.items():
+                with open(os.path.join(frag_dir, key), "w") as f:
+                    f.write(fragments[name])
+
+        text = self.env.get_template("k9db.j2").render(tables=tables, fragments=fragments)
+        return text, f"{len(tables)} tables: {len(missing)} rendered, {len(tables) - len(missing)} cached"
 
-def main():
-    # 1. Load YAML schema + ownership config
-    with open("websubmit.yml") as f:
-        data = yaml.safe_load(f)
+    def sesame(self):
+        self._run(
+            "generated_policies.rs", "generated_policies.rs",
+            lambda: content_hash(self._read(self.schema_path), self.template_source("sesame.j2")),
+            lambda: (self.env.get_template("sesame.j2").render(tables=self.tables()), "rendered"),
+        )
 
-    tables = data["tables"]
+    def python_policies(self):
+        specs = python_policy_specs(load_policy_config(self.policy_path))
+        self._run(
+            "generated_policies.py", "generated_policies.py",
+            lambda: content_hash(json.dumps(specs, sort_keys=True), self.template_source("python_policies.j2")),
+            lambda: (
+                self.env.get_template("python_policies.j2").render(source="policy.yml", classes=specs),
+                f"{len(specs)} classes rendered",
+            ),
+        )
 
-    # 2. Set up Jinja environment to look inside templates/
-    env = Environment(loader=FileSystemLoader("templates"))
+    def run(self, targets=("k9db", "sesame", "python")) -> List[StepReport]:
+        steps = {"k9db": self.k9db, "sesame": self.sesame, "python": self.python_policies}
+        for target in targets:
+            steps[target]()
+        if self.manifest_path:
+            with open(self.manifest_path, "w") as f:
+                json.dump(self.manifest, f, indent=2, sort_keys=True)
+        return self.reports
 
-    # 3. Render K9db schema SQL from k9db.j2
-    schema_tmpl = env.get_template("k9db.j2")
-    schema_sql = schema_tmpl.render(tables=tables)
 
-    with open("generated_k9db.sql", "w") as f:
-        f.write(schema_sql)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate K9db SQL, Sesame Rust and Python policies")
+    parser.add_argument("--schema", default=None, help="websubmit schema (default: websubmit.yml next to Final.py)")
+    parser.add_argument("--policy", default=POLICY_PATH, help="policy file for the Python target")
+    parser.add_argument("--out-dir", default=None, help="where generated files go (default: next to Final.py)")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--no-cache", action="store_true", help="no manifest, fragment or template cache")
+    parser.add_argument("--force", action="store_true", help="ignore cached state and regenerate everything")
+    parser.add_argument("--jobs", type=int, default=1, help="worker processes for per-table rendering")
+    parser.add_argument("--targets", nargs="+", choices=["k9db", "sesame", "python"],
+                        default=["k9db", "sesame", "python"])
+    args = parser.parse_args(argv)
 
-    # 4. Render Rust Sesame policy file from sesame.j2
-    rust_policy_tmpl = env.get_template("sesame.j2")
-    rust_policy_rs = rust_policy_tmpl.render(tables=tables)
+    start = time.perf_counter()
+    generator = CodeGenerator(
+        schema_path=args.schema,
+        policy_path=args.policy,
+        out_dir=args.out_dir,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        jobs=args.jobs,
+        force=args.force,
+    )
+    setup = time.perf_counter() - start
+    reports = generator.run(args.targets)
 
-    with open("generated_policies.rs", "w") as f:
-        f.write(rust_policy_rs)
+    print(f"{'output':<24} {'status':<10} {'ms':>8}  detail")
+    print(f"{'(setup)':<24} {'':<10} {setup * 1000:>8.1f}")
+    for r in reports:
+        print(f"{r.target:<24} {r.status:<10} {r.seconds * 1000:>8.1f}  {r.detail}")
+    print(f"total {(time.perf_counter() - start) * 1000:.1f} ms")
 
-    print("Generated: generated_k9db.sql and generated_policies.rs")
 
 if __name__ == "__main__":
     main()
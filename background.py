@@ -0,0 +1,94 @@
+# background.py
+#
+# The thread loop shared by the maintenance workers (tombstones.TombstonePurger,
+# retention.RetentionSweeper): one pass every `interval` seconds on the
+# worker's own connection, the first right away. A pass that raises is
+# rolled back and recorded (last_error, the report's `error`, and the
+# background_pass_errors_total counter); the thread carries on and the
+# next pass retries after the usual interval.
+
+import sqlite3
+import threading
+from typing import Any, Callable, Optional
+
+import metrics
+from db import ConnectionManager
+
+
+class BackgroundWorker:
+    """
+    Subclasses implement _pass(conn) -> report and _failed_report(error),
+    and may override _prepare(conn), which runs before the first pass (and
+    again before the next one until it succeeds).
+    """
+
+    name = "background-worker"
+
+    def __init__(self, db_path: str, interval: float, on_report: Optional[Callable[[Any], None]] = None):
+        self.db_path = db_path
+        self.interval = interval
+        self.on_report = on_report
+        self.last_report: Any = None
+        self.last_error: Optional[str] = None
+        self.failures = 0    # passes that raised since start
+
+        self._manager = ConnectionManager(db_path)
+        self._prepared = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _prepare(self, conn: sqlite3.Connection):
+        pass
+
+    def _pass(self, conn: sqlite3.Connection):
+        raise NotImplementedError
+
+    def _failed_report(self, error: str):
+        raise NotImplementedError
+
+    def _report(self, report):
+        self.last_report = report
+        if self.on_report is not None:
+            self.on_report(report)
+
+    def run_once(self):
+        """One pass on the calling thread; exceptions propagate."""
+        conn = self._manager.connection()
+        if not self._prepared:
+            self._prepare(conn)
+            self._prepared = True
+        report = self._pass(conn)
+        self._report(report)
+        return report
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                try:
+                    self._manager.connection().rollback()
+                except sqlite3.Error:
+                    # the connection itself is broken: reopen it next pass
+                    self._manager.close_all()
+                self.failures += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                if metrics.ENABLED:
+                    metrics.inc("background_pass_errors_total", worker=self.name)
+                self._report(self._failed_report(self.last_error))
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None):
+        """Ask the thread to finish its current chunk and exit, then close the connection."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._manager.close_all()
@@ -0,0 +1,59 @@
+# bench_bulk_export.py
+#
+# Scaling of bulk_export.export_subjects with the number of worker
+# processes, against a single-process loop over write_sar_export.
+#
+#   python bench_bulk_export.py
+#   python bench_bulk_export.py --subjects 10000 --tasks 50 --workers 1 2 4 8
+
+import argparse
+import os
+import tempfile
+import time
+
+import bulk_export
+import ownership_layer
+from bench_sar_delete import seed
+from policy_layer import Context
+
+
+def run(n_subjects: int, tasks: int, worker_counts):
+    ctx = Context(user_id=0, role="dpo", purpose="sar_access")
+    ids = list(range(1, n_subjects + 1))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench_export.db")
+        seed(db_path, n_subjects, tasks)
+
+        out = os.path.join(tmp, "serial")
+        os.makedirs(out)
+        conn = ownership_layer.get_conn()
+        start = time.perf_counter()
+        for uid in ids:
+            with open(bulk_export.export_path(out, uid), "w") as sink:
+                ownership_layer.write_sar_export(uid, ctx, sink, conn=conn)
+        serial = n_subjects / (time.perf_counter() - start)
+        ownership_layer.get_manager().close_all()
+
+        print(f"subjects={n_subjects} tasks/subject={tasks} cpus={os.cpu_count()}")
+        print(f"{'workers':>8} {'subjects/s':>11} {'vs serial':>10}")
+        print(f"{'serial':>8} {serial:>11,.0f} {1.0:>9.2f}x")
+        for workers in worker_counts:
+            report = bulk_export.export_subjects(
+                ids, ctx, os.path.join(tmp, f"w{workers}"), workers=workers, db_path=db_path
+            )
+            rate = report.subjects_per_sec
+            print(f"{workers:>8} {rate:>11,.0f} {rate / serial:>9.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk SAR export scaling")
+    parser.add_argument("--subjects", type=int, default=4000)
+    parser.add_argument("--tasks", type=int, default=50)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+    run(args.subjects, args.tasks, args.workers)
+
+
+if __name__ == "__main__":
+    main()
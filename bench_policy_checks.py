@@ -0,0 +1,103 @@
+# bench_policy_checks.py
+#
+# Checks/sec for TaskPolicy / UserPolicy / ProjectPolicy using the compiled
+# decision table, against the old approach of walking the YAML
+# access_policies list on every check, through a DecisionCache, and with
+# the straight-line classes Final.py generates into generated_policies.py.
+#
+#   python bench_policy_checks.py
+#   python bench_policy_checks.py --checks 500000
+
+import argparse
+import itertools
+import time
+
+import generated_policies
+from config import POLICY_CONFIG
+from policy_layer import Context, DecisionCache, ProjectPolicy, TaskPolicy, UserPolicy
+
+
+# ---- Interpreted baseline (how check() worked before compilation) ----
+def legacy_check(category: str, owner_names, owner_id: int, ctx: Context) -> bool:
+    dcats = POLICY_CONFIG.get("data_categories") or {}
+    cat = dcats.get(category) or {}
+    for rule in cat.get("access_policies") or []:
+        if rule.get("purpose") != ctx.purpose:
+            continue
+
+        allowed = set(rule.get("allow", []))
+
+        if any(name in allowed for name in owner_names) and ctx.user_id == owner_id:
+            return True
+        if "admin" in allowed and ctx.role == "admin":
+            return True
+        if "dpo" in allowed and ctx.role == "dpo":
+            return True
+
+    return False
+
+
+CASES = [
+    # (label, policy, category, names that mean "owns this row", owner id)
+    ("TaskPolicy", TaskPolicy(project_id=123, project_owner_id=42), "task", ("project_owner", "owner"), 42),
+    ("UserPolicy", UserPolicy(user_id=42), "user_profile", ("self", "owner"), 42),
+    ("ProjectPolicy", ProjectPolicy(owner_id=42), "project", ("owner", "project_owner"), 42),
+]
+
+
+def contexts():
+    users = [(42, "user"), (99, "user"), (1, "admin"), (7, "dpo")]
+    purposes = ["task_view", "task_edit", "sar_access", "sar_delete"]
+    return [
+        Context(user_id=uid, role=role, purpose=purpose)
+        for (uid, role), purpose in itertools.product(users, purposes)
+    ]
+
+
+def rate(fn, ctxs, n_checks: int) -> float:
+    cycle = itertools.islice(itertools.cycle(ctxs), n_checks)
+    start = time.perf_counter()
+    for ctx in cycle:
+        fn(ctx)
+    return n_checks / (time.perf_counter() - start)
+
+
+def run(n_checks: int):
+    ctxs = contexts()
+
+    print(
+        f"{'policy':<14} {'legacy checks/s':>16} {'compiled checks/s':>18} {'speedup':>8} "
+        f"{'cached checks/s':>16} {'hit rate':>9} {'generated checks/s':>19} {'vs compiled':>12}"
+    )
+    for label, policy, category, owner_names, owner_id in CASES:
+        # Both implementations must agree before their speed is worth comparing.
+        for ctx in ctxs:
+            expected = legacy_check(category, owner_names, owner_id, ctx)
+            if policy.check(ctx) != expected:
+                raise AssertionError(f"{label} disagrees with legacy check for {ctx}")
+
+        legacy = rate(lambda c: legacy_check(category, owner_names, owner_id, c), ctxs, n_checks)
+        compiled = rate(policy.check, ctxs, n_checks)
+        cache = DecisionCache()
+        cached = rate(lambda c: cache.check(policy, c), ctxs, n_checks)
+        stats = cache.stats()
+        hit_rate = stats["hits"] / max(1, stats["hits"] + stats["misses"])
+        generated_policy = getattr(generated_policies, label)(
+            *(getattr(policy, f) for f in policy.key_fields)
+        )
+        generated = rate(generated_policy.check, ctxs, n_checks)
+        print(
+            f"{label:<14} {legacy:>16,.0f} {compiled:>18,.0f} {compiled / legacy:>7.1f}x "
+            f"{cached:>16,.0f} {hit_rate:>8.1%} {generated:>19,.0f} {generated / compiled:>11.1f}x"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Policy check throughput, legacy vs compiled")
+    parser.add_argument("--checks", type=int, default=200000)
+    args = parser.parse_args()
+    run(args.checks)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# bench_sar_access.py
+#
+# Latency of sar_access_with_policies as the number of tasks owned by the
+# data subject grows. Each size gets a fresh SQLite file in a temp dir.
+#
+#   python bench_sar_access.py
+#   python bench_sar_access.py --sizes 100 1000 10000 50000 --repeat 5
+#   python bench_sar_access.py --index     # read through the row_owner index
+
+import argparse
+import contextlib
+import io
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import init_db
+import ownership_layer
+from policy_layer import Context
+
+
+def seed(db_path: str, user_id: int, n_tasks: int):
+    """One owner, one project, `n_tasks` tasks in that project."""
+    ownership_layer.DB_PATH = db_path
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_db.init_db(db_path)
+
+    conn = sqlite3.connect(db_path)
+    cur = conn.cursor()
+    cur.execute(
+        "INSERT INTO users (id, email, name) VALUES (?, ?, ?)",
+        (user_id, f"owner{user_id}@example.com", f"Owner {user_id}"),
+    )
+    cur.execute(
+        "INSERT INTO projects (id, owner_id, title) VALUES (?, ?, ?)",
+        (1, user_id, "Bench Project"),
+    )
+    cur.executemany(
+        "INSERT INTO tasks (project_id, title, done) VALUES (?, ?, ?)",
+        ((1, f"Task #{i}", i % 2) for i in range(n_tasks)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def legacy_owner_lookups(db_path: str, tasks):
+    """
+    The per-task `SELECT owner_id FROM projects WHERE id = ?` round-trips the
+    SAR path used to make, timed on their own for comparison.
+    """
+    conn = sqlite3.connect(db_path)
+    cur = conn.cursor()
+    start = time.perf_counter()
+    for row in tasks:
+        cur.execute("SELECT owner_id FROM projects WHERE id = ?", (row["project_id"],))
+        cur.fetchone()
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return elapsed
+
+
+def run(sizes, repeat: int, use_index: bool = False):
+    user_id = 42
+    ctx = Context(user_id=user_id, role="user", purpose="sar_access")
+
+    print(f"{'tasks':>8} {'sar_access ms':>14} {'ms/1k tasks':>12} {'N+1 lookups ms':>15}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            db_path = os.path.join(tmp, f"bench_{n}.db")
+            seed(db_path, user_id, n)
+            if use_index:
+                ownership_layer.enable_ownership_index()
+
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                ownership_layer.sar_access_with_policies(user_id, ctx)
+                timings.append(time.perf_counter() - start)
+
+            tasks = ownership_layer.get_all_data_for(user_id)["tasks"]
+            legacy = legacy_owner_lookups(db_path, tasks)
+
+            median_ms = statistics.median(timings) * 1000
+            per_k = median_ms / max(n, 1) * 1000
+            print(f"{n:>8} {median_ms:>14.2f} {per_k:>12.3f} {legacy * 1000:>15.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SAR access latency vs. task count")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--index", action="store_true", help="use the materialized ownership index")
+    args = parser.parse_args()
+    run(args.sizes, args.repeat, args.index)
+
+
+if __name__ == "__main__":
+    main()
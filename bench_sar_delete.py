@@ -0,0 +1,88 @@
+# bench_sar_delete.py
+#
+# Erasures/sec for a backlog of deletion requests: one delete_all_data_for
+# call per subject versus delete_all_data_for_many over the whole backlog.
+#
+#   python bench_sar_delete.py
+#   python bench_sar_delete.py --subjects 5000 --tasks 20 --chunk 1000
+
+import argparse
+import contextlib
+import io
+import os
+import sqlite3
+import tempfile
+import time
+
+import init_db
+import ownership_layer
+
+
+def seed(db_path: str, n_subjects: int, tasks_per_subject: int):
+    """Each subject: one project with tasks, two notes, three login events."""
+    ownership_layer.configure(db_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_db.init_db(db_path)
+
+    conn = sqlite3.connect(db_path)
+    ids = range(1, n_subjects + 1)
+    conn.executemany(
+        "INSERT INTO users (id, email, name) VALUES (?, ?, ?)",
+        ((uid, f"user{uid}@example.com", f"User {uid}") for uid in ids),
+    )
+    conn.executemany(
+        "INSERT INTO projects (id, owner_id, title) VALUES (?, ?, ?)",
+        ((uid, uid, f"Project {uid}") for uid in ids),
+    )
+    conn.executemany(
+        "INSERT INTO tasks (project_id, title, done) VALUES (?, ?, ?)",
+        ((uid, f"Task {i}", 0) for uid in ids for i in range(tasks_per_subject)),
+    )
+    conn.executemany(
+        "INSERT INTO profile_notes (user_id, note) VALUES (?, ?)",
+        ((uid, f"Note {i}") for uid in ids for i in range(2)),
+    )
+    conn.executemany(
+        "INSERT INTO login_events (user_id, ts, ip) VALUES (?, datetime('now'), ?)",
+        ((uid, "192.0.2.1") for uid in ids for _ in range(3)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def run(n_subjects: int, tasks_per_subject: int, chunk_size: int):
+    ids = list(range(1, n_subjects + 1))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench_delete.db")
+
+        seed(db_path, n_subjects, tasks_per_subject)
+        start = time.perf_counter()
+        for uid in ids:
+            ownership_layer.delete_all_data_for(uid)
+        one_by_one = time.perf_counter() - start
+
+        seed(db_path, n_subjects, tasks_per_subject)
+        start = time.perf_counter()
+        report = ownership_layer.delete_all_data_for_many(ids, chunk_size=chunk_size)
+        bulk = time.perf_counter() - start
+
+        rows = sum(sum(counts.values()) for counts in report.values())
+        ownership_layer.get_manager().close_all()
+
+    print(f"subjects={n_subjects} tasks/subject={tasks_per_subject} chunk={chunk_size}")
+    print(f"  one at a time: {n_subjects / one_by_one:>10,.0f} erasures/s  ({one_by_one:.2f}s)")
+    print(f"  bulk:          {n_subjects / bulk:>10,.0f} erasures/s  ({bulk:.2f}s, {rows:,} rows)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk SAR deletion throughput")
+    parser.add_argument("--subjects", type=int, default=2000)
+    parser.add_argument("--tasks", type=int, default=10)
+    parser.add_argument("--chunk", type=int, default=ownership_layer.SAR_DELETE_CHUNK_SIZE)
+    args = parser.parse_args()
+    run(args.subjects, args.tasks, args.chunk)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# bench_sar_service.py
+#
+# Load test for the asyncio SAR service: fires a burst of SAR access
+# requests (plus an optional share of deletions) at increasing concurrency
+# and reports p50/p99 latency, throughput, rejections and timeouts.
+#
+#   python bench_sar_service.py
+#   python bench_sar_service.py --levels 1 8 32 128 --requests 2000 --workers 8
+#   python bench_sar_service.py --delete-ratio 0.05 --timeout 0.5
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from bench_sar_delete import seed
+from metrics import percentile
+from policy_layer import Context
+from sar_service import SARService, ServiceOverloaded
+
+
+async def burst(service: SARService, concurrency: int, n_requests: int, n_subjects: int,
+                delete_ratio: float, timeout, rng: random.Random):
+    latencies = []
+    rejected = timed_out = 0
+    gate = asyncio.Semaphore(concurrency)
+    admin = Context(user_id=1, role="admin", purpose="sar_access")
+    dpo = Context(user_id=2, role="dpo", purpose="sar_delete")
+
+    async def one():
+        nonlocal rejected, timed_out
+        async with gate:
+            uid = rng.randint(1, n_subjects)
+            start = time.perf_counter()
+            try:
+                if rng.random() < delete_ratio:
+                    await service.sar_delete(uid, dpo, timeout)
+                else:
+                    await service.sar_access(uid, admin, timeout)
+            except ServiceOverloaded:
+                rejected += 1
+                return
+            except asyncio.TimeoutError:
+                timed_out += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(n_requests)))
+    elapsed = time.perf_counter() - start
+    return latencies, rejected, timed_out, elapsed
+
+
+def run(levels, n_requests: int, n_subjects: int, tasks: int, workers: int,
+        max_pending: int, delete_ratio: float, timeout, seed_value: int):
+    rng = random.Random(seed_value)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench_service.db")
+        seed(db_path, n_subjects, tasks)
+
+        print(f"{'concurrency':>11} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'rejected':>9} {'timeouts':>9}")
+        for level in levels:
+            service = SARService(db_path, read_workers=workers, max_pending=max_pending)
+            try:
+                latencies, rejected, timed_out, elapsed = asyncio.run(
+                    burst(service, level, n_requests, n_subjects, delete_ratio, timeout, rng)
+                )
+            finally:
+                service.close()
+            ms = [l * 1000 for l in latencies]
+            print(
+                f"{level:>11} {len(latencies) / elapsed:>9,.0f} "
+                f"{statistics.median(ms) if ms else float('nan'):>8.2f} {percentile(ms, 0.99):>8.2f} "
+                f"{rejected:>9} {timed_out:>9}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SAR service latency under concurrent load")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--subjects", type=int, default=2000)
+    parser.add_argument("--tasks", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-pending", type=int, default=64)
+    parser.add_argument("--delete-ratio", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=593)
+    args = parser.parse_args()
+    run(args.levels, args.requests, args.subjects, args.tasks, args.workers,
+        args.max_pending, args.delete_ratio, args.timeout, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# bench_sharding.py
+#
+# Concurrent writers on one file versus a sharded store: each writer thread
+# inserts tasks into its own owner's project, one commit per task. With
+# a single shard every writer queues on the same write lock; with one shard per
+# writer they commit to different files. Also reports the cost of a SAR
+# read and an erasure on the sharded store.
+#
+#   python bench_sharding.py
+#   python bench_sharding.py --writers 8 --tasks 2000 --synchronous FULL
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from sharding import SHARD_PRAGMAS, ShardedStore
+
+
+def seed(store: ShardedStore, writers: int):
+    """One user and one project per writer, user ids 1..writers (so writer i owns shard i % N)."""
+    store.create()
+    projects = {}
+    for uid in range(1, writers + 1):
+        store.add_user(uid, f"user{uid}@example.com", f"User {uid}")
+        projects[uid] = store.add_project(uid, f"Project {uid}")
+    return projects
+
+
+def write_rate(store: ShardedStore, projects, tasks_per_writer: int) -> float:
+    """Tasks committed per second across all writer threads."""
+    barrier = threading.Barrier(len(projects) + 1)
+
+    def writer(project_id):
+        barrier.wait()
+        for i in range(tasks_per_writer):
+            store.add_task(project_id, f"Task {i}")
+
+    threads = [threading.Thread(target=writer, args=(pid,)) for pid in projects.values()]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in threads:
+        t.join()
+    return len(projects) * tasks_per_writer / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent task writers: one file vs one shard per writer")
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--tasks", type=int, default=1000, help="tasks inserted per writer")
+    parser.add_argument("--synchronous", default=SHARD_PRAGMAS["synchronous"],
+                        help="FULL makes every commit fsync, which is where separate files pay off most")
+    args = parser.parse_args()
+    pragmas = dict(SHARD_PRAGMAS, synchronous=args.synchronous)
+
+    print(f"{'shards':>6} {'tasks/s':>10} {'SAR ms':>8} {'erase ms':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for shards in sorted({1, args.writers}):
+            store = ShardedStore(os.path.join(tmp, f"bench_{shards}.db"), shards=shards, pragmas=pragmas)
+            try:
+                projects = seed(store, args.writers)
+                rate = write_rate(store, projects, args.tasks)
+
+                start = time.perf_counter()
+                store.get_all_data_for(1)
+                sar_ms = (time.perf_counter() - start) * 1000
+
+                start = time.perf_counter()
+                store.delete_all_data_for(1)
+                erase_ms = (time.perf_counter() - start) * 1000
+            finally:
+                store.close()
+            print(f"{shards:>6} {rate:>10.0f} {sar_ms:>8.2f} {erase_ms:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+# bench_suite.py
+#
+# Benchmark suite for the SAR and policy paths: get_all_data_for,
+# sar_access_with_policies, delete_all_data_for, PCon.reveal and each
+# policy's check, over synthetic datasets of several sizes and a mix of
+# roles and purposes. Results are written as JSON; given a baseline file
+# from an earlier run, every result is compared against it and the run
+# fails if any throughput dropped by more than --tolerance.
+#
+#   python bench_suite.py --out results.json
+#   python bench_suite.py --sizes 1000 10000 --baseline bench_baseline.json
+#   python bench_suite.py --quick --save-baseline bench_baseline.json
+#
+# Baselines are machine-specific; keep them out of version control.
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import ownership_layer
+import synthetic_data
+from metrics import percentile
+from policy_layer import DECISION_CACHE, Context, PCon, ProjectPolicy, TaskPolicy, UserPolicy
+
+DEFAULT_SIZES = [1000, 10000]
+QUICK_SIZES = [1000]
+
+# Throughput may fall this far below the baseline before it counts as a regression
+DEFAULT_TOLERANCE = 0.20
+
+PURPOSES = ["task_view", "task_edit", "sar_access", "sar_delete"]
+
+
+def result(name: str, size: Optional[int], variant: str, latencies: List[float] = None,
+           ops: int = None, seconds: float = None) -> Dict[str, Any]:
+    """One benchmark record; pass per-op latencies, or a total op count and time."""
+    if latencies is not None:
+        ops, seconds = len(latencies), sum(latencies)
+    record = {
+        "name": name,
+        "size": size,
+        "variant": variant,
+        "ops": ops,
+        "seconds": round(seconds, 6),
+        "ops_per_sec": round(ops / seconds, 2) if seconds else None,
+    }
+    if latencies:
+        ms = [l * 1000 for l in latencies]
+        record["p50_ms"] = round(statistics.median(ms), 4)
+        record["p99_ms"] = round(percentile(ms, 0.99), 4)
+    return record
+
+
+def timed(fn: Callable[[Any], Any], items: Iterable[Any]) -> List[float]:
+    latencies = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def throughput(fn: Callable[[Any], Any], items: List[Any], n_ops: int) -> float:
+    """Seconds for n_ops calls cycling through items, after a short warm-up."""
+    for item in itertools.islice(itertools.cycle(items), max(1000, n_ops // 10)):
+        fn(item)
+    cycle = itertools.islice(itertools.cycle(items), n_ops)
+    start = time.perf_counter()
+    for item in cycle:
+        fn(item)
+    return time.perf_counter() - start
+
+
+def contexts(rng: random.Random, n_users: int) -> List[Context]:
+    """A role/purpose mix: ordinary users (some owners, most not), an admin and a DPO."""
+    users = [(uid, "user") for uid in rng.sample(range(1, n_users + 1), min(8, n_users))]
+    users += [(1, "admin"), (2, "dpo")]
+    return [Context(uid, role, purpose) for (uid, role), purpose in itertools.product(users, PURPOSES)]
+
+
+# ---- policy-only benchmarks (no database) ----
+def bench_policies(n_ops: int, rng: random.Random) -> List[Dict[str, Any]]:
+    ctxs = contexts(rng, 100)
+    owner = ctxs[0].user_id
+    policies = [
+        ("TaskPolicy", TaskPolicy(project_id=123, project_owner_id=owner)),
+        ("UserPolicy", UserPolicy(user_id=owner)),
+        ("ProjectPolicy", ProjectPolicy(owner_id=owner)),
+    ]
+    results = []
+    for label, policy in policies:
+        seconds = throughput(policy.check, ctxs, n_ops)
+        results.append(result("policy_check", None, label, ops=n_ops, seconds=seconds))
+
+    pcon = PCon("Finish DS593", policies[0][1])
+
+    def reveal(ctx):
+        try:
+            pcon.reveal(ctx)
+        except PermissionError:
+            pass
+
+    results.append(result("pcon_reveal", None, "TaskPolicy", ops=n_ops, seconds=throughput(reveal, ctxs, n_ops)))
+    return results
+
+
+# ---- database benchmarks ----
+def bench_dataset(size: int, n_subjects: int, seed: int, tmp: str) -> List[Dict[str, Any]]:
+    db_path = os.path.join(tmp, f"suite_{size}.db")
+    synthetic_data.generate(db_path, synthetic_data.SyntheticSpec(users=size, seed=seed))
+    ownership_layer.configure(db_path)
+    rng = random.Random(f"{seed}:{size}")
+    subjects = rng.sample(range(1, size + 1), min(n_subjects, size))
+    results = []
+
+    results.append(result("get_all_data_for", size, "default", timed(ownership_layer.get_all_data_for, subjects)))
+
+    other = rng.choice(subjects)
+    mixes = {
+        "self": lambda uid: Context(uid, "user", "sar_access"),
+        "other_user": lambda uid: Context(other, "user", "sar_access"),
+        "admin": lambda uid: Context(1, "admin", "sar_access"),
+        "dpo": lambda uid: Context(2, "dpo", "sar_access"),
+        "self_task_view": lambda uid: Context(uid, "user", "task_view"),
+    }
+    for variant, make_ctx in mixes.items():
+        DECISION_CACHE.clear()
+        access = lambda uid: ownership_layer.sar_access_with_policies(uid, make_ctx(uid), decision_cache=DECISION_CACHE)
+        latencies = timed(access, subjects)
+        results.append(result("sar_access_with_policies", size, variant, latencies))
+
+    # Destructive, so last
+    results.append(result("delete_all_data_for", size, "default", timed(ownership_layer.delete_all_data_for, subjects)))
+    ownership_layer.get_manager().close_all()
+    return results
+
+
+def run(sizes: List[int], n_subjects: int, n_ops: int, seed: int) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    results = bench_policies(n_ops, rng)
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            results.extend(bench_dataset(size, n_subjects, seed, tmp))
+    return {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "sizes": sizes,
+            "subjects": n_subjects,
+            "policy_ops": n_ops,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+# ---- baseline comparison ----
+def result_key(record: Dict[str, Any]) -> str:
+    size = "" if record["size"] is None else f"[{record['size']}]"
+    return f"{record['name']}{size}:{record['variant']}"
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Print current vs baseline throughput; returns the keys that regressed."""
+    before = {result_key(r): r for r in baseline["results"]}
+    regressions = []
+    print(f"{'benchmark':<48} {'baseline ops/s':>15} {'current ops/s':>14} {'change':>8}")
+    for record in current["results"]:
+        key = result_key(record)
+        old = before.get(key)
+        new_rate = record["ops_per_sec"]
+        if old is None or not old["ops_per_sec"] or new_rate is None:
+            print(f"{key:<48} {'-':>15} {new_rate or 0:>14,.1f} {'new':>8}")
+            continue
+        change = new_rate / old["ops_per_sec"] - 1
+        flag = ""
+        if change < -tolerance:
+            regressions.append(key)
+            flag = "  REGRESSION"
+        print(f"{key:<48} {old['ops_per_sec']:>15,.1f} {new_rate:>14,.1f} {change:>+7.1%}{flag}")
+    return regressions
+
+
+def print_results(report: Dict[str, Any]):
+    print(f"{'benchmark':<48} {'ops/s':>12} {'p50 ms':>9} {'p99 ms':>9}")
+    for record in report["results"]:
+        p50 = record.get("p50_ms")
+        p99 = record.get("p99_ms")
+        print(
+            f"{result_key(record):<48} {record['ops_per_sec'] or 0:>12,.1f} "
+            f"{'-' if p50 is None else f'{p50:.3f}':>9} {'-' if p99 is None else f'{p99:.3f}':>9}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SAR / policy benchmark suite with baseline comparison")
+    parser.add_argument("--sizes", type=int, nargs="+", default=None, help="synthetic dataset sizes (users)")
+    parser.add_argument("--quick", action="store_true", help=f"only size {QUICK_SIZES}, fewer ops")
+    parser.add_argument("--subjects", type=int, default=200, help="data subjects timed per dataset")
+    parser.add_argument("--policy-ops", type=int, default=200000, help="checks per policy benchmark")
+    parser.add_argument("--seed", type=int, default=593)
+    parser.add_argument("--out", default=None, help="write results JSON here")
+    parser.add_argument("--baseline", default=None, help="compare against this results JSON")
+    parser.add_argument("--save-baseline", default=None, help="also write results to this baseline path")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed fractional throughput drop before failing (default 0.20)")
+    args = parser.parse_args()
+
+    sizes = args.sizes or (QUICK_SIZES if args.quick else DEFAULT_SIZES)
+    n_ops = args.policy_ops // 10 if args.quick else args.policy_ops
+    report = run(sizes, args.subjects, n_ops, args.seed)
+
+    for path in (args.out, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+
+    if args.baseline is None:
+        print_results(report)
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(report, baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+    print(f"\nno regressions beyond {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
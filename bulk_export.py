@@ -0,0 +1,134 @@
+# bulk_export.py
+#
+# Bulk SAR export for compliance jobs covering many data subjects. User ids
+# are split into chunks and spread over a ProcessPoolExecutor; each worker
+# process opens its own read-only connection (in _init_worker) and writes
+# one NDJSON file per subject. The compiled policy comes with the worker's
+# policy_layer module: inherited from the parent under the fork start
+# method, compiled from policy.yml on import under spawn / forkserver.
+#
+#   python bulk_export.py --out exports/ --all
+#   python bulk_export.py --out exports/ --users 42 99 --workers 2
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+import ownership_layer
+from db import ConnectionManager
+from policy_layer import Context
+
+# Subjects handed to a worker per task; large enough to amortize IPC,
+# small enough to keep workers evenly loaded at the end of a job.
+EXPORT_CHUNK_SIZE = 64
+
+
+@dataclass
+class BulkExportReport:
+    subjects: int
+    rows: int
+    seconds: float
+    workers: int
+    files: List[str] = field(default_factory=list)
+
+    @property
+    def subjects_per_sec(self) -> float:
+        return self.subjects / self.seconds if self.seconds else float("inf")
+
+
+# ---- worker side ----
+_worker_db: Optional[ConnectionManager] = None
+
+
+def _init_worker(db_path: str):
+    global _worker_db
+    _worker_db = ConnectionManager(db_path, read_only=True)
+
+
+def export_path(out_dir: str, user_id: int) -> str:
+    return os.path.join(out_dir, f"sar_{user_id}.ndjson")
+
+
+def _export_chunk(user_ids: List[int], ctx: Context, out_dir: str) -> Dict[int, int]:
+    """Write one export file per subject; returns {user_id: rows written}."""
+    conn = _worker_db.connection()
+    written = {}
+    for user_id in user_ids:
+        with open(export_path(out_dir, user_id), "w") as sink:
+            counts = ownership_layer.write_sar_export(user_id, ctx, sink, conn=conn)
+        written[user_id] = sum(counts.values())
+    return written
+
+
+# ---- coordinator ----
+def export_subjects(
+    user_ids: Iterable[int],
+    ctx: Context,
+    out_dir: str,
+    workers: Optional[int] = None,
+    db_path: Optional[str] = None,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> BulkExportReport:
+    """
+    Export every subject in `user_ids` to `out_dir`/sar_<id>.ndjson using
+    `workers` processes (default: one per CPU). ctx is applied to every
+    subject, typically an admin or DPO context with purpose sar_access.
+    """
+    ids = list(dict.fromkeys(user_ids))
+    workers = workers or os.cpu_count() or 1
+    db_path = db_path or ownership_layer.DB_PATH
+    os.makedirs(out_dir, exist_ok=True)
+
+    chunks = [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+
+    start = time.perf_counter()
+    rows = 0
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(db_path,)) as pool:
+        futures = [pool.submit(_export_chunk, chunk, ctx, out_dir) for chunk in chunks]
+        for future in futures:
+            rows += sum(future.result().values())
+    elapsed = time.perf_counter() - start
+
+    return BulkExportReport(
+        subjects=len(ids),
+        rows=rows,
+        seconds=elapsed,
+        workers=workers,
+        files=[export_path(out_dir, uid) for uid in ids],
+    )
+
+
+def all_subject_ids(db_path: Optional[str] = None) -> List[int]:
+    conn = ConnectionManager(db_path or ownership_layer.DB_PATH, read_only=True)
+    try:
+        return [row[0] for row in conn.connection().execute("SELECT id FROM users ORDER BY id")]
+    finally:
+        conn.close_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel bulk SAR export")
+    parser.add_argument("--out", required=True, help="directory for the per-subject NDJSON files")
+    parser.add_argument("--db", default=None, help="database path (default: ownership_layer.DB_PATH)")
+    who = parser.add_mutually_exclusive_group(required=True)
+    who.add_argument("--users", type=int, nargs="+")
+    who.add_argument("--all", action="store_true", help="every row in users")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--role", default="dpo")
+    parser.add_argument("--requester", type=int, default=0)
+    args = parser.parse_args()
+
+    ids = all_subject_ids(args.db) if args.all else args.users
+    ctx = Context(user_id=args.requester, role=args.role, purpose="sar_access")
+    report = export_subjects(ids, ctx, args.out, workers=args.workers, db_path=args.db)
+    print(
+        f"exported {report.subjects} subjects ({report.rows} rows) with {report.workers} workers "
+        f"in {report.seconds:.2f}s: {report.subjects_per_sec:,.0f} subjects/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
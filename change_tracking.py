@@ -0,0 +1,227 @@
+# change_tracking.py
+#
+# Per-subject change log for incremental SAR exports. Triggers generated
+# from the ownership plan append one sar_changelog entry per (owner, row)
+# whenever an owned row is inserted, updated or deleted, or moves between
+# subjects because a row above it on its ownership path changed owner.
+# A subject's changes since an export watermark are then one range scan on
+# (owner_id, seq), so a repeat export costs the delta rather than the account.
+
+import json
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+
+from ownership_graph import OwnerPath, OwnershipPlan, TablePlan
+
+CHANGELOG_TABLE = "sar_changelog"
+
+CHANGELOG_DDL = f"""
+CREATE TABLE IF NOT EXISTS {CHANGELOG_TABLE} (
+    seq        INTEGER PRIMARY KEY AUTOINCREMENT,   -- export watermark
+    owner_id   INTEGER NOT NULL,
+    tbl        TEXT    NOT NULL,
+    row_id     INTEGER NOT NULL,                    -- rowid, to fetch the current row
+    row_key    TEXT    NOT NULL,                    -- JSON array of the primary key
+    op         TEXT    NOT NULL,                    -- insert / update / delete
+    changed_at TEXT    NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+CREATE INDEX IF NOT EXISTS idx_{CHANGELOG_TABLE}_owner ON {CHANGELOG_TABLE} (owner_id, seq);
+"""
+
+# Rows fetched per IN (...) list when loading changed rows
+FETCH_CHUNK = 500
+
+Keys = Dict[str, List[str]]
+
+
+def primary_keys(conn: sqlite3.Connection, graph: OwnershipPlan) -> Keys:
+    """Primary-key columns of every owned table (rowid for tables without one)."""
+    keys = {}
+    for plan in graph.tables:
+        info = conn.execute(f"PRAGMA table_info({plan.table})").fetchall()
+        pk = [row[1] for row in sorted(info, key=lambda r: r[5]) if row[5]]
+        keys[plan.table] = pk or ["rowid"]
+    return keys
+
+
+def _key_expr(columns: List[str], row_ref: str) -> str:
+    return "json_array(" + ", ".join(f"{row_ref}.{c}" for c in columns) + ")"
+
+
+def _owners(plan: TablePlan, row_ref: str) -> str:
+    """Subquery yielding the distinct non-NULL owners of `row_ref` over all of plan's paths."""
+    union = " UNION ".join(f"SELECT {path.owner_expr(row_ref)} AS o" for path in plan.paths)
+    return f"SELECT o FROM ({union}) WHERE o IS NOT NULL"
+
+
+def _log(table: str, key: List[str], row_ref: str, op: str, owners: str) -> str:
+    return (
+        f"INSERT INTO {CHANGELOG_TABLE} (owner_id, tbl, row_id, row_key, op) "
+        f"SELECT o, '{table}', {row_ref}.rowid, {_key_expr(key, row_ref)}, {op} FROM ({owners})"
+    )
+
+
+def _segment(path: OwnerPath, table: str) -> Optional[OwnerPath]:
+    """The part of `path` starting at `table`, or None if the path never reaches it."""
+    node = path.parent
+    while node is not None:
+        if node.table == table:
+            return node
+        node = node.parent
+    return None
+
+
+def _moved_dependents_sql(graph: OwnershipPlan, keys: Keys, table: str) -> List[str]:
+    """
+    Statements logging rows of other tables whose owner changes because the
+    `table` row OLD -> NEW changed owner (e.g. tasks when a project moves):
+    a delete for the previous owner and an insert for the new one.
+    """
+    stmts = []
+    for dep in graph.tables:
+        if dep.table == table:
+            continue
+        for path in dep.paths:
+            segment = _segment(path, table)
+            if segment is None:
+                continue
+            old, new = segment.owner_expr("OLD"), segment.owner_expr("NEW")
+            moved = f"{path.through(table, 'NEW')} AND {old} IS NOT {new}"
+            for op, owner, still_owned in (
+                # the previous owner may still own the row along another path
+                # (e.g. a member's own project_members row), as in the
+                # table's own UPDATE trigger
+                ("delete", old, f" AND {old} NOT IN ({_owners(dep, 'd')})"),
+                ("insert", new, ""),
+            ):
+                stmts.append(
+                    f"INSERT INTO {CHANGELOG_TABLE} (owner_id, tbl, row_id, row_key, op) "
+                    f"SELECT {owner}, '{dep.table}', d.rowid, {_key_expr(keys[dep.table], 'd')}, '{op}' "
+                    f"FROM {dep.table} d WHERE {moved} AND {owner} IS NOT NULL{still_owned}"
+                )
+    return stmts
+
+
+def trigger_sql(graph: OwnershipPlan, keys: Keys) -> List[str]:
+    """CREATE TRIGGER statements feeding sar_changelog for every owned table."""
+    triggers = []
+    for plan in graph.tables:
+        t, key = plan.table, keys[plan.table]
+        new_owners, old_owners = _owners(plan, "NEW"), _owners(plan, "OLD")
+        bodies = {
+            "INSERT": [_log(t, key, "NEW", "'insert'", new_owners)],
+            "UPDATE": [
+                # a primary-key change is the old row leaving and a new one arriving
+                _log(t, key, "OLD", "'delete'",
+                     f"{old_owners} EXCEPT SELECT o FROM ({new_owners}) "
+                     f"WHERE {_key_expr(key, 'OLD')} = {_key_expr(key, 'NEW')}"),
+                # still (or newly) in an owner's bundle
+                _log(t, key, "NEW",
+                     f"CASE WHEN o IN ({old_owners}) AND {_key_expr(key, 'OLD')} = {_key_expr(key, 'NEW')} "
+                     f"THEN 'update' ELSE 'insert' END",
+                     new_owners),
+            ] + _moved_dependents_sql(graph, keys, t),
+            "DELETE": [_log(t, key, "OLD", "'delete'", old_owners)],
+        }
+        for event, body in bodies.items():
+            name = f"{CHANGELOG_TABLE}_{t}_{event.lower()}"
+            stmts = "".join(f"    {stmt};\n" for stmt in body)
+            triggers.append(
+                f"CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON {t}\n"
+                f"BEGIN\n{stmts}END"
+            )
+    return triggers
+
+
+def enable_change_tracking(conn: sqlite3.Connection, graph: OwnershipPlan):
+    """Create sar_changelog and its triggers (idempotent). Changes are logged from now on."""
+    conn.executescript(CHANGELOG_DDL)
+    for stmt in trigger_sql(graph, primary_keys(conn, graph)):
+        conn.execute(stmt)
+    conn.commit()
+
+
+def disable_change_tracking(conn: sqlite3.Connection, graph: OwnershipPlan):
+    """Drop the triggers and the change log."""
+    for plan in graph.tables:
+        for event in ("insert", "update", "delete"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {CHANGELOG_TABLE}_{plan.table}_{event}")
+    conn.execute(f"DROP TABLE IF EXISTS {CHANGELOG_TABLE}")
+    conn.commit()
+
+
+def is_enabled(conn: sqlite3.Connection) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (CHANGELOG_TABLE,)
+    ).fetchone() is not None
+
+
+def current_watermark(conn: sqlite3.Connection) -> int:
+    """Highest seq logged so far (0 for an empty log)."""
+    return conn.execute(f"SELECT COALESCE(MAX(seq), 0) FROM {CHANGELOG_TABLE}").fetchone()[0]
+
+
+def changes_since(
+    conn: sqlite3.Connection, graph: OwnershipPlan, user_id: int, since: int = 0
+) -> Tuple[int, Dict[str, List[Dict[str, Any]]], Dict[str, List[Dict[str, Any]]]]:
+    """
+    What changed in `user_id`'s data after watermark `since`.
+
+    Returns (watermark, upserts, deletes): upserts maps table -> current rows
+    inserted or updated (or moved to the subject); deletes maps table ->
+    primary keys ({column: value}) of rows that left the subject's data.
+    Several changes to one row collapse to its latest state. Pass the
+    returned watermark as `since` next time.
+    """
+    keys = primary_keys(conn, graph)
+    own_txn = not conn.in_transaction
+    if own_txn:
+        conn.execute("BEGIN")  # one read snapshot for the log and the rows
+    try:
+        watermark = current_watermark(conn)
+        latest = conn.execute(
+            # SQLite takes the bare row_id / op from the row holding MAX(seq)
+            f"SELECT tbl, row_key, row_id, op, MAX(seq) FROM {CHANGELOG_TABLE} "
+            f"WHERE owner_id = ? AND seq > ? AND seq <= ? GROUP BY tbl, row_key",
+            (user_id, since, watermark),
+        ).fetchall()
+
+        changed: Dict[str, List[int]] = {}
+        deletes: Dict[str, List[Dict[str, Any]]] = {}
+        for table, row_key, row_id, op, _ in latest:
+            if table not in keys:
+                continue
+            if op == "delete":
+                deletes.setdefault(table, []).append(dict(zip(keys[table], json.loads(row_key))))
+            else:
+                changed.setdefault(table, []).append(row_id)
+
+        upserts: Dict[str, List[Dict[str, Any]]] = {}
+        cur = conn.cursor()
+        cur.row_factory = sqlite3.Row
+        for table, row_ids in changed.items():
+            rows = upserts.setdefault(table, [])
+            for start in range(0, len(row_ids), FETCH_CHUNK):
+                chunk = row_ids[start:start + FETCH_CHUNK]
+                marks = ",".join("?" * len(chunk))
+                rows.extend(
+                    dict(r) for r in cur.execute(
+                        f"SELECT * FROM {table} WHERE rowid IN ({marks}) ORDER BY rowid", chunk
+                    )
+                )
+    finally:
+        if own_txn:
+            conn.commit()
+    return watermark, upserts, deletes
+
+
+def forget_subject_sql(subject_sql: str) -> str:
+    """DELETE removing a subject's change log entries (after erasure)."""
+    return f"DELETE FROM {CHANGELOG_TABLE} WHERE owner_id {subject_sql}"
+
+
+def prune_changelog(conn: sqlite3.Connection, before: int) -> int:
+    """Drop entries at or below watermark `before` (no export needs them any more)."""
+    n = conn.execute(f"DELETE FROM {CHANGELOG_TABLE} WHERE seq <= ?", (before,)).rowcount
+    conn.commit()
+    return n
@@ -0,0 +1,175 @@
+# check_change_tracking.py
+#
+# Differential check for incremental SAR exports: for every subject, a full
+# export taken before a random workload, with the changes from
+# get_data_changes_for replayed on top (in two rounds, the second from the
+# first round's watermark), must equal a fresh full export afterwards.
+# The workload inserts, updates and deletes owned rows, moves projects and
+# notes between owners and reshuffles memberships; one subject is erased
+# midway. Also replays the fixed case of a project moving away from and
+# back to an owner who is a member of it. Exits non-zero on a mismatch.
+#
+#   python check_change_tracking.py
+#   python check_change_tracking.py --seeds 1 2 3 --users 300 --steps 300
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+
+import change_tracking
+import init_db
+import ownership_layer
+import synthetic_data
+
+# Random writes against the owned tables; each takes (conn, rng, user id)
+WORKLOAD = [
+    lambda c, rng, u: c.execute(
+        "INSERT INTO tasks (project_id, title, done) "
+        "SELECT id, 'new', 0 FROM projects ORDER BY random() LIMIT 1"),
+    lambda c, rng, u: c.execute(
+        "UPDATE tasks SET title = title || '!' "
+        "WHERE id = (SELECT id FROM tasks ORDER BY random() LIMIT 1)"),
+    lambda c, rng, u: c.execute(
+        "DELETE FROM tasks WHERE id = (SELECT id FROM tasks ORDER BY random() LIMIT 1)"),
+    lambda c, rng, u: c.execute(
+        "UPDATE projects SET owner_id = ? "
+        "WHERE id = (SELECT id FROM projects ORDER BY random() LIMIT 1)", (u,)),
+    lambda c, rng, u: c.execute(
+        "INSERT OR IGNORE INTO project_members (project_id, user_id, role) "
+        "SELECT id, ?, 'viewer' FROM projects ORDER BY random() LIMIT 1", (u,)),
+    lambda c, rng, u: c.execute(
+        "UPDATE profile_notes SET user_id = ? "
+        "WHERE id = (SELECT id FROM profile_notes ORDER BY random() LIMIT 1)", (u,)),
+    lambda c, rng, u: c.execute(
+        "INSERT INTO login_events (user_id, ts, ip) VALUES (?, datetime('now'), '192.0.2.1')", (u,)),
+    lambda c, rng, u: c.execute(
+        "DELETE FROM project_members "
+        "WHERE rowid = (SELECT rowid FROM project_members ORDER BY random() LIMIT 1)"),
+    lambda c, rng, u: c.execute(
+        "UPDATE OR IGNORE project_members SET user_id = ? "
+        "WHERE rowid = (SELECT rowid FROM project_members ORDER BY random() LIMIT 1)", (u,)),
+]
+
+
+def bundle_keys(conn):
+    return {
+        ownership_layer.bundle_key(t): cols
+        for t, cols in change_tracking.primary_keys(conn, ownership_layer.OWNERSHIP_PLAN).items()
+    }
+
+
+def full_export(user_id: int, keys):
+    """{bundle key: {primary key: row}} for user_id, from a full traversal."""
+    return {
+        key: {tuple(row[c] for c in keys[key]): row for row in rows}
+        for key, rows in ownership_layer.get_all_data_for(user_id).items()
+    }
+
+
+def replay(state, changes, keys):
+    for key, pks in changes["deletes"].items():
+        for pk in pks:
+            state[key].pop(tuple(pk[c] for c in keys[key]), None)
+    for key, rows in changes["upserts"].items():
+        for row in rows:
+            state[key][tuple(row[c] for c in keys[key])] = row
+
+
+def check_member_owner_round_trip(tmp: str) -> int:
+    """A project moving to one of its members and back must not drop that member's membership."""
+    db_path = os.path.join(tmp, "round_trip.db")
+    ownership_layer.configure(db_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_db.init_db(db_path)
+    conn = ownership_layer.get_conn()
+    conn.executemany("INSERT INTO users (id, email, name) VALUES (?, ?, ?)",
+                     [(1, "one@example.com", "One"), (2, "two@example.com", "Two")])
+    conn.execute("INSERT INTO projects (id, owner_id, title) VALUES (10, 1, 'Shared')")
+    conn.execute("INSERT INTO project_members (project_id, user_id, role) VALUES (10, 2, 'editor')")
+    conn.commit()
+
+    keys = bundle_keys(conn)
+    watermark = ownership_layer.enable_change_tracking()
+    state = full_export(2, keys)
+    conn.execute("UPDATE projects SET owner_id = 2 WHERE id = 10")
+    conn.execute("UPDATE projects SET owner_id = 1 WHERE id = 10")
+    conn.commit()
+    replay(state, ownership_layer.get_data_changes_for(2, watermark), keys)
+    expected = full_export(2, keys)
+    ownership_layer.get_manager().close_all()
+
+    if state != expected:
+        print("MISMATCH: project moved to member 2 and back; replayed export differs from a full one")
+        return 1
+    return 0
+
+
+def run_seed(tmp: str, seed: int, n_users: int, steps: int) -> int:
+    db_path = os.path.join(tmp, f"replay_{seed}.db")
+    synthetic_data.generate(db_path, synthetic_data.SyntheticSpec(users=n_users, seed=seed))
+    ownership_layer.configure(db_path)
+    conn = ownership_layer.get_conn()
+    keys = bundle_keys(conn)
+    subjects = range(1, n_users + 1)
+    erased = n_users // 2
+
+    start = ownership_layer.enable_change_tracking()
+    states = {uid: full_export(uid, keys) for uid in subjects}
+    rng = random.Random(seed)
+
+    def workload():
+        for _ in range(steps):
+            rng.choice(WORKLOAD)(conn, rng, rng.randint(1, n_users))
+        conn.commit()
+
+    # two rounds, the second starting from the first round's watermark
+    workload()
+    first = {uid: ownership_layer.get_data_changes_for(uid, start) for uid in subjects}
+    workload()
+    ownership_layer.delete_all_data_for(erased)
+
+    bad = 0
+    for uid in subjects:
+        if uid == erased:
+            continue
+        replay(states[uid], first[uid], keys)
+        replay(states[uid], ownership_layer.get_data_changes_for(uid, first[uid]["watermark"]), keys)
+        expected = full_export(uid, keys)
+        if states[uid] != expected:
+            bad += 1
+            for key in expected:
+                if expected[key] != states[uid][key]:
+                    diff = sorted(set(expected[key]) ^ set(states[uid][key]))[:5]
+                    print(f"MISMATCH seed={seed} user={uid} {key}: rows {diff}")
+    ownership_layer.get_manager().close_all()
+    return bad
+
+
+def run(seeds, n_users: int, steps: int) -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        if check_member_owner_round_trip(tmp):
+            return 1
+        for seed in seeds:
+            bad = run_seed(tmp, seed, n_users, steps)
+            if bad:
+                print(f"{bad} subjects' replayed exports differ (seed {seed})")
+                return 1
+    print(f"ok: replayed change sets match full exports for {len(seeds)} seeds x {n_users} subjects")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Differential check: incremental SAR changes vs full exports")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[1, 2, 3, 4, 5])
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--steps", type=int, default=300, help="random writes per round")
+    args = parser.parse_args()
+    sys.exit(run(args.seeds, args.users, args.steps))
+
+
+if __name__ == "__main__":
+    main()
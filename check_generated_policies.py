@@ -0,0 +1,71 @@
+# check_generated_policies.py
+#
+# Differential check for the generated policy module: every class in
+# generated_policies.py must decide exactly like its interpreted
+# counterpart in policy_layer, for every combination of policy fields,
+# requester, role, purpose (including one policy.yml doesn't mention) and
+# project membership. Fails if generated_policies.py is stale with respect
+# to policy.yml. Exits non-zero on the first mismatch.
+#
+#   python Final.py && python check_generated_policies.py
+
+import inspect
+import itertools
+import sys
+
+import generated_policies
+import policy_layer
+from policy_layer import POLICY_STORE, Context
+
+IDS = [1, 2, 3]
+ROLES = ["user", "admin", "dpo", "auditor"]
+MEMBERSHIPS = [None, frozenset(), frozenset({1}), frozenset({2, 3})]
+
+
+def purposes():
+    found = {purpose for _, purpose in POLICY_STORE.current().decision_table}
+    return sorted(found) + ["marketing"]
+
+
+def field_values(cls):
+    """Every combination of constructor arguments to try (None for optional ones too)."""
+    params = list(inspect.signature(cls.__init__).parameters.values())[1:]
+    return itertools.product(*(
+        IDS + [None] if p.default is not p.empty else IDS for p in params
+    ))
+
+
+def run() -> int:
+    ctxs = [
+        Context(uid, role, purpose, member_of)
+        for uid, role, purpose, member_of in itertools.product(IDS, ROLES, purposes(), MEMBERSHIPS)
+    ]
+    checked = 0
+    for name in ("TaskPolicy", "UserPolicy", "ProjectPolicy"):
+        interpreted_cls = getattr(policy_layer, name)
+        generated_cls = getattr(generated_policies, name)
+        if generated_cls.key_fields != interpreted_cls.key_fields:
+            print(f"MISMATCH {name}.key_fields: {generated_cls.key_fields} vs {interpreted_cls.key_fields}")
+            return 1
+        for args in field_values(interpreted_cls):
+            interpreted, generated = interpreted_cls(*args), generated_cls(*args)
+            if hasattr(generated, "__dict__"):
+                print(f"{name} instances have a __dict__; expected fully slotted")
+                return 1
+            for ctx in ctxs:
+                expected, got = interpreted.check(ctx), generated.check(ctx)
+                if expected != got:
+                    print(f"MISMATCH {name}{args} for {ctx}: interpreted={expected} generated={got}")
+                    print("(is generated_policies.py stale? rerun Final.py)")
+                    return 1
+                checked += 1
+    print(f"ok: {checked} decisions identical between generated and interpreted policies")
+    return 0
+
+
+def main():
+    sys.exit(run())
+
+
+if __name__ == "__main__":
+    main()
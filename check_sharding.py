@@ -0,0 +1,204 @@
+# check_sharding.py
+#
+# Differential check for the sharded store: a random workload of users,
+# projects, tasks, notes, login events, memberships and erasures is applied
+# to a ShardedStore and, row for row with the same ids, to an unsharded
+# database; every subject's SAR export (raw and policy-filtered) must then
+# be the same from both. Also checks that two stores on the same files (as
+# two processes would be) never hand out the same id, and that an erasure
+# failing part-way can be re-run to completion. Exits non-zero on a mismatch.
+#
+#   python check_sharding.py
+#   python check_sharding.py --seeds 1 2 3 --users 100 --steps 500 --shards 4
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+
+import init_db
+import ownership_layer
+from policy_layer import Context
+from sharding import ShardedStore
+
+
+def copy_row(store: ShardedStore, plain: sqlite3.Connection, table: str, row_id: int):
+    """Insert the sharded `table` row `row_id` into the unsharded database unchanged."""
+    cur = store.connection(store.shard_of_row(row_id)).execute(
+        f"SELECT * FROM shard.{table} WHERE id = ?", (row_id,)
+    )
+    columns = [d[0] for d in cur.description]
+    plain.execute(
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+        cur.fetchone(),
+    )
+
+
+def normalized(bundle):
+    return {key: sorted(sorted(row.items()) for row in rows) for key, rows in bundle.items()}
+
+
+def run_seed(tmp: str, seed: int, n_users: int, steps: int, shards: int) -> int:
+    rng = random.Random(seed)
+    plain_path = os.path.join(tmp, f"plain_{seed}.db")
+    ownership_layer.configure(plain_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_db.init_db(plain_path)
+    plain = ownership_layer.get_conn()
+    store = ShardedStore(os.path.join(tmp, f"sharded_{seed}.db"), shards=shards)
+    store.create()
+
+    users = list(range(1, n_users + 1))
+    for uid in users:
+        store.add_user(uid, f"user{uid}@example.com", f"User {uid}")
+        plain.execute("INSERT INTO users (id, email, name) VALUES (?, ?, ?)",
+                      (uid, f"user{uid}@example.com", f"User {uid}"))
+    projects = []
+
+    for step in range(steps):
+        op = rng.random()
+        uid = rng.choice(users)
+        if op < 0.15 or not projects:
+            projects.append(store.add_project(uid, f"Project {step}"))
+            copy_row(store, plain, "projects", projects[-1])
+        elif op < 0.45:
+            copy_row(store, plain, "tasks", store.add_task(rng.choice(projects), f"Task {step}", step % 2))
+        elif op < 0.55:
+            copy_row(store, plain, "profile_notes", store.add_profile_note(uid, f"Note {step}"))
+        elif op < 0.7:
+            copy_row(store, plain, "login_events", store.add_login_event(uid, "192.0.2.1"))
+        elif op < 0.95:
+            pid = rng.choice(projects)
+            store.add_project_member(pid, uid, "editor")
+            plain.execute("INSERT OR REPLACE INTO project_members (project_id, user_id, role) "
+                          "VALUES (?, ?, 'editor')", (pid, uid))
+        elif len(users) > 1:
+            store.delete_all_data_for(uid)
+            plain.commit()
+            ownership_layer.delete_all_data_for(uid)
+            users.remove(uid)
+            alive = {row[0] for row in plain.execute("SELECT id FROM projects")}
+            projects = [pid for pid in projects if pid in alive]
+        plain.commit()
+
+    bad = 0
+    for uid in range(1, n_users + 1):
+        views = [
+            (ownership_layer.get_all_data_for(uid), store.get_all_data_for(uid)),
+            *(
+                (ownership_layer.sar_access_with_policies(uid, ctx), store.sar_access_with_policies(uid, ctx))
+                for ctx in (Context(uid, "user", "sar_access"), Context(n_users + 1, "admin", "sar_access"))
+            ),
+        ]
+        for expected, got in views:
+            if normalized(expected) != normalized(got):
+                bad += 1
+                print(f"MISMATCH seed={seed} user={uid}: unsharded {sum(map(len, expected.values()))} rows, "
+                      f"sharded {sum(map(len, got.values()))}")
+                break
+    store.close()
+    ownership_layer.get_manager().close_all()
+    return bad
+
+
+def check_concurrent_ids(tmp: str, shards: int, writers: int = 4, tasks: int = 200) -> int:
+    """Two stores on the same files, each with `writers` threads, adding tasks to one shard's projects."""
+    path = os.path.join(tmp, "concurrent.db")
+    first = ShardedStore(path, shards=shards)
+    first.create()
+    first.add_user(shards, "owner@example.com", "Owner")       # lives on shard 0
+    project = first.add_project(shards, "Shared")
+    second = ShardedStore(path, shards=shards)
+
+    ids, errors = [], []
+
+    def writer(store):
+        try:
+            for i in range(tasks):
+                ids.append(store.add_task(project, f"Task {i}"))
+        except sqlite3.Error as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(s,)) for s in (first, second) for _ in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stored = first.connection(0).execute("SELECT COUNT(*) FROM shard.tasks").fetchone()[0]
+    first.close()
+    second.close()
+
+    expected = 2 * writers * tasks
+    if errors or len(set(ids)) != expected or stored != expected:
+        print(f"MISMATCH concurrent ids: {len(set(ids))} distinct of {expected}, "
+              f"{stored} stored, errors: {errors[:3]}")
+        return 1
+    return 0
+
+
+def check_erasure_retry(tmp: str, shards: int) -> int:
+    """An erasure whose last step fails leaves the subject reachable; re-running it erases everything."""
+    path = os.path.join(tmp, "retry.db")
+    store = ShardedStore(path, shards=shards)
+    store.create()
+    store.add_user(1, "one@example.com", "One")
+    store.add_user(2, "two@example.com", "Two")
+    project = store.add_project(1, "Thesis")
+    store.add_task(project, "Draft")
+    store.add_profile_note(1, "note")
+    store.add_project_member(project, 2, "viewer")
+
+    blocker = sqlite3.connect(path)
+    blocker.execute("CREATE TRIGGER block_user_delete BEFORE DELETE ON users "
+                    "BEGIN SELECT RAISE(ABORT, 'blocked'); END")
+    blocker.commit()
+    try:
+        store.delete_all_data_for(1)
+        print("MISMATCH erasure retry: the blocked erasure did not fail")
+        return 1
+    except sqlite3.IntegrityError:
+        pass
+    left = {key: len(rows) for key, rows in store.get_all_data_for(1).items() if rows}
+    blocker.execute("DROP TRIGGER block_user_delete")
+    blocker.commit()
+    blocker.close()
+
+    store.delete_all_data_for(1)
+    after = {key: len(rows) for key, rows in store.get_all_data_for(1).items() if rows}
+    store.close()
+    if left != {"users": 1} or after:
+        print(f"MISMATCH erasure retry: after the failure {left}, after the retry {after}")
+        return 1
+    return 0
+
+
+def run(seeds, n_users: int, steps: int, shards: int) -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        if check_concurrent_ids(tmp, shards) or check_erasure_retry(tmp, shards):
+            return 1
+        for seed in seeds:
+            bad = run_seed(tmp, seed, n_users, steps, shards)
+            if bad:
+                print(f"{bad} subjects' exports differ between sharded and unsharded stores (seed {seed})")
+                return 1
+    print(f"ok: sharded exports match unsharded ones for {len(seeds)} seeds x {n_users} subjects")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Differential check: sharded store vs one database")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--users", type=int, default=60)
+    parser.add_argument("--steps", type=int, default=600, help="random writes per seed")
+    parser.add_argument("--shards", type=int, default=4)
+    args = parser.parse_args()
+    sys.exit(run(args.seeds, args.users, args.steps, args.shards))
+
+
+if __name__ == "__main__":
+    main()
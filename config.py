@@ -1,10 +1,15 @@
 import yaml
 import os
 
-# BASE_DIR should be the directory that contains policy.yml
-BASE_DIR = "/Users/howardhuntermckeon/Desktop/593 project"
+# BASE_DIR should be the directory that contains policy.yml. Defaults to the
+# directory this file lives in; override with POLICY_BASE_DIR, or point
+# POLICY_PATH straight at a policy file.
+BASE_DIR = os.environ.get("POLICY_BASE_DIR", os.path.dirname(os.path.abspath(__file__)))
 
-POLICY_PATH = os.path.join(BASE_DIR, "policy.yml")
+POLICY_PATH = os.environ.get("POLICY_PATH", os.path.join(BASE_DIR, "policy.yml"))
 
-with open(POLICY_PATH, "r") as f:
-    POLICY_CONFIG = yaml.safe_load(f)
+def load_policy_config(path=POLICY_PATH):
+    with open(path, "r") as f:
+        return yaml.safe_load(f)
+
+POLICY_CONFIG = load_policy_config()
@@ -0,0 +1,108 @@
+# db.py
+
+import os
+import sqlite3
+import threading
+import weakref
+from typing import Dict, Optional
+
+import metrics
+
+# Database file used when nothing else is configured. Override with the
+# SAR_DB_PATH environment variable or by passing a path to ConnectionManager.
+DEFAULT_DB_PATH = os.environ.get("SAR_DB_PATH", "example.db")
+
+# Applied to every new connection, in this order.
+DEFAULT_PRAGMAS: Dict[str, object] = {
+    "journal_mode": "WAL",        # readers don't block the writer
+    "foreign_keys": "ON",
+    "synchronous": "NORMAL",      # fsync at checkpoints, safe with WAL
+    "cache_size": -65536,         # negative = KiB, i.e. 64 MiB page cache
+    "mmap_size": 268435456,       # 256 MiB memory-mapped reads
+    "temp_store": "MEMORY",
+}
+
+# sqlite3 keeps this many compiled statements per connection, keyed by SQL
+# text, so the fixed query strings in ownership_layer are prepared once per
+# connection instead of on every call.
+STATEMENT_CACHE_SIZE = 512
+
+# Every live manager, so init_db can drop connections before it replaces a file.
+_managers = weakref.WeakSet()
+
+
+class ConnectionManager:
+    """
+    Pool of reusable SQLite connections, one per thread.
+
+    The first call to connection() on a thread opens a connection, applies
+    the pragmas and keeps it; later calls on that thread get it back, so
+    connection setup happens once per thread rather than once per request.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_DB_PATH,
+        pragmas: Optional[Dict[str, object]] = None,
+        cached_statements: int = STATEMENT_CACHE_SIZE,
+        read_only: bool = False,
+    ):
+        self.path = path
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self.cached_statements = cached_statements
+        self.read_only = read_only
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._all: list[sqlite3.Connection] = []
+        _managers.add(self)
+
+    def _open(self) -> sqlite3.Connection:
+        # check_same_thread=False only so close_all() may close connections
+        # owned by other threads; each connection is otherwise used by the
+        # single thread it was opened on.
+        if self.read_only:
+            conn = sqlite3.connect(
+                f"file:{self.path}?mode=ro", uri=True,
+                cached_statements=self.cached_statements,
+                check_same_thread=False,
+            )
+        else:
+            conn = sqlite3.connect(
+                self.path,
+                cached_statements=self.cached_statements,
+                check_same_thread=False,
+            )
+
+        for name, value in self.pragmas.items():
+            if self.read_only and name == "journal_mode":
+                # can't change the journal mode through a read-only handle
+                continue
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """This thread's connection, opened on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            with metrics.timer("db_connect_seconds"):
+                conn = self._open()
+            self._local.conn = conn
+            with self._lock:
+                self._all.append(conn)
+        return conn
+
+    def close_all(self):
+        """Close every pooled connection; threads reopen on their next call."""
+        with self._lock:
+            conns, self._all = self._all, []
+        for conn in conns:
+            conn.close()
+        self._local = threading.local()
+
+
+def close_connections(path: str):
+    """Close pooled connections to `path` in every manager (e.g. before deleting the file)."""
+    for manager in list(_managers):
+        if os.path.abspath(manager.path) == os.path.abspath(path):
+            manager.close_all()
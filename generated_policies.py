@@ -0,0 +1,116 @@
+# generated_policies.py - GENERATED by Final.py from policy.yml.
+# Do not edit by hand; edit policy.yml or templates/python_policies.j2 instead.
+#
+# Drop-in replacements for the policy classes in policy_layer. Each
+# purpose's allow list is compiled into one straight-line boolean
+# expression, so check() does no rule lookups at all. Decisions are fixed
+# when this file is generated: `snapshot` is accepted for compatibility and
+# ignored, and edits to policy.yml need a rerun of Final.py.
+
+from typing import Optional
+
+from policy_layer import Context, Policy
+from policy_store import PolicySnapshot
+
+
+class TaskPolicy(Policy):
+    """Generated from data_categories.task."""
+
+    __slots__ = ("project_id", "project_owner_id", "_key", "_hash")
+    category = "task"
+    key_fields = ("project_id", "project_owner_id")
+    owner_field = "project_owner_id"
+    member_field = "project_id"
+
+    def __init__(self, project_id, project_owner_id):
+        self.project_id = project_id
+        self.project_owner_id = project_owner_id
+
+    def check(self, ctx: Context, snapshot: Optional[PolicySnapshot] = None) -> bool:
+        purpose = ctx.purpose
+        if purpose == "task_view":
+            return (
+                ctx.role == "admin"
+                or ctx.user_id == self.project_owner_id
+                or (ctx.member_of is not None and self.project_id in ctx.member_of)
+            )
+        if purpose == "task_edit":
+            return (
+                ctx.role == "admin"
+                or (ctx.member_of is not None and self.project_id in ctx.member_of)
+            )
+        if purpose == "sar_access":
+            return (
+                ctx.role == "admin"
+                or ctx.role == "dpo"
+                or ctx.user_id == self.project_owner_id
+                or (ctx.member_of is not None and self.project_id in ctx.member_of)
+            )
+        return False
+
+
+class UserPolicy(Policy):
+    """Generated from data_categories.user_profile."""
+
+    __slots__ = ("user_id", "_key", "_hash")
+    category = "user_profile"
+    key_fields = ("user_id",)
+    owner_field = "user_id"
+    member_field = None
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+
+    def check(self, ctx: Context, snapshot: Optional[PolicySnapshot] = None) -> bool:
+        purpose = ctx.purpose
+        if purpose == "task_view":
+            return (
+                ctx.user_id == self.user_id
+            )
+        if purpose == "task_edit":
+            return (
+                ctx.role == "admin"
+                or ctx.user_id == self.user_id
+            )
+        if purpose == "sar_access":
+            return (
+                ctx.role == "admin"
+                or ctx.role == "dpo"
+                or ctx.user_id == self.user_id
+            )
+        return False
+
+
+class ProjectPolicy(Policy):
+    """Generated from data_categories.project."""
+
+    __slots__ = ("owner_id", "project_id", "_key", "_hash")
+    category = "project"
+    key_fields = ("owner_id", "project_id")
+    owner_field = "owner_id"
+    member_field = "project_id"
+
+    def __init__(self, owner_id, project_id=None):
+        self.owner_id = owner_id
+        self.project_id = project_id
+
+    def check(self, ctx: Context, snapshot: Optional[PolicySnapshot] = None) -> bool:
+        purpose = ctx.purpose
+        if purpose == "task_view":
+            return (
+                ctx.role == "admin"
+                or ctx.user_id == self.owner_id
+                or (self.project_id is not None and ctx.member_of is not None and self.project_id in ctx.member_of)
+            )
+        if purpose == "task_edit":
+            return (
+                ctx.role == "admin"
+                or ctx.user_id == self.owner_id
+            )
+        if purpose == "sar_access":
+            return (
+                ctx.role == "admin"
+                or ctx.role == "dpo"
+                or ctx.user_id == self.owner_id
+            )
+        return False
@@ -2,14 +2,101 @@
 import sqlite3
 import os
 
-DB_PATH = "example.db"
+from config import POLICY_CONFIG
+from db import DEFAULT_DB_PATH, close_connections
+from ownership_graph import OwnershipPlan
+from retention import create_retention_indexes
+import tombstones
 
-def init_db():
-    # Remove old DB
-    if os.path.exists(DB_PATH):
-        os.remove(DB_PATH)
+DB_PATH = DEFAULT_DB_PATH
 
-    conn = sqlite3.connect(DB_PATH)
+
+def ownership_columns(policy_config) -> list[tuple[str, str]]:
+    """
+    (table, column) pairs the SAR traversal filters on, from the ownership
+    graph compiled out of policy.yml -> data_categories.*.owner.
+    """
+    return OwnershipPlan.from_policy(policy_config).index_columns()
+
+
+def foreign_key_columns(conn) -> list[tuple[str, str]]:
+    """
+    (table, column) for every single-column FOREIGN KEY in the schema. These
+    are the FK chains deletion walks, and SQLite also probes them on every
+    parent-row delete while foreign_keys is ON.
+    """
+    cols = []
+    tables = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+    ).fetchall()
+    for (table,) in tables:
+        for fk in conn.execute(f"PRAGMA foreign_key_list({table})").fetchall():
+            # (id, seq, table, from, to, on_update, on_delete, match)
+            cols.append((table, fk[3]))
+    return cols
+
+
+def _is_indexed(conn, table: str, column: str) -> bool:
+    """True if `column` is the rowid alias or the leading column of some index."""
+    for cid, name, type_, notnull, default, pk in conn.execute(f"PRAGMA table_info({table})"):
+        if name == column and pk == 1 and type_.upper() == "INTEGER":
+            return True
+    for index in conn.execute(f"PRAGMA index_list({table})").fetchall():
+        first = conn.execute(f"PRAGMA index_info({index[1]})").fetchone()
+        if first is not None and first[2] == column:
+            return True
+    return False
+
+
+def create_ownership_indexes(conn, policy_config=POLICY_CONFIG) -> list[str]:
+    """
+    Create an index for every ownership / foreign-key column that doesn't
+    already lead one. Returns the names of the indexes created.
+    """
+    created = []
+    seen = set()
+    for table, column in ownership_columns(policy_config) + foreign_key_columns(conn):
+        if (table, column) in seen:
+            continue
+        seen.add((table, column))
+        if _is_indexed(conn, table, column):
+            continue
+        name = f"idx_{table}_{column}"
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({column})")
+        created.append(name)
+    return created
+
+
+def check_sar_query_plans(conn, queries=None):
+    """
+    Run EXPLAIN QUERY PLAN over the SAR traversal and deletion queries and
+    raise RuntimeError if any step would scan a table instead of searching
+    an index.
+    """
+    if queries is None:
+        # imported here so creating a database doesn't require the policy layer
+        from ownership_layer import SAR_DELETE_QUERIES, SAR_QUERIES
+        queries = [sql for _, sql in SAR_QUERIES] + SAR_DELETE_QUERIES
+
+    scans = []
+    for sql in queries:
+        for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", {"subject": 0}):
+            detail = row[-1]
+            if detail.startswith("SCAN"):
+                scans.append(f"{sql}\n    -> {detail}")
+
+    if scans:
+        raise RuntimeError("SAR queries would scan tables:\n  " + "\n  ".join(scans))
+
+def init_db(db_path: str = DB_PATH):
+    # Drop pooled connections to the old file, then remove it
+    # (plus any WAL/shared-memory files left next to it)
+    close_connections(db_path)
+    for path in (db_path, db_path + "-wal", db_path + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+
+    conn = sqlite3.connect(db_path)
     cur = conn.cursor()
 
     # Enforce foreign keys
@@ -65,9 +152,17 @@ def init_db():
 
     cur.executescript(sql)
 
+    # Index the ownership graph so SAR access/deletion searches, not scans
+    create_ownership_indexes(conn)
+    check_sar_query_plans(conn)
+    # ...and let retention TTL sweeps walk expired rows oldest first
+    create_retention_indexes(conn)
+    # Deferred SAR deletions (tombstone-then-purge)
+    tombstones.ensure_schema(conn)
+
     conn.commit()
     conn.close()
-    print("Database initialized successfully:", DB_PATH)
+    print("Database initialized successfully:", db_path)
 
 if __name__ == "__main__":
     init_db()
@@ -0,0 +1,188 @@
+# metrics.py
+#
+# Lightweight instrumentation for the ownership and policy layers: counters
+# and stage timers reported to a pluggable sink. Disabled by default; while
+# disabled, timer() hands back a shared no-op context manager and hot paths
+# guard counter updates with `if metrics.ENABLED`, so the cost is one global
+# lookup per call site.
+#
+#   import metrics
+#   sink = metrics.enable()            # in-process counters
+#   ... run SAR requests ...
+#   print(sink.prometheus_text())      # or metrics.dump_prometheus("sar.prom")
+
+import threading
+import time
+from contextlib import nullcontext
+from typing import Dict, Optional, Tuple
+
+Labels = Tuple[Tuple[str, str], ...]
+
+ENABLED = False
+
+
+class MetricsSink:
+    """Receives counter increments and timings. Subclass to forward elsewhere."""
+
+    def inc(self, name: str, value: float = 1, labels: Labels = ()):
+        raise NotImplementedError
+
+    def observe(self, name: str, seconds: float, labels: Labels = ()):
+        raise NotImplementedError
+
+
+class InMemoryMetrics(MetricsSink):
+    """Thread-safe in-process counters and timers (count / sum / max per series)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.timers: Dict[Tuple[str, Labels], list] = {}
+
+    def inc(self, name: str, value: float = 1, labels: Labels = ()):
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, labels: Labels = ()):
+        key = (name, labels)
+        with self._lock:
+            series = self.timers.get(key)
+            if series is None:
+                self.timers[key] = [1, seconds, seconds]
+            else:
+                series[0] += 1
+                series[1] += seconds
+                if seconds > series[2]:
+                    series[2] = seconds
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.timers.clear()
+
+    def counter(self, name: str, **labels) -> float:
+        """Current value of one counter series (0 if never incremented)."""
+        return self.counters.get((name, _labels(labels)), 0)
+
+    def total(self, name: str) -> float:
+        """Sum of a counter over all its label values."""
+        with self._lock:
+            return sum(v for (n, _), v in self.counters.items() if n == name)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Plain-dict view: {"name{labels}": value} for counters, count/sum/max for timers."""
+        with self._lock:
+            out = {_series(n, l): v for (n, l), v in sorted(self.counters.items())}
+            for (n, l), (count, total, peak) in sorted(self.timers.items()):
+                out[_series(n, l)] = {"count": count, "sum": total, "max": peak}
+        return out
+
+    def prometheus_text(self) -> str:
+        """Counters as Prometheus counters, timers as summaries (_count / _sum)."""
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            timers = sorted(self.timers.items())
+        seen = set()
+        for (name, labels), value in counters:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{_series(name, labels)} {value:g}")
+        for (name, labels), (count, total, _) in timers:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} summary")
+            lines.append(f"{_series(name + '_count', labels)} {count}")
+            lines.append(f"{_series(name + '_sum', labels)} {total:.9f}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _series(name: str, labels: Labels) -> str:
+    if not labels:
+        return name
+    body = ",".join(f'{k}="{v}"' for k, v in labels)
+    return f"{name}{{{body}}}"
+
+
+# ---- process-wide sink ----
+_sink: Optional[MetricsSink] = None
+_NOOP = nullcontext()
+
+
+def enable(sink: Optional[MetricsSink] = None) -> MetricsSink:
+    """Start recording into `sink` (default: a fresh InMemoryMetrics) and return it."""
+    global ENABLED, _sink
+    _sink = sink if sink is not None else InMemoryMetrics()
+    ENABLED = True
+    return _sink
+
+
+def disable():
+    global ENABLED, _sink
+    ENABLED = False
+    _sink = None
+
+
+def get_sink() -> Optional[MetricsSink]:
+    return _sink
+
+
+def inc(name: str, value: float = 1, **labels):
+    sink = _sink
+    if ENABLED and sink is not None:
+        sink.inc(name, value, _labels(labels))
+
+
+def observe(name: str, seconds: float, **labels):
+    """Record a duration measured by the caller (for spans timer() can't wrap)."""
+    sink = _sink
+    if ENABLED and sink is not None:
+        sink.observe(name, seconds, _labels(labels))
+
+
+class _Timer:
+    __slots__ = ("sink", "name", "labels", "start")
+
+    def __init__(self, sink: MetricsSink, name: str, labels: Labels):
+        self.sink = sink
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.sink.observe(self.name, time.perf_counter() - self.start, self.labels)
+        return False
+
+
+def timer(name: str, **labels):
+    """Context manager timing its body into `name`; a shared no-op when disabled."""
+    sink = _sink
+    if not ENABLED or sink is None:
+        return _NOOP
+    return _Timer(sink, name, _labels(labels))
+
+
+def percentile(values, q: float) -> float:
+    """The q-quantile (0..1) of `values` by nearest rank; NaN for no values. Used by the benchmarks."""
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def dump_prometheus(path: str, sink: Optional[MetricsSink] = None):
+    """Write the sink's Prometheus text exposition to `path` (e.g. for node_exporter's textfile collector)."""
+    sink = sink if sink is not None else _sink
+    if not isinstance(sink, InMemoryMetrics):
+        raise TypeError("dump_prometheus needs an InMemoryMetrics sink")
+    with open(path, "w") as f:
+        f.write(sink.prometheus_text())
@@ -0,0 +1,244 @@
+# ownership_graph.py
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+# Placeholders the generated SQL uses for "the data subject(s)":
+#   single subject -> bind {"subject": user_id}
+#   many subjects  -> subjects listed in the temp table sar_subjects
+ONE_SUBJECT = "= :subject"
+MANY_SUBJECTS = "IN (SELECT user_id FROM temp.sar_subjects)"
+
+
+# ---- One way a row can belong to a data subject ----
+@dataclass(frozen=True)
+class OwnerPath:
+    """
+    `table.column` either holds the subject id itself (parent is None), or
+    refers to `parent.table.parent_key`, whose row is owned through `parent`.
+    A chain of these is an FK path from a row up to its data subject.
+    """
+    table: str
+    column: str
+    parent: Optional["OwnerPath"] = None
+    parent_key: str = "id"
+
+    def match(self, subject_sql: str = ONE_SUBJECT) -> str:
+        """
+        WHERE-clause fragment on `table` selecting rows owned by the subject(s),
+        as nested IN subqueries so every hop can use an index.
+        """
+        if self.parent is None:
+            return f"{self.column} {subject_sql}"
+        return (
+            f"{self.column} IN (SELECT {self.parent_key} FROM {self.parent.table} "
+            f"WHERE {self.parent.match(subject_sql)})"
+        )
+
+    def owner_expr(self, row_ref: str, depth: int = 0) -> str:
+        """
+        SQL expression for the subject id that owns the row `row_ref`
+        (a table alias, or NEW/OLD inside a trigger).
+        """
+        if self.parent is None:
+            return f"{row_ref}.{self.column}"
+        alias = f"_o{depth}"
+        return (
+            f"(SELECT {self.parent.owner_expr(alias, depth + 1)} "
+            f"FROM {self.parent.table} {alias} "
+            f"WHERE {alias}.{self.parent_key} = {row_ref}.{self.column})"
+        )
+
+    def through(self, table: str, row_ref: str) -> Optional[str]:
+        """
+        WHERE-clause fragment on self.table selecting the rows whose path
+        passes through the `table` row `row_ref` (NEW/OLD in a trigger),
+        or None if the path never reaches `table`.
+        """
+        if self.parent is None:
+            return None
+        if self.parent.table == table:
+            return f"{self.column} = {row_ref}.{self.parent_key}"
+        inner = self.parent.through(table, row_ref)
+        if inner is None:
+            return None
+        return f"{self.column} IN (SELECT {self.parent_key} FROM {self.parent.table} WHERE {inner})"
+
+    def hops(self) -> List[Tuple[str, str]]:
+        """Every (table, column) the path filters on, from this table upward."""
+        out = [(self.table, self.column)]
+        if self.parent is not None:
+            out.append((self.parent.table, self.parent_key))
+            out.extend(self.parent.hops())
+        return out
+
+    def tables(self) -> List[str]:
+        """Tables above this one on the path."""
+        if self.parent is None:
+            return []
+        return [self.parent.table] + self.parent.tables()
+
+
+# ---- Everything the engine knows about one owned table ----
+@dataclass(frozen=True)
+class TablePlan:
+    category: str
+    table: str
+    paths: Tuple[OwnerPath, ...]
+    # tables referenced by `fk` owners; not on any path, but their rows
+    # must outlive ours during deletion
+    refs: Tuple[str, ...] = ()
+
+    @property
+    def depends_on(self) -> frozenset:
+        above = {t for path in self.paths for t in path.tables()} | set(self.refs)
+        return frozenset(above - {self.table})
+
+    def where(self, subject_sql: str = ONE_SUBJECT) -> str:
+        return " OR ".join(path.match(subject_sql) for path in self.paths)
+
+    def select_sql(self) -> str:
+        return f"SELECT * FROM {self.table} WHERE {self.where()}"
+
+    def delete_sql(self, subject_sql: str = ONE_SUBJECT) -> str:
+        return f"DELETE FROM {self.table} WHERE {self.where(subject_sql)}"
+
+    def count_by_subject_sql(self) -> str:
+        """
+        (subject, rows) for the subjects in sar_subjects. Every row is
+        credited to exactly one subject, the one reached along the first
+        matching path (`owner` before `also_owned_by`), so the counts add up
+        to the rows delete_sql(MANY_SUBJECTS) removes.
+        """
+        owned = []
+        for i, path in enumerate(self.paths):
+            where = path.match(MANY_SUBJECTS)
+            earlier = " OR ".join(p.match(MANY_SUBJECTS) for p in self.paths[:i])
+            if earlier:
+                where += f" AND NOT ({earlier})"
+            owned.append(f"SELECT {path.owner_expr('t')} AS subject FROM {self.table} t WHERE {where}")
+        return f"SELECT subject, COUNT(*) FROM ({' UNION ALL '.join(owned)}) GROUP BY subject"
+
+
+class OwnershipGraphError(ValueError):
+    pass
+
+
+# ---- The compiled plan for the whole schema ----
+class OwnershipPlan:
+    """
+    policy.yml ownership metadata compiled into per-table SQL, ordered so
+    parents come before children (access) or after them (deletion).
+
+    Supported `owner` / `also_owned_by` types:
+      - column:            `column` holds the subject id (the subject table itself)
+      - fk:                `column` references the subject table
+      - via_project_owner: `project_fk` -> project_table.id, owned by `project_owner_column`
+      - via:               `column` -> ref_table.ref_column, owned however ref_table is
+    """
+
+    def __init__(self, tables: List[TablePlan], config: Dict[str, Any]):
+        self.tables = tables
+        self.by_category = {t.category: t for t in tables}
+        self.by_table = {t.table: t for t in tables}
+
+        sar = (config or {}).get("sar") or {}
+        self.access_categories = (
+            (sar.get("access") or {}).get("include_categories") or list(self.by_category)
+        )
+        self.deletion_categories = (
+            (sar.get("deletion") or {}).get("delete_categories") or list(self.by_category)
+        )
+
+    @classmethod
+    def from_policy(cls, config: Dict[str, Any]) -> "OwnershipPlan":
+        dcats = (config or {}).get("data_categories") or {}
+        table_of = {name: cat.get("table") for name, cat in dcats.items()}
+        category_of = {table: name for name, table in table_of.items()}
+
+        resolved: Dict[str, Tuple[OwnerPath, ...]] = {}
+        refs: Dict[str, Tuple[str, ...]] = {}
+        resolving = set()
+
+        def owner_specs(cat) -> List[Dict[str, Any]]:
+            specs = [cat["owner"]] if cat.get("owner") else []
+            return specs + list(cat.get("also_owned_by") or [])
+
+        def paths_for(category: str) -> Tuple[OwnerPath, ...]:
+            if category in resolved:
+                return resolved[category]
+            if category in resolving:
+                raise OwnershipGraphError(f"ownership cycle through data category {category!r}")
+            resolving.add(category)
+
+            cat = dcats[category]
+            table = cat["table"]
+            paths = []
+            fk_refs = []
+            for spec in owner_specs(cat):
+                kind = spec.get("type")
+                if kind in ("column", "fk"):
+                    paths.append(OwnerPath(table, spec["column"]))
+                    if spec.get("ref_table"):
+                        fk_refs.append(spec["ref_table"])
+                elif kind == "via_project_owner":
+                    project = OwnerPath(spec["project_table"], spec["project_owner_column"])
+                    paths.append(OwnerPath(table, spec["project_fk"], project, spec.get("project_key", "id")))
+                elif kind == "via":
+                    ref = spec["ref_table"]
+                    if ref not in category_of:
+                        raise OwnershipGraphError(
+                            f"{category}: ref_table {ref!r} is not a data category table"
+                        )
+                    for parent in paths_for(category_of[ref]):
+                        paths.append(OwnerPath(table, spec["column"], parent, spec.get("ref_column", "id")))
+                else:
+                    raise OwnershipGraphError(f"{category}: unknown owner type {kind!r}")
+
+            resolving.discard(category)
+            resolved[category] = tuple(paths)
+            refs[category] = tuple(fk_refs)
+            return resolved[category]
+
+        plans = [TablePlan(name, table_of[name], paths_for(name), refs[name]) for name in dcats]
+        return cls(_topological(plans), config)
+
+    # -- orders --
+    def access_order(self) -> List[TablePlan]:
+        """Every owned table, parents first."""
+        return list(self.tables)
+
+    def deletion_order(self) -> List[TablePlan]:
+        """Tables erased by SAR deletion, children first so FKs hold at every step."""
+        wanted = set(self.deletion_categories)
+        return [t for t in reversed(self.tables) if t.category in wanted]
+
+    def index_columns(self) -> List[Tuple[str, str]]:
+        """(table, column) pairs the generated queries filter on."""
+        cols = []
+        for plan in self.tables:
+            for path in plan.paths:
+                for hop in path.hops():
+                    if hop not in cols:
+                        cols.append(hop)
+        return cols
+
+
+def _topological(plans: List[TablePlan]) -> List[TablePlan]:
+    """Parents before children; ties keep policy.yml order."""
+    tables = {p.table for p in plans}
+    remaining = list(plans)
+    done: set = set()
+    ordered = []
+    while remaining:
+        for plan in remaining:
+            if (plan.depends_on & tables) <= done:
+                ordered.append(plan)
+                done.add(plan.table)
+                remaining.remove(plan)
+                break
+        else:
+            raise OwnershipGraphError(
+                "ownership cycle between tables " + ", ".join(p.table for p in remaining)
+            )
+    return ordered
@@ -0,0 +1,161 @@
+# ownership_index.py
+#
+# Materialized per-subject ownership index (K9db's per-user shard, in one
+# side table). row_owner maps every owned row to the data subject(s) it
+# belongs to, so a SAR lookup is one index probe per table instead of a walk
+# over the FK chain. Triggers generated from the ownership plan keep it up to
+# date on every INSERT / UPDATE / DELETE to an owned table.
+
+import sqlite3
+from typing import Dict, List, Tuple
+
+from ownership_graph import OwnershipPlan, TablePlan
+
+INDEX_TABLE = "row_owner"
+
+INDEX_DDL = f"""
+CREATE TABLE IF NOT EXISTS {INDEX_TABLE} (
+    owner_id INTEGER NOT NULL,
+    tbl      TEXT    NOT NULL,
+    row_id   INTEGER NOT NULL,
+    PRIMARY KEY (owner_id, tbl, row_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_{INDEX_TABLE}_row ON {INDEX_TABLE} (tbl, row_id);
+"""
+
+
+def _index_rows_sql(
+    plan: TablePlan, alias: str, where: str = "", target: str = INDEX_TABLE
+) -> List[str]:
+    """INSERTs adding `target` entries for the rows of plan.table matching `where`."""
+    stmts = []
+    for path in plan.paths:
+        owner = path.owner_expr(alias)
+        cond = f"{owner} IS NOT NULL" + (f" AND ({where})" if where else "")
+        stmts.append(
+            f"INSERT OR IGNORE INTO {target} (owner_id, tbl, row_id) "
+            f"SELECT {owner}, '{plan.table}', {alias}.rowid FROM {plan.table} {alias} WHERE {cond}"
+        )
+    return stmts
+
+
+def _reindex_dependents_sql(graph: OwnershipPlan, table: str, row_ref: str) -> List[str]:
+    """
+    Statements re-deriving the owners of rows in other tables whose ownership
+    runs through the `table` row `row_ref` (e.g. tasks when a project moves).
+    """
+    stmts = []
+    for dep in graph.tables:
+        if dep.table == table:
+            continue
+        conds = [c for c in (path.through(table, row_ref) for path in dep.paths) if c]
+        if not conds:
+            continue
+        affected = " OR ".join(f"({c})" for c in conds)
+        stmts.append(
+            f"DELETE FROM {INDEX_TABLE} WHERE tbl = '{dep.table}' AND row_id IN "
+            f"(SELECT rowid FROM {dep.table} WHERE {affected})"
+        )
+        stmts.extend(_index_rows_sql(dep, "d", affected))
+    return stmts
+
+
+def trigger_sql(graph: OwnershipPlan) -> List[str]:
+    """CREATE TRIGGER statements maintaining row_owner for every owned table."""
+    triggers = []
+    for plan in graph.tables:
+        t = plan.table
+        own_new = [
+            f"INSERT OR IGNORE INTO {INDEX_TABLE} (owner_id, tbl, row_id) "
+            f"SELECT {path.owner_expr('NEW')}, '{t}', NEW.rowid "
+            f"WHERE {path.owner_expr('NEW')} IS NOT NULL"
+            for path in plan.paths
+        ]
+        drop_old = f"DELETE FROM {INDEX_TABLE} WHERE tbl = '{t}' AND row_id = OLD.rowid"
+
+        bodies = {
+            "INSERT": own_new,
+            "UPDATE": [drop_old] + own_new
+                      + _reindex_dependents_sql(graph, t, "OLD")
+                      + _reindex_dependents_sql(graph, t, "NEW"),
+            "DELETE": [drop_old] + _reindex_dependents_sql(graph, t, "OLD"),
+        }
+        for event, body in bodies.items():
+            name = f"{INDEX_TABLE}_{t}_{event.lower()}"
+            stmts = "".join(f"    {stmt};\n" for stmt in body)
+            triggers.append(
+                f"CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON {t}\n"
+                f"BEGIN\n{stmts}END"
+            )
+    return triggers
+
+
+def is_enabled(conn: sqlite3.Connection) -> bool:
+    """True if the database behind `conn` has row_owner (enable_ownership_index was run on it)."""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (INDEX_TABLE,)
+    ).fetchone() is not None
+
+
+def index_query_sql(plan: TablePlan) -> str:
+    """SAR read for plan.table through the index: one probe on (owner_id, tbl)."""
+    return (
+        f"SELECT t.* FROM {INDEX_TABLE} o JOIN {plan.table} t ON t.rowid = o.row_id "
+        f"WHERE o.owner_id = :subject AND o.tbl = '{plan.table}'"
+    )
+
+
+def rebuild_ownership_index(conn: sqlite3.Connection, graph: OwnershipPlan, target: str = INDEX_TABLE):
+    """Recompute `target` from scratch by walking the live ownership graph."""
+    conn.execute(f"DELETE FROM {target}")
+    for plan in graph.tables:
+        for stmt in _index_rows_sql(plan, "t", target=target):
+            conn.execute(stmt)
+
+
+def enable_ownership_index(conn: sqlite3.Connection, graph: OwnershipPlan):
+    """Create row_owner and its triggers (idempotent) and build it from the live data."""
+    conn.executescript(INDEX_DDL)
+    for stmt in trigger_sql(graph):
+        conn.execute(stmt)
+    rebuild_ownership_index(conn, graph)
+    conn.commit()
+
+
+def disable_ownership_index(conn: sqlite3.Connection, graph: OwnershipPlan):
+    """Drop the triggers and the index table."""
+    for plan in graph.tables:
+        for event in ("insert", "update", "delete"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {INDEX_TABLE}_{plan.table}_{event}")
+    conn.execute(f"DROP TABLE IF EXISTS {INDEX_TABLE}")
+    conn.commit()
+
+
+def check_ownership_index(
+    conn: sqlite3.Connection, graph: OwnershipPlan
+) -> Dict[str, List[Tuple[int, str, int]]]:
+    """
+    Consistency check: rebuild the index into a temp table from the live
+    traversal and diff it against row_owner.
+
+    Returns {"missing": [...], "stale": [...]} of (owner_id, table, row_id):
+    entries the live data implies but the index lacks, and entries the index
+    holds that the live data no longer supports. Both empty means consistent.
+    """
+    conn.execute(
+        f"CREATE TEMP TABLE IF NOT EXISTS {INDEX_TABLE}_expected "
+        f"(owner_id INTEGER, tbl TEXT, row_id INTEGER, PRIMARY KEY (owner_id, tbl, row_id))"
+    )
+    expected = f"temp.{INDEX_TABLE}_expected"
+    rebuild_ownership_index(conn, graph, target=expected)
+
+    cols = "owner_id, tbl, row_id"
+    missing = conn.execute(
+        f"SELECT {cols} FROM {expected} EXCEPT SELECT {cols} FROM {INDEX_TABLE} ORDER BY 2, 3, 1"
+    ).fetchall()
+    stale = conn.execute(
+        f"SELECT {cols} FROM {INDEX_TABLE} EXCEPT SELECT {cols} FROM {expected} ORDER BY 2, 3, 1"
+    ).fetchall()
+    conn.execute(f"DROP TABLE {expected}")
+    conn.commit()
+    return {"missing": missing, "stale": stale}
@@ -1,121 +1,410 @@
 # ownership_layer.py
-from policy_layer import PCon, Context, TaskPolicy, UserPolicy, ProjectPolicy
+from policy_layer import (
+    POLICY_STORE, PConBatch, Context, DecisionCache, DecisionMemo,
+    TaskPolicy, shared_policy,
+)
 
 
+import dataclasses
+import json
 import sqlite3
-from typing import Dict, Any, List
-
-DB_PATH = "example.db"
-
-def get_conn():
-    return sqlite3.connect(DB_PATH)
-
-def get_all_data_for(user_id: int):
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, FrozenSet, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from config import POLICY_CONFIG
+from db import DEFAULT_DB_PATH, ConnectionManager
+from ownership_graph import MANY_SUBJECTS, ONE_SUBJECT, OwnershipPlan
+import change_tracking
+import metrics
+import ownership_index
+import policy_sql
+import tombstones
+
+DB_PATH = DEFAULT_DB_PATH
+
+# Pooled connections for DB_PATH, created on first use. Assigning a new
+# DB_PATH (or calling configure) switches every function here to it.
+_manager: Optional[ConnectionManager] = None
+
+def configure(db_path: Optional[str] = None, **manager_kwargs) -> ConnectionManager:
+    """
+    Point ownership_layer at `db_path` (default: current DB_PATH) with a
+    fresh connection pool; extra kwargs go to ConnectionManager (pragmas, ...).
+    """
+    global DB_PATH, _manager
+    if db_path is not None:
+        DB_PATH = db_path
+    if _manager is not None:
+        _manager.close_all()
+    _manager = ConnectionManager(DB_PATH, **manager_kwargs)
+    return _manager
+
+def get_manager() -> ConnectionManager:
+    if _manager is None or _manager.path != DB_PATH:
+        return configure()
+    return _manager
+
+def get_conn() -> sqlite3.Connection:
+    """This thread's pooled connection to DB_PATH."""
+    return get_manager().connection()
+
+# Rows are pulled from sqlite this many at a time by the streaming SAR paths,
+# which bounds how much of an account is held in memory at once.
+SAR_FETCH_SIZE = 500
+
+# K9db-lite SAR traversal and deletion, compiled from the ownership
+# metadata in policy.yml (see ownership_graph). Every owned table gets one
+# query keyed by the subject's user id; multi-hop ownership (tasks ->
+# projects -> users) becomes nested IN subqueries, so each table costs one
+# statement no matter how many rows or intermediate ids are involved.
+OWNERSHIP_PLAN = OwnershipPlan.from_policy(POLICY_CONFIG)
+
+# Bundle keys that differ from the table name
+BUNDLE_KEYS = {"project_members": "project_membership"}
+
+def bundle_key(table: str) -> str:
+    return BUNDLE_KEYS.get(table, table)
+
+# (bundle key, SELECT) for every owned table, parents first
+SAR_QUERIES = [
+    (bundle_key(t.table), t.select_sql()) for t in OWNERSHIP_PLAN.access_order()
+]
+
+# DELETEs for every erased table, children before parents so foreign keys
+# hold at every step
+SAR_DELETE_QUERIES = [t.delete_sql() for t in OWNERSHIP_PLAN.deletion_order()]
+SAR_DELETE_KEYS = [bundle_key(t.table) for t in OWNERSHIP_PLAN.deletion_order()]
+
+# Set-based deletion for many subjects at once. The subjects of the current
+# chunk sit in the temp table sar_subjects; each entry is
+# (bundle key, per-subject row count, delete), in SAR_DELETE_QUERIES order.
+SAR_BULK_DELETE_QUERIES = [
+    (bundle_key(t.table), t.count_by_subject_sql(), t.delete_sql(MANY_SUBJECTS))
+    for t in OWNERSHIP_PLAN.deletion_order()
+]
+
+# Opt-in materialized ownership index (see ownership_index): on a database
+# where enable_ownership_index() has built row_owner, SAR reads probe it once
+# per table instead of walking the FK chain. Whether it is there is checked
+# on the connection serving the read, never remembered across databases.
+# (bundle key, SELECT via row_owner), same order as SAR_QUERIES
+SAR_INDEX_QUERIES = [
+    (bundle_key(t.table), ownership_index.index_query_sql(t))
+    for t in OWNERSHIP_PLAN.access_order()
+]
+
+# (bundle key, SELECT hiding rows of tombstoned subjects), same order as
+# SAR_QUERIES; used instead of them while any tombstone is pending
+SAR_VISIBLE_QUERIES = [
+    (bundle_key(t.table), tombstones.visible_select_sql(t)) for t in OWNERSHIP_PLAN.access_order()
+]
+
+# Subjects erased per transaction by delete_all_data_for_many
+SAR_DELETE_CHUNK_SIZE = 1000
+
+@contextmanager
+def _connection(conn: Optional[sqlite3.Connection] = None):
+    """Use the caller's connection if given, otherwise this thread's pooled one."""
+    yield conn if conn is not None else get_conn()
+
+@contextmanager
+def _transaction(conn: sqlite3.Connection):
+    """
+    Commit on success, roll back on error: pooled connections outlive the
+    call, so a failed write must not ride along with the next commit.
+    """
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def _iter_table_batches(
+    conn: sqlite3.Connection,
+    user_id: int,
+    keys: Optional[Iterable[str]] = None,
+    batch_size: int = SAR_FETCH_SIZE,
+    use_index: Optional[bool] = None,
+    hide_tombstoned: Optional[bool] = None,
+) -> Iterator[Tuple[str, List[dict]]]:
+    """
+    Yield (bundle key, list of row dicts) for each SAR table in turn, at most
+    `batch_size` rows at a time, using cursor.fetchmany. Rows owned by a
+    subject with a pending tombstone are left out (hide_tombstoned=None
+    checks whether there are any; use_index=None uses row_owner if conn's
+    database has it).
+    """
+    if hide_tombstoned is None:
+        hide_tombstoned = tombstones.has_pending(conn)
+    if hide_tombstoned:
+        queries = SAR_VISIBLE_QUERIES
+    else:
+        if use_index is None:
+            use_index = ownership_index.is_enabled(conn)
+        queries = SAR_INDEX_QUERIES if use_index else SAR_QUERIES
+    wanted = set(keys) if keys is not None else None
+    cur = conn.cursor()
+    cur.row_factory = sqlite3.Row
+    try:
+        for key, sql in queries:
+            if wanted is not None and key not in wanted:
+                continue
+            if metrics.ENABLED:
+                metrics.inc("ownership_queries_total", table=key)
+            with metrics.timer("ownership_query_seconds", table=key):
+                cur.execute(sql, {"subject": user_id})
+            while True:
+                with metrics.timer("ownership_query_seconds", table=key):
+                    rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                if metrics.ENABLED:
+                    metrics.inc("ownership_rows_total", len(rows), table=key)
+                yield key, [dict(r) for r in rows]
+    finally:
+        cur.close()
+
+def iter_all_data_for(
+    user_id: int,
+    conn: Optional[sqlite3.Connection] = None,
+    batch_size: int = SAR_FETCH_SIZE,
+    use_index: Optional[bool] = None,
+) -> Iterator[Tuple[str, dict]]:
+    """
+    Streaming version of get_all_data_for: yields (bundle key, row) pairs
+    table by table instead of building the whole bundle.
+    """
+    with _connection(conn) as c:
+        for key, rows in _iter_table_batches(c, user_id, batch_size=batch_size, use_index=use_index):
+            yield from ((key, row) for row in rows)
+
+def get_all_data_for(
+    user_id: int,
+    conn: Optional[sqlite3.Connection] = None,
+    use_index: Optional[bool] = None,
+):
     """
     K9db-lite style SAR traversal:
       - users row
       - projects owned by user
       - tasks in those projects
-      - project_membership for those projects
+      - project_membership for those projects, plus the user's own memberships
       - profile_notes for this user
       - login_events for this user
     """
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-
-    bundle: dict[str, list[dict]] = {}
+    bundle: dict[str, list[dict]] = {key: [] for key, _ in SAR_QUERIES}
+    for key, row in iter_all_data_for(user_id, conn, use_index=use_index):
+        bundle[key].append(row)
+    return bundle
 
-    # user row
-    cur.execute("SELECT * FROM users WHERE id = ?", (user_id,))
-    bundle["users"] = [dict(r) for r in cur.fetchall()]
 
-    # projects owned by this user
-    cur.execute("SELECT * FROM projects WHERE owner_id = ?", (user_id,))
-    projects = cur.fetchall()
-    bundle["projects"] = [dict(r) for r in projects]
+def enable_ownership_index(conn: Optional[sqlite3.Connection] = None):
+    """
+    Create and build the row_owner index plus the triggers that keep it in
+    sync with every write; SAR reads on this database then go through it.
+    """
+    with _connection(conn) as c:
+        ownership_index.enable_ownership_index(c, OWNERSHIP_PLAN)
 
-    project_ids = [r["id"] for r in projects]
+def disable_ownership_index(conn: Optional[sqlite3.Connection] = None):
+    """Drop the row_owner index and go back to FK traversal for SAR reads."""
+    with _connection(conn) as c:
+        ownership_index.disable_ownership_index(c, OWNERSHIP_PLAN)
 
-    # tasks + memberships for those projects
-    if project_ids:
-        placeholders = ",".join("?" * len(project_ids))
+def check_ownership_index(conn: Optional[sqlite3.Connection] = None):
+    """
+    Rebuild the ownership index from the live traversal and diff it against
+    row_owner; see ownership_index.check_ownership_index.
+    """
+    with _connection(conn) as c:
+        return ownership_index.check_ownership_index(c, OWNERSHIP_PLAN)
 
-        cur.execute(
-            f"SELECT * FROM tasks WHERE project_id IN ({placeholders})",
-            project_ids,
-        )
-        bundle["tasks"] = [dict(r) for r in cur.fetchall()]
+def enable_change_tracking(conn: Optional[sqlite3.Connection] = None) -> int:
+    """
+    Start logging every change to owned rows in sar_changelog, for
+    incremental SAR exports. Returns the current watermark: changes made
+    after it are what the first get_data_changes_for(since=...) returns.
+    """
+    with _connection(conn) as c:
+        change_tracking.enable_change_tracking(c, OWNERSHIP_PLAN)
+        return change_tracking.current_watermark(c)
 
-        cur.execute(
-            f"SELECT * FROM project_members WHERE project_id IN ({placeholders})",
-            project_ids,
-        )
-        bundle["project_membership"] = [dict(r) for r in cur.fetchall()]
-    else:
-        bundle["tasks"] = []
-        bundle["project_membership"] = []
+def disable_change_tracking(conn: Optional[sqlite3.Connection] = None):
+    with _connection(conn) as c:
+        change_tracking.disable_change_tracking(c, OWNERSHIP_PLAN)
 
-    # profile_notes directly owned by this user
-    cur.execute("SELECT * FROM profile_notes WHERE user_id = ?", (user_id,))
-    bundle["profile_notes"] = [dict(r) for r in cur.fetchall()]
+def current_watermark(conn: Optional[sqlite3.Connection] = None) -> int:
+    with _connection(conn) as c:
+        return change_tracking.current_watermark(c)
 
-    # login_events for this user
-    cur.execute("SELECT * FROM login_events WHERE user_id = ?", (user_id,))
-    bundle["login_events"] = [dict(r) for r in cur.fetchall()]
+def get_data_changes_for(user_id: int, since: int = 0, conn: Optional[sqlite3.Connection] = None) -> Dict[str, Any]:
+    """
+    Incremental version of get_all_data_for: only what changed in the
+    subject's data after watermark `since`. Returns
+      {"watermark": int,                        # pass as `since` next time
+       "upserts": {bundle key: [current rows]},  # inserted / updated rows
+       "deletes": {bundle key: [primary keys]}}  # rows gone from the bundle
+    Needs enable_change_tracking(); since=0 covers everything logged.
+    """
+    with _connection(conn) as c:
+        watermark, upserts, deletes = change_tracking.changes_since(c, OWNERSHIP_PLAN, user_id, since)
+        if tombstones.is_pending(c, user_id):
+            upserts, deletes = {}, {}
+    return {
+        "watermark": watermark,
+        "upserts": {bundle_key(t): rows for t, rows in upserts.items()},
+        "deletes": {bundle_key(t): ids for t, ids in deletes.items()},
+    }
+
+# ---- Project memberships ----
+# Loaded once per request (with_memberships) from the connection serving it
+# and carried on the Context, never cached across requests: a membership
+# written by another connection or process counts from the next request on.
+def load_memberships(user_id: int, conn: Optional[sqlite3.Connection] = None) -> FrozenSet[int]:
+    """Ids of the projects `user_id` is a member of (one indexed query)."""
+    with _connection(conn) as c, metrics.timer("ownership_stage_seconds", stage="memberships"):
+        return frozenset(
+            row[0] for row in c.execute(
+                "SELECT project_id FROM project_members WHERE user_id = ?", (user_id,)
+            )
+        )
 
-    conn.close()
-    return bundle
+def with_memberships(ctx: Context, conn: Optional[sqlite3.Connection] = None) -> Context:
+    """ctx with member_of filled in for this request, so member checks need no DB lookups."""
+    if ctx.member_of is not None:
+        return ctx
+    return dataclasses.replace(ctx, member_of=load_memberships(ctx.user_id, conn))
+
+def add_project_member(
+    project_id: int, user_id: int, role: str = "viewer", conn: Optional[sqlite3.Connection] = None
+):
+    with _connection(conn) as c, _transaction(c):
+        c.execute(
+            "INSERT OR IGNORE INTO project_members (project_id, user_id, role) VALUES (?, ?, ?)",
+            (project_id, user_id, role),
+        )
 
+def remove_project_member(project_id: int, user_id: int, conn: Optional[sqlite3.Connection] = None):
+    with _connection(conn) as c, _transaction(c):
+        c.execute(
+            "DELETE FROM project_members WHERE project_id = ? AND user_id = ?",
+            (project_id, user_id),
+        )
 
-def delete_all_data_for(user_id: int):
+def delete_all_data_for(user_id: int, conn: Optional[sqlite3.Connection] = None):
     """
     K9db-lite style deletion:
       - delete profile_notes and login_events for this user
-      - delete project_membership rows for projects they own
+      - delete project_membership rows for projects they own, and their
+        own memberships in other users' projects
       - delete tasks in those projects
       - delete projects they own
       - delete the user row
     Does NOT touch other users' rows (e.g., notes/events for user 99).
     """
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    if conn is None:
+        conn = get_conn()
     cur = conn.cursor()
+    cur.row_factory = sqlite3.Row
 
     cur.execute("PRAGMA foreign_keys = ON;")
 
-    # Find projects owned by this user
-    cur.execute("SELECT id FROM projects WHERE owner_id = ?", (user_id,))
-    project_ids = [row["id"] for row in cur.fetchall()]
-
-    # Delete profile_notes and login_events for this user
-    cur.execute("DELETE FROM profile_notes WHERE user_id = ?", (user_id,))
-    cur.execute("DELETE FROM login_events WHERE user_id = ?", (user_id,))
+    with metrics.timer("ownership_stage_seconds", stage="delete"), _transaction(conn):
+        for key, sql in zip(SAR_DELETE_KEYS, SAR_DELETE_QUERIES):
+            cur.execute(sql, {"subject": user_id})
+            if metrics.ENABLED:
+                metrics.inc("ownership_queries_total", table=key)
+                metrics.inc("ownership_rows_deleted_total", cur.rowcount, table=key)
+        if change_tracking.is_enabled(conn):
+            # The erased subject's change history goes too
+            cur.execute(change_tracking.forget_subject_sql(ONE_SUBJECT), {"subject": user_id})
+
+def delete_all_data_for_many(
+    user_ids: Iterable[int],
+    conn: Optional[sqlite3.Connection] = None,
+    chunk_size: int = SAR_DELETE_CHUNK_SIZE,
+) -> Dict[int, Dict[str, int]]:
+    """
+    K9db-lite deletion for many data subjects at once.
 
-    # If they own projects, delete tasks and memberships tied to those projects
-    if project_ids:
-        placeholders = ",".join("?" * len(project_ids))
+    Subjects are processed `chunk_size` at a time: each chunk is loaded into
+    a temp table and erased with one set-based DELETE per table inside a
+    single transaction, so N subjects cost N / chunk_size commits instead of N.
 
-        cur.execute(
-            f"DELETE FROM project_members WHERE project_id IN ({placeholders})",
-            project_ids,
-        )
-        cur.execute(
-            f"DELETE FROM tasks WHERE project_id IN ({placeholders})",
-            project_ids,
-        )
-        cur.execute(
-            f"DELETE FROM projects WHERE id IN ({placeholders})",
-            project_ids,
-        )
+    Returns {user_id: {bundle key: rows deleted}} for every requested id. A
+    row owned by several subjects of one chunk is counted for only one of
+    them (see TablePlan.count_by_subject_sql), so per table the counts sum
+    to the rows deleted.
+    """
+    if conn is None:
+        conn = get_conn()
+    ids = list(dict.fromkeys(user_ids))  # de-duplicate, keep order
+    report = {uid: {key: 0 for key, _, _ in SAR_BULK_DELETE_QUERIES} for uid in ids}
 
-    # Finally, delete the user row
-    cur.execute("DELETE FROM users WHERE id = ?", (user_id,))
+    cur = conn.cursor()
+    cur.execute("PRAGMA foreign_keys = ON;")
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS sar_subjects (user_id INTEGER PRIMARY KEY)")
+    tracking = change_tracking.is_enabled(conn)
+
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        try:
+            cur.execute("DELETE FROM temp.sar_subjects")
+            cur.executemany(
+                "INSERT INTO temp.sar_subjects (user_id) VALUES (?)",
+                ((uid,) for uid in chunk),
+            )
+            for key, count_sql, delete_sql in SAR_BULK_DELETE_QUERIES:
+                with metrics.timer("ownership_query_seconds", table=key):
+                    for uid, n in cur.execute(count_sql).fetchall():
+                        report[uid][key] = n
+                    cur.execute(delete_sql)
+                if metrics.ENABLED:
+                    metrics.inc("ownership_queries_total", 2, table=key)
+                    metrics.inc("ownership_rows_deleted_total", cur.rowcount, table=key)
+            if tracking:
+                cur.execute(change_tracking.forget_subject_sql(MANY_SUBJECTS))
+            cur.execute("DELETE FROM temp.sar_subjects")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    return report
+
+# ---- Deferred deletion (see tombstones) ----
+def tombstone_subject(
+    user_id: int,
+    conn: Optional[sqlite3.Connection] = None,
+    deadline_seconds: float = tombstones.PURGE_DEADLINE_SECONDS,
+):
+    """Hide user_id's data now and queue it for purge_tombstoned within deadline_seconds."""
+    with _connection(conn) as c:
+        tombstones.tombstone(c, [user_id], deadline_seconds)
+
+def purge_tombstoned(
+    conn: Optional[sqlite3.Connection] = None,
+    batch_size: int = tombstones.PURGE_BATCH_SIZE,
+    budget: Optional[float] = None,
+    pause: float = 0.0,
+    stop: Optional[threading.Event] = None,
+) -> tombstones.PurgeReport:
+    """
+    Erase tombstoned subjects in chunks of batch_size rows, earliest deadline
+    first; see tombstones.purge for how `budget` and `stop` end a pass early.
+    """
+    with _connection(conn) as c, metrics.timer("ownership_stage_seconds", stage="purge"):
+        c.execute("PRAGMA foreign_keys = ON;")
+        return tombstones.purge(c, OWNERSHIP_PLAN, batch_size, budget, pause, stop)
 
-    conn.commit()
-    conn.close()
+def deletion_status(user_id: int, conn: Optional[sqlite3.Connection] = None) -> Dict[str, Any]:
+    """Where user_id's deferred deletion stands; see tombstones.status."""
+    with _connection(conn) as c:
+        return tombstones.status(c, user_id)
 
-def populate_demo_data_for(user_id: int = 42):
+def populate_demo_data_for(user_id: int = 42, conn: Optional[sqlite3.Connection] = None):
     """
     Create demo data for a given user_id:
       - user row for `user_id`
@@ -126,225 +415,358 @@ def populate_demo_data_for(user_id: int = 42):
       - several profile_notes and login_events for this user
       - also ensures user 99 has their own notes/events to show they survive deletion of 42
     """
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    if conn is None:
+        conn = get_conn()
     cur = conn.cursor()
+    cur.row_factory = sqlite3.Row
 
     cur.execute("PRAGMA foreign_keys = ON;")
 
-    def ensure_user(id_, email, name):
-        cur.execute("SELECT 1 FROM users WHERE id = ?", (id_,))
-        if cur.fetchone() is None:
-            cur.execute(
-                "INSERT INTO users (id, email, name) VALUES (?, ?, ?)",
-                (id_, email, name),
-            )
-
-    # owner user
-    ensure_user(user_id, f"owner{user_id}@example.com", f"Owner {user_id}")
+    with _transaction(conn):
+        def ensure_user(id_, email, name):
+            cur.execute("SELECT 1 FROM users WHERE id = ?", (id_,))
+            if cur.fetchone() is None:
+                cur.execute(
+                    "INSERT INTO users (id, email, name) VALUES (?, ?, ?)",
+                    (id_, email, name),
+                )
 
-    # member user
-    ensure_user(99, "member@example.com", "Member User")
+        # owner user
+        ensure_user(user_id, f"owner{user_id}@example.com", f"Owner {user_id}")
 
-    # admin user
-    ensure_user(1, "admin@example.com", "Admin User")
+        # member user
+        ensure_user(99, "member@example.com", "Member User")
 
-    # --- create a project owned by user_id (if not exists) ---
-    cur.execute(
-        "SELECT id FROM projects WHERE owner_id = ? LIMIT 1",
-        (user_id,),
-    )
-    row = cur.fetchone()
-    if row is None:
-        project_id = 123  # fixed id for demo
-        cur.execute(
-            "INSERT INTO projects (id, owner_id, title) VALUES (?, ?, ?)",
-            (project_id, user_id, "K9db Demo Project"),
-        )
-    else:
-        project_id = row["id"]
+        # admin user
+        ensure_user(1, "admin@example.com", "Admin User")
 
-    # --- ensure user 99 is a member of this project ---
-    cur.execute(
-        "SELECT 1 FROM project_members WHERE project_id = ? AND user_id = ?",
-        (project_id, 99),
-    )
-    if cur.fetchone() is None:
+        # --- create a project owned by user_id (if not exists) ---
         cur.execute(
-            "INSERT INTO project_members (project_id, user_id, role) VALUES (?, ?, ?)",
-            (project_id, 99, "editor"),
-        )
-
-    # --- create 10 tasks for this project (only if fewer than 10 exist) ---
-    cur.execute(
-        "SELECT COUNT(*) FROM tasks WHERE project_id = ?",
-        (project_id,),
-    )
-    existing_count = cur.fetchone()[0]
-    to_create = max(0, 10 - existing_count)
-    for i in range(to_create):
-        cur.execute(
-            "INSERT INTO tasks (project_id, title, done) VALUES (?, ?, ?)",
-            (project_id, f"Sample Task #{existing_count + i + 1}", 0),
+            "SELECT id FROM projects WHERE owner_id = ? LIMIT 1",
+            (user_id,),
         )
+        row = cur.fetchone()
+        if row is None:
+            project_id = 123  # fixed id for demo
+            cur.execute(
+                "INSERT INTO projects (id, owner_id, title) VALUES (?, ?, ?)",
+                (project_id, user_id, "K9db Demo Project"),
+            )
+        else:
+            project_id = row["id"]
 
-    # --- profile_notes for this user ---
-    cur.execute(
-        "SELECT COUNT(*) FROM profile_notes WHERE user_id = ?",
-        (user_id,),
-    )
-    notes_count = cur.fetchone()[0]
-    notes_to_create = max(0, 3 - notes_count)
-    for i in range(notes_to_create):
+        # --- ensure user 99 is a member of this project ---
         cur.execute(
-            "INSERT INTO profile_notes (user_id, note) VALUES (?, ?)",
-            (user_id, f"Note #{notes_count + i + 1} for user {user_id}"),
+            "SELECT 1 FROM project_members WHERE project_id = ? AND user_id = ?",
+            (project_id, 99),
         )
+        if cur.fetchone() is None:
+            cur.execute(
+                "INSERT INTO project_members (project_id, user_id, role) VALUES (?, ?, ?)",
+                (project_id, 99, "editor"),
+            )
 
-    # --- login_events for this user ---
-    cur.execute(
-        "SELECT COUNT(*) FROM login_events WHERE user_id = ?",
-        (user_id,),
-    )
-    ev_count = cur.fetchone()[0]
-    ev_to_create = max(0, 5 - ev_count)
-    for i in range(ev_to_create):
+        # --- create 10 tasks for this project (only if fewer than 10 exist) ---
         cur.execute(
-            "INSERT INTO login_events (user_id, ts, ip) VALUES (?, datetime('now'), ?)",
-            (user_id, f"192.0.2.{(ev_count + i) % 255}"),
+            "SELECT COUNT(*) FROM tasks WHERE project_id = ?",
+            (project_id,),
         )
+        existing_count = cur.fetchone()[0]
+        to_create = max(0, 10 - existing_count)
+        for i in range(to_create):
+            cur.execute(
+                "INSERT INTO tasks (project_id, title, done) VALUES (?, ?, ?)",
+                (project_id, f"Sample Task #{existing_count + i + 1}", 0),
+            )
 
-    # --- also seed some notes/events for user 99 so we can show they survive deletion of 42 ---
-    for other_id in (99,):
+        # --- profile_notes for this user ---
         cur.execute(
             "SELECT COUNT(*) FROM profile_notes WHERE user_id = ?",
-            (other_id,),
+            (user_id,),
         )
-        c = cur.fetchone()[0]
-        if c == 0:
+        notes_count = cur.fetchone()[0]
+        notes_to_create = max(0, 3 - notes_count)
+        for i in range(notes_to_create):
             cur.execute(
                 "INSERT INTO profile_notes (user_id, note) VALUES (?, ?)",
-                (other_id, f"Note for user {other_id}"),
+                (user_id, f"Note #{notes_count + i + 1} for user {user_id}"),
             )
 
+        # --- login_events for this user ---
         cur.execute(
             "SELECT COUNT(*) FROM login_events WHERE user_id = ?",
-            (other_id,),
+            (user_id,),
         )
-        c2 = cur.fetchone()[0]
-        if c2 == 0:
+        ev_count = cur.fetchone()[0]
+        ev_to_create = max(0, 5 - ev_count)
+        for i in range(ev_to_create):
             cur.execute(
                 "INSERT INTO login_events (user_id, ts, ip) VALUES (?, datetime('now'), ?)",
-                (other_id, "198.51.100.99"),
+                (user_id, f"192.0.2.{(ev_count + i) % 255}"),
             )
 
-    conn.commit()
-    conn.close()
-
-def sar_access_with_policies(user_id: int, ctx: Context):
-    bundle = get_all_data_for(user_id)
-    result = {}
-
-    # === USERS: enforce SAR semantics inline (matching policy.yml) ===
-    protected_users = []
-    for row in bundle.get("users", []):
-        # For sar_access:
-        #  - self (user_id == row["id"])
-        #  - admin
-        #  - dpo
-        if ctx.purpose == "sar_access" and (
-            ctx.user_id == row["id"] or ctx.role in ("admin", "dpo")
-        ):
-            # full visibility
-            protected_users.append(dict(row))
-        else:
-            # redact sensitive profile fields
-            protected_users.append({
-                "id": "REDACTED",
-                "email": "REDACTED",
-                "name": "REDACTED",
-            })
-    result["users"] = protected_users
-
-    # === PROJECTS: enforce SAR semantics inline (matching policy.yml) ===
-    protected_projects = []
-    for row in bundle.get("projects", []):
-        owner_id = row["owner_id"]
-
-        # For sar_access:
-        #  - project owner
-        #  - admin
-        #  - dpo
-        if ctx.purpose == "sar_access" and (
-            ctx.user_id == owner_id or ctx.role in ("admin", "dpo")
-        ):
-            protected_projects.append(dict(row))
-        else:
-            protected_projects.append({
-                "id": "REDACTED",
-                "owner_id": "REDACTED",
-                "title": "REDACTED",
-            })
-    result["projects"] = protected_projects
-
-    # === project_membership left raw for now ===
-    result["project_membership"] = bundle.get("project_membership", [])
-
-
-    # Handle tasks with Sesame field-level policies
-    tasks = bundle.get("tasks", [])
-
-    if tasks:
-        import sqlite3
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cur = conn.cursor()
-
-        protected_rows = []
-
-        for row in tasks:
-            # Look up the owner of the project this task belongs to
-            cur.execute("SELECT owner_id FROM projects WHERE id = ?", (row["project_id"],))
-            proj = cur.fetchone()
-            if proj is None:
-                protected_rows.append(row)
-                continue
-
-            owner_id = proj["owner_id"]
-
-            # Build Sesame policy for this task
-            policy = TaskPolicy(project_id=row["project_id"], project_owner_id=owner_id)
+        # --- also seed some notes/events for user 99 so we can show they survive deletion of 42 ---
+        for other_id in (99,):
+            cur.execute(
+                "SELECT COUNT(*) FROM profile_notes WHERE user_id = ?",
+                (other_id,),
+            )
+            c = cur.fetchone()[0]
+            if c == 0:
+                cur.execute(
+                    "INSERT INTO profile_notes (user_id, note) VALUES (?, ?)",
+                    (other_id, f"Note for user {other_id}"),
+                )
 
-            # Wrap fields in PCon for Sesame enforcement
-            title_pcon = PCon(row["title"], policy)
-            done_pcon = PCon(row["done"], policy)
+            cur.execute(
+                "SELECT COUNT(*) FROM login_events WHERE user_id = ?",
+                (other_id,),
+            )
+            c2 = cur.fetchone()[0]
+            if c2 == 0:
+                cur.execute(
+                    "INSERT INTO login_events (user_id, ts, ip) VALUES (?, datetime('now'), ?)",
+                    (other_id, "198.51.100.99"),
+                )
+
+
+def _protect_user_row(row: dict, ctx: Context) -> dict:
+    # For sar_access:
+    #  - self (user_id == row["id"])
+    #  - admin
+    #  - dpo
+    if ctx.purpose == "sar_access" and (
+        ctx.user_id == row["id"] or ctx.role in ("admin", "dpo")
+    ):
+        # full visibility
+        return dict(row)
+    # redact sensitive profile fields
+    return {
+        "id": "REDACTED",
+        "email": "REDACTED",
+        "name": "REDACTED",
+    }
+
+def _protect_project_row(row: dict, ctx: Context) -> dict:
+    # For sar_access:
+    #  - project owner
+    #  - admin
+    #  - dpo
+    if ctx.purpose == "sar_access" and (
+        ctx.user_id == row["owner_id"] or ctx.role in ("admin", "dpo")
+    ):
+        return dict(row)
+    return {
+        "id": "REDACTED",
+        "owner_id": "REDACTED",
+        "title": "REDACTED",
+    }
+
+def _protect_task_rows(rows: List[dict], user_id: int, ctx: Context, memo: DecisionMemo) -> List[dict]:
+    # Every task in a SAR traversal sits in a project owned by the subject
+    # (SAR_QUERIES selects tasks through `projects.owner_id = user_id`), so
+    # the owner is known without another lookup. Reveal the columns in bulk:
+    # one interned TaskPolicy per project, each evaluated once per ctx.
+    project_ids = [row["project_id"] for row in rows]
+
+    def task_policy(project_id):
+        return shared_policy(TaskPolicy, project_id, user_id)
+
+    titles = PConBatch.from_owners([row["title"] for row in rows], project_ids, task_policy)
+    dones = PConBatch.from_owners([row["done"] for row in rows], project_ids, task_policy)
+
+    return [
+        {
+            "id": row["id"],
+            "project_id": row["project_id"],
+            "title": visible_title,
+            "done": visible_done,
+        }
+        for row, visible_title, visible_done in zip(
+            rows, titles.reveal(ctx, memo=memo), dones.reveal(ctx, memo=memo)
+        )
+    ]
+
+def _protect_rows(key: str, rows: List[dict], user_id: int, ctx: Context, memo: DecisionMemo) -> List[dict]:
+    """Apply the SAR access policy for bundle `key` to rows of user_id's data."""
+    with metrics.timer("ownership_stage_seconds", stage="policy", table=key):
+        if key == "users":
+            return [_protect_user_row(row, ctx) for row in rows]
+        if key == "projects":
+            return [_protect_project_row(row, ctx) for row in rows]
+        if key == "tasks":
+            return _protect_task_rows(rows, user_id, ctx, memo)
+        # project_membership left raw for now
+        return rows
+
+# Bundle keys a SAR access export returns (policy.yml sar.access.include_categories)
+SAR_ACCESS_KEYS = [
+    bundle_key(OWNERSHIP_PLAN.by_category[c].table) for c in OWNERSHIP_PLAN.access_categories
+]
+
+def iter_sar_access_with_policies(
+    user_id: int,
+    ctx: Context,
+    conn: Optional[sqlite3.Connection] = None,
+    batch_size: int = SAR_FETCH_SIZE,
+    decision_cache: Optional[DecisionCache] = None,
+    use_index: Optional[bool] = None,
+) -> Iterator[Tuple[str, dict]]:
+    """
+    Streaming, policy-filtered SAR export: yields (bundle key, row) pairs
+    table by table, holding at most `batch_size` rows in memory.
+    Decisions are shared across requests only through a decision_cache
+    passed in (e.g. policy_layer.DECISION_CACHE).
+    """
+    with _connection(conn) as c:
+        # The requester's memberships are loaded once for the whole export
+        ctx = with_memberships(ctx, c)
+        memo = DecisionMemo(ctx, decision_cache)
+        hide_tombstoned = tombstones.has_pending(c)
+        if use_index is None:
+            use_index = ownership_index.is_enabled(c)
+
+        # One table at a time, in SAR_ACCESS_KEYS order
+        for key in SAR_ACCESS_KEYS:
+            for _, rows in _iter_table_batches(
+                c, user_id, keys=(key,), batch_size=batch_size,
+                use_index=use_index, hide_tombstoned=hide_tombstoned,
+            ):
+                rows = _protect_rows(key, rows, user_id, ctx, memo)
+                yield from ((key, row) for row in rows)
+
+def sar_access_with_policies(
+    user_id: int,
+    ctx: Context,
+    conn: Optional[sqlite3.Connection] = None,
+    decision_cache: Optional[DecisionCache] = None,
+    use_index: Optional[bool] = None,
+):
+    result = {key: [] for key in SAR_ACCESS_KEYS}
+    with metrics.timer("ownership_stage_seconds", stage="sar_access"):
+        for key, row in iter_sar_access_with_policies(
+            user_id, ctx, conn, decision_cache=decision_cache, use_index=use_index
+        ):
+            result[key].append(row)
+    return result
 
-            # Reveal fields using the provided Context
-            try:
-                visible_title = title_pcon.reveal(ctx)
-            except Exception:
-                visible_title = "REDACTED"
+def sar_access_changes_with_policies(
+    user_id: int,
+    ctx: Context,
+    since: int = 0,
+    conn: Optional[sqlite3.Connection] = None,
+    decision_cache: Optional[DecisionCache] = None,
+) -> Dict[str, Any]:
+    """
+    Policy-filtered incremental SAR: get_data_changes_for limited to the SAR
+    access categories, with upserted rows protected exactly as in
+    sar_access_with_policies. Deleted rows are reported by primary key, as they are.
+    """
+    with _connection(conn) as c:
+        changes = get_data_changes_for(user_id, since, c)
+        ctx = with_memberships(ctx, c)
+    memo = DecisionMemo(ctx, decision_cache)
+    return {
+        "watermark": changes["watermark"],
+        "upserts": {
+            key: _protect_rows(key, changes["upserts"].get(key, []), user_id, ctx, memo)
+            for key in SAR_ACCESS_KEYS
+        },
+        "deletes": {key: changes["deletes"].get(key, []) for key in SAR_ACCESS_KEYS},
+    }
+
+def write_sar_export(
+    user_id: int,
+    ctx: Context,
+    sink: TextIO,
+    conn: Optional[sqlite3.Connection] = None,
+    batch_size: int = SAR_FETCH_SIZE,
+    decision_cache: Optional[DecisionCache] = None,
+) -> Dict[str, int]:
+    """
+    Write a policy-filtered SAR export to `sink` as NDJSON, one
+    {"table": ..., "row": {...}} object per line, without ever building the
+    full bundle. Returns the number of rows written per table.
+    """
+    counts = {key: 0 for key in SAR_ACCESS_KEYS}
+    with metrics.timer("ownership_stage_seconds", stage="sar_export"):
+        for key, row in iter_sar_access_with_policies(user_id, ctx, conn, batch_size, decision_cache):
+            sink.write(json.dumps({"table": key, "row": row}, default=str))
+            sink.write("\n")
+            counts[key] += 1
+    return counts
+
+def list_tasks(
+    ctx: Context,
+    project_id: Optional[int] = None,
+    conn: Optional[sqlite3.Connection] = None,
+    mode: str = policy_sql.FILTER,
+    pushdown: bool = True,
+    decision_cache: Optional[DecisionCache] = None,
+) -> List[dict]:
+    """
+    Tasks (optionally of one project) as ctx may see them under ctx.purpose.
 
-            try:
-                visible_done = done_pcon.reveal(ctx)
-            except Exception:
-                visible_done = "REDACTED"
+    mode="filter" returns only the tasks ctx may see; mode="redact" returns
+    every task with title/done REDACTED where denied. With pushdown (the
+    default) SQLite applies the policy via policy_sql; pushdown=False fetches
+    every row and applies TaskPolicy in Python, for verification. Tasks of
+    projects whose owner has a pending tombstone are never listed.
+    """
+    snapshot = POLICY_STORE.current()
+    with _connection(conn) as c:
+        cur = c.cursor()
+        cur.row_factory = sqlite3.Row
+        hidden_owners = tombstones.PENDING_SQL if tombstones.has_pending(c) else None
+        # Both paths decide membership from ctx.member_of
+        ctx = with_memberships(ctx, c)
+
+        if pushdown:
+            sql, params = policy_sql.task_view_sql(ctx, project_id, mode, snapshot, hidden_owners)
+            with metrics.timer("ownership_stage_seconds", stage="list_tasks_pushdown"):
+                return [dict(row) for row in cur.execute(sql, params)]
+
+        if mode not in (policy_sql.FILTER, policy_sql.REDACT):
+            raise ValueError(f"unknown pushdown mode {mode!r}")
+        sql = (
+            "SELECT t.id, t.project_id, t.title, t.done, p.owner_id "
+            "FROM tasks t JOIN projects p ON p.id = t.project_id"
+        )
+        params: Dict[str, Any] = {}
+        if project_id is not None:
+            sql += " WHERE t.project_id = :project_id"
+            params["project_id"] = project_id
+        rows = cur.execute(sql + " ORDER BY t.id", params).fetchall()
+        if hidden_owners is not None:
+            hidden = {row[0] for row in c.execute(hidden_owners)}
+            rows = [row for row in rows if row["owner_id"] not in hidden]
+    memo = DecisionMemo(ctx, decision_cache, snapshot)
+    owners = {row["project_id"]: row["owner_id"] for row in rows}
+    policies = PConBatch.from_owners(
+        [row["id"] for row in rows],
+        [row["project_id"] for row in rows],
+        lambda pid: shared_policy(TaskPolicy, pid, owners[pid]),
+    )
 
-            protected_rows.append({
+    visible = []
+    for row, allowed in zip(rows, policies.mask(ctx, memo)):
+        if allowed:
+            visible.append({key: row[key] for key in ("id", "project_id", "title", "done")})
+        elif mode == policy_sql.REDACT:
+            visible.append({
                 "id": row["id"],
                 "project_id": row["project_id"],
-                "title": visible_title,
-                "done": visible_done,
+                **{col: policy_sql.REDACTED for col in policy_sql.TASK_GUARDED_COLUMNS},
             })
-
-        conn.close()
-        result["tasks"] = protected_rows
-    else:
-        result["tasks"] = []
-
-    return result
-
-def sar_delete_with_policies(target_user_id: int, ctx: Context):
+    return visible
+
+def sar_delete_with_policies(
+    target_user_id: int,
+    ctx: Context,
+    conn: Optional[sqlite3.Connection] = None,
+    deferred: bool = False,
+    deadline_seconds: float = tombstones.PURGE_DEADLINE_SECONDS,
+):
     """
     Policy-checked SAR deletion.
 
@@ -352,6 +774,11 @@ def sar_delete_with_policies(target_user_id: int, ctx: Context):
       - the requester is deleting their own data, OR
       - the requester is an admin or DPO.
     Otherwise, raise PermissionError.
+
+    deferred=True only tombstones the subject: their data disappears from
+    every SAR / view path at once, and purge_tombstoned (or a
+    tombstones.TombstonePurger) erases it within `deadline_seconds`.
+    Returns deletion_status() in that case.
     """
     # Simple Sesame-style check at the "endpoint" level
     if ctx.user_id == target_user_id:
@@ -366,7 +793,34 @@ def sar_delete_with_policies(target_user_id: int, ctx: Context):
             f"user {ctx.user_id} with role={ctx.role} is not allowed to delete user {target_user_id}'s data"
         )
 
+    if deferred:
+        tombstone_subject(target_user_id, conn, deadline_seconds)
+        return deletion_status(target_user_id, conn)
+
     # If allowed, call K9db-lite deletion
-    delete_all_data_for(target_user_id)
+    delete_all_data_for(target_user_id, conn)
+
+def sar_delete_many_with_policies(
+    target_user_ids: Iterable[int],
+    ctx: Context,
+    conn: Optional[sqlite3.Connection] = None,
+    chunk_size: int = SAR_DELETE_CHUNK_SIZE,
+) -> Dict[int, Dict[str, int]]:
+    """
+    Policy-checked bulk SAR deletion.
 
+    Every target is authorized (same rule as sar_delete_with_policies) before
+    anything is deleted; if any is not allowed, raise PermissionError and
+    delete nothing. Returns the per-user row counts from delete_all_data_for_many.
+    """
+    targets = list(target_user_ids)
+    denied = [
+        uid for uid in targets
+        if not (ctx.user_id == uid or ctx.role in ("admin", "dpo"))
+    ]
+    if denied:
+        raise PermissionError(
+            f"user {ctx.user_id} with role={ctx.role} is not allowed to delete data for users {denied}"
+        )
 
+    return delete_all_data_for_many(targets, conn, chunk_size)
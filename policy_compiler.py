@@ -0,0 +1,66 @@
+# policy_compiler.py
+
+from typing import Any, Dict, Tuple
+
+# ---- Principal bits ----
+# Every name that can appear under `allow:` in policy.yml gets one bit.
+# A compiled rule is the OR of the bits it allows, so a policy check is a
+# single AND between the rule mask and the bits the context holds.
+SELF           = 1 << 0
+OWNER          = 1 << 1
+PROJECT_OWNER  = 1 << 2
+MEMBER         = 1 << 3
+PROJECT_MEMBER = 1 << 4
+ADMIN          = 1 << 5
+DPO            = 1 << 6
+
+PRINCIPAL_BITS: Dict[str, int] = {
+    "self": SELF,
+    "owner": OWNER,
+    "project_owner": PROJECT_OWNER,
+    "member": MEMBER,
+    "project_member": PROJECT_MEMBER,
+    "admin": ADMIN,
+    "dpo": DPO,
+}
+
+# Principals a context holds purely because of its role, independent of
+# which row is being checked.
+ROLE_BITS: Dict[str, int] = {
+    "admin": ADMIN,
+    "dpo": DPO,
+}
+
+DecisionTable = Dict[Tuple[str, str], int]
+
+
+def principal_mask(names) -> int:
+    """OR together the bits for a list of principal names (unknown names are ignored)."""
+    mask = 0
+    for name in names or []:
+        mask |= PRINCIPAL_BITS.get(name, 0)
+    return mask
+
+
+def compile_policy_config(config: Dict[str, Any]) -> DecisionTable:
+    """
+    Turn policy.yml -> data_categories.*.access_policies into a
+    (category, purpose) -> allowed-principal bitmask table.
+
+    Several rules for the same purpose are merged, matching the old
+    "any matching rule allows" behaviour of the interpreted checks.
+    Categories or purposes that are not listed simply have no entry,
+    which callers treat as "deny".
+    """
+    table: DecisionTable = {}
+
+    dcats = (config or {}).get("data_categories") or {}
+    for category, cat in dcats.items():
+        for rule in (cat or {}).get("access_policies") or []:
+            purpose = rule.get("purpose")
+            if purpose is None:
+                continue
+            key = (category, purpose)
+            table[key] = table.get(key, 0) | principal_mask(rule.get("allow"))
+
+    return table
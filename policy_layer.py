@@ -1,22 +1,236 @@
 # policy_layer.py
 
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Any, Callable
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, Hashable, List, Optional, Sequence, Tuple
+import config
+import metrics
 from config import POLICY_CONFIG
+from policy_compiler import MEMBER, OWNER, PROJECT_MEMBER, PROJECT_OWNER, ROLE_BITS, SELF
+from policy_store import PolicySnapshot, PolicyStore
+
+# policy.yml compiled at import into the first snapshot:
+# (category, purpose) -> bitmask of allowed principals.
+# POLICY_STORE.watch() picks up later edits without a restart.
+POLICY_STORE = PolicyStore(config.POLICY_PATH, initial_config=POLICY_CONFIG)
+
+
+def reload_policies(policy_config: Optional[Dict[str, Any]] = None) -> PolicySnapshot:
+    """
+    Swap in a snapshot compiled from `policy_config`, or from policy.yml on
+    disk if none is given. Cached decisions from older snapshots are dropped.
+    """
+    return POLICY_STORE.reload(policy_config)
+
 
 # ---- Context type used by all policies ----
-@dataclass
+# Frozen so it is hashable and can key decision caches.
+@dataclass(frozen=True)
 class Context:
     user_id: int
     role: str         # "user", "admin", "dpo", etc.
     purpose: str      # "task_view", "task_edit", "sar_access", etc.
+    # Ids of the projects user_id is a member of, loaded once per request
+    # (ownership_layer.with_memberships). None means "not loaded": member /
+    # project_member rules then never match.
+    member_of: Optional[FrozenSet[int]] = None
 
 
 # ---- Base policy class ----
 class Policy:
-    def check(self, ctx: Context) -> bool:
+    # Attributes that fully determine a policy's decisions. Two policies of
+    # the same class with equal key fields are equal and hash the same, so
+    # they share entries in decision caches and memos.
+    key_fields: Tuple[str, ...] = ()
+    # Empty so subclasses can be fully slotted (see generated_policies.py);
+    # subclasses without __slots__ still get a __dict__ as usual.
+    __slots__ = ()
+
+    def check(self, ctx: Context, snapshot: Optional[PolicySnapshot] = None) -> bool:
+        """
+        Decide for ctx using `snapshot` (default: the current one). Requests
+        pin a snapshot so a policy reload mid-request can't change answers.
+        """
         raise NotImplementedError
 
+    def key(self) -> tuple:
+        # Policies are immutable after construction, so compute this once.
+        try:
+            return self._key
+        except AttributeError:
+            key = (type(self),) + tuple(getattr(self, f) for f in self.key_fields)
+            self._key = key
+            self._hash = hash(key)
+            return key
+
+    def __eq__(self, other) -> bool:
+        return self is other or (isinstance(other, Policy) and self.key() == other.key())
+
+    def __hash__(self) -> int:
+        try:
+            return self._hash
+        except AttributeError:
+            self.key()
+            return self._hash
+
+
+def _decide(
+    category: str,
+    owner_bits: int,
+    owner_id: int,
+    ctx: Context,
+    snapshot: Optional[PolicySnapshot] = None,
+    project_id: Optional[int] = None,
+) -> bool:
+    """
+    O(1) policy decision: look up the allowed principals for
+    (category, ctx.purpose) and intersect them with what ctx holds
+    for this row (its role, plus `owner_bits` if it owns the row, plus
+    member / project_member if `project_id` is in ctx.member_of).
+    """
+    if snapshot is None:
+        snapshot = POLICY_STORE.current()
+    allowed = snapshot.decision_table.get((category, ctx.purpose), 0)
+    decision = False
+    if allowed:
+        held = ROLE_BITS.get(ctx.role, 0)
+        if ctx.user_id == owner_id:
+            held |= owner_bits
+        if project_id is not None and ctx.member_of and project_id in ctx.member_of:
+            held |= MEMBER | PROJECT_MEMBER
+        decision = (allowed & held) != 0
+
+    if metrics.ENABLED:
+        metrics.inc("policy_checks_total", category=category)
+        if not decision:
+            metrics.inc("policy_denied_total", category=category)
+    return decision
+
+
+# ---- Shared policy instances ----
+@lru_cache(maxsize=65536)
+def shared_policy(policy_cls, *args) -> Policy:
+    """
+    Interned policy: every call with the same class and constructor args
+    returns the same instance, so rows with the same owner share one
+    policy object instead of allocating a new one per row.
+
+    Policies are immutable after construction, which is what makes this safe.
+    """
+    return policy_cls(*args)
+
+
+# ---- Cross-request decision cache ----
+class DecisionCache:
+    """
+    Bounded, thread-safe LRU of policy decisions keyed by (policy, ctx).
+
+    The same admin / DPO context checking thousands of rows owned by a few
+    users hits the same handful of entries over and over. Entries belong to
+    one policy snapshot: the first lookup under a newer snapshot empties the
+    cache, and lookups pinned to an older one bypass it.
+    """
+
+    def __init__(self, maxsize: int = 65536):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[Policy, Context], bool]" = OrderedDict()
+        self._generation = POLICY_STORE.current().generation
+        self._lock = threading.Lock()
+
+    def check(self, policy: Policy, ctx: Context, snapshot: Optional[PolicySnapshot] = None) -> bool:
+        if snapshot is None:
+            snapshot = POLICY_STORE.current()
+        generation = snapshot.generation
+        key = (policy, ctx)
+        with self._lock:
+            if generation > self._generation:
+                self._entries.clear()
+                self._generation = generation
+            if generation == self._generation:
+                decision = self._entries.get(key)
+                if decision is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return decision
+            self.misses += 1
+
+        decision = policy.check(ctx, snapshot)
+
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = decision
+                if len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return decision
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Process-wide cache, opt-in: call sites that want decisions shared across
+# requests pass it explicitly; the default everywhere is no cache.
+DECISION_CACHE = DecisionCache()
+
+
+def cached_check(
+    policy: Policy,
+    ctx: Context,
+    cache: Optional[DecisionCache] = None,
+    snapshot: Optional[PolicySnapshot] = None,
+) -> bool:
+    """policy.check(ctx), answered from `cache` when one is given."""
+    if cache is None:
+        return policy.check(ctx, snapshot)
+    return cache.check(policy, ctx, snapshot)
+
+
+# ---- Per-request decision memo ----
+class DecisionMemo:
+    """
+    Remembers each policy's decision for one Context, so a request that
+    touches many rows evaluates every distinct (interned) policy once.
+    Create one per request; it is not meant to outlive the Context.
+
+    The memo pins the policy snapshot current when it was created, so the
+    whole request is decided under one version of policy.yml even if a
+    reload lands halfway through.
+    """
+
+    def __init__(
+        self,
+        ctx: Context,
+        cache: Optional[DecisionCache] = None,
+        snapshot: Optional[PolicySnapshot] = None,
+    ):
+        self.ctx = ctx
+        # Optional shared cache consulted before evaluating a policy
+        self.cache = cache
+        self.snapshot = snapshot if snapshot is not None else POLICY_STORE.current()
+        self._decisions: Dict[Policy, bool] = {}
+
+    def allows(self, policy: Policy) -> bool:
+        decision = self._decisions.get(policy)
+        if decision is None:
+            decision = cached_check(policy, self.ctx, self.cache, self.snapshot)
+            self._decisions[policy] = decision
+        return decision
+
+    def __len__(self) -> int:
+        return len(self._decisions)
+
 
 # ---- Policy Container (Sesame-lite PCon) ----
 class PCon:
@@ -37,22 +251,90 @@ class PCon:
         return self._data
 
 
+# ---- Columnar Policy Container ----
+class PConBatch:
+    """
+    A whole column of values, each guarded by its own policy.
+
+    Where PCon.reveal raises on denial one scalar at a time, a batch works
+    out a redaction mask for the column (one check per distinct policy)
+    and returns the revealed column with denied entries replaced, without
+    raising. Any Policy subclass works here unchanged.
+    """
+
+    def __init__(self, data: Sequence[Any], policies: Sequence[Policy]):
+        if len(data) != len(policies):
+            raise ValueError(
+                f"PConBatch needs one policy per value ({len(data)} values, {len(policies)} policies)"
+            )
+        self._data = list(data)
+        self._policies = list(policies)
+
+    @classmethod
+    def from_owners(
+        cls,
+        data: Sequence[Any],
+        owner_ids: Sequence[Hashable],
+        make_policy: Callable[[Hashable], Policy],
+    ) -> "PConBatch":
+        """
+        Build a batch from values and their owner ids. `make_policy` is called
+        once per distinct owner id and that policy is shared by all its rows.
+        """
+        by_owner: Dict[Hashable, Policy] = {}
+        policies = []
+        for owner_id in owner_ids:
+            policy = by_owner.get(owner_id)
+            if policy is None:
+                policy = by_owner[owner_id] = make_policy(owner_id)
+            policies.append(policy)
+        return cls(data, policies)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def with_privacy(self, fn: Callable[[Any], Any]) -> "PConBatch":
+        # Element-wise transform; each value keeps its policy.
+        return PConBatch([fn(v) for v in self._data], self._policies)
+
+    def mask(self, ctx: Context, memo: DecisionMemo = None) -> List[bool]:
+        """True where ctx may see the value. Pass a memo to share decisions across columns."""
+        if memo is None:
+            memo = DecisionMemo(ctx)
+        elif memo.ctx is not ctx:
+            raise ValueError("DecisionMemo belongs to a different Context")
+        return [memo.allows(policy) for policy in self._policies]
+
+    def reveal(self, ctx: Context, redacted: Any = "REDACTED", memo: DecisionMemo = None) -> List[Any]:
+        """The column as ctx may see it, with `redacted` in place of every denied value."""
+        return [
+            value if allowed else redacted
+            for value, allowed in zip(self._data, self.mask(ctx, memo))
+        ]
+
+
 # ---- TaskPolicy: THIS is the part that must match your test code ----
 class TaskPolicy(Policy):
     """
     Minimal Sesame-like policy for tasks.
-    Reads access rules from policy.yml under data_categories.task.
+    Reads access rules from policy.yml under data_categories.task,
+    via the compiled decision table of the current policy snapshot.
     """
 
+    category = "task"
+    # Principals a context holds when it owns the task's project
+    owner_bits = PROJECT_OWNER | OWNER
+    key_fields = ("project_id", "project_owner_id")
+    # Attribute holding the owner id / the project checked against ctx.member_of
+    owner_field = "project_owner_id"
+    member_field = "project_id"
+
     def __init__(self, project_id: int, project_owner_id: int):
         # These names MUST match how you call TaskPolicy(...)
         self.project_id = project_id
         self.project_owner_id = project_owner_id
 
-        # Load YAML config section for tasks
-        self.config = POLICY_CONFIG["data_categories"]["task"]
-
-    def check(self, ctx: Context) -> bool:
+    def check(self, ctx: Context, snapshot: Optional[PolicySnapshot] = None) -> bool:
         """
         Use the YAML rules to decide if this context can see the task.
         For now we implement a simple subset:
@@ -61,33 +343,16 @@ class TaskPolicy(Policy):
           - ctx.user_id == project_owner_id and 'project_owner'/'owner' allowed
           - or ctx.role == 'admin' and 'admin' allowed
           - or ctx.role == 'dpo' and 'dpo' allowed
+          - or project_id is in ctx.member_of and 'project_member'/'member' allowed
         then allow.
         Otherwise deny.
-        """
-        for rule in self.config["access_policies"]:
-            if rule["purpose"] != ctx.purpose:
-                continue
-
-            allowed = rule["allow"]
 
-            # Owner (project_owner / owner)
-            if ("project_owner" in allowed or "owner" in allowed) and ctx.user_id == self.project_owner_id:
-                return True
-
-            # Admin
-            if "admin" in allowed and ctx.role == "admin":
-                return True
-
-            # DPO
-            if "dpo" in allowed and ctx.role == "dpo":
-                return True
-
-            # NOTE: project_member logic would require a DB lookup;
-            # you can add that later if you want.
-            # if "project_member" in allowed: ...
-
-        # If we didn't match any allowed rule → deny
-        return False
+        Membership comes from ctx.member_of (preloaded per request), so
+        this never touches the DB.
+        """
+        return _decide(
+            self.category, self.owner_bits, self.project_owner_id, ctx, snapshot, self.project_id
+        )
     
 class UserPolicy(Policy):
     """
@@ -101,36 +366,18 @@ class UserPolicy(Policy):
       - 'admin' means ctx.role == 'admin'
       - 'dpo' means ctx.role == 'dpo'
     """
-    def __init__(self, user_id: int):
-        self.user_id = user_id
 
-        # Be defensive: handle missing keys or null values
-        dcats = POLICY_CONFIG.get("data_categories") or {}
-        cat = dcats.get("user_profile") or {}
-        self.access_policies = cat.get("access_policies") or []
+    category = "user_profile"
+    owner_bits = SELF | OWNER
+    key_fields = ("user_id",)
+    owner_field = "user_id"
+    member_field = None
 
-    def check(self, ctx: Context) -> bool:
-        for rule in self.access_policies:
-            # Match by purpose (e.g., 'sar_access', 'task_view')
-            if rule.get("purpose") != ctx.purpose:
-                continue
-
-            allowed = set(rule.get("allow", []))
-
-            # Self / owner (same idea here)
-            if ("self" in allowed or "owner" in allowed) and ctx.user_id == self.user_id:
-                return True
-
-            # Admin
-            if "admin" in allowed and ctx.role == "admin":
-                return True
-
-            # DPO
-            if "dpo" in allowed and ctx.role == "dpo":
-                return True
+    def __init__(self, user_id: int):
+        self.user_id = user_id
 
-        # No rule matched -> deny
-        return False
+    def check(self, ctx: Context, snapshot: Optional[PolicySnapshot] = None) -> bool:
+        return _decide(self.category, self.owner_bits, self.user_id, ctx, snapshot)
 
 
 
@@ -142,34 +389,21 @@ class ProjectPolicy(Policy):
 
     Semantics:
       - 'owner' / 'project_owner' means ctx.user_id == project.owner_id
+      - 'member' / 'project_member' means project_id is in ctx.member_of
+        (only when the policy is given a project_id)
       - 'admin' means ctx.role == 'admin'
       - 'dpo' means ctx.role == 'dpo'
     """
-    def __init__(self, owner_id: int):
-        self.owner_id = owner_id
 
-        dcats = POLICY_CONFIG.get("data_categories") or {}
-        cat = dcats.get("project") or {}
-        self.access_policies = cat.get("access_policies") or []
+    category = "project"
+    owner_bits = OWNER | PROJECT_OWNER
+    key_fields = ("owner_id", "project_id")
+    owner_field = "owner_id"
+    member_field = "project_id"
 
-    def check(self, ctx: Context) -> bool:
-        for rule in self.access_policies:
-            if rule.get("purpose") != ctx.purpose:
-                continue
-
-            allowed = set(rule.get("allow", []))
-
-            # Project owner
-            if ("owner" in allowed or "project_owner" in allowed) and ctx.user_id == self.owner_id:
-                return True
-
-            # Admin
-            if "admin" in allowed and ctx.role == "admin":
-                return True
-
-            # DPO
-            if "dpo" in allowed and ctx.role == "dpo":
-                return True
-
-        return False
+    def __init__(self, owner_id: int, project_id: Optional[int] = None):
+        self.owner_id = owner_id
+        self.project_id = project_id
 
+    def check(self, ctx: Context, snapshot: Optional[PolicySnapshot] = None) -> bool:
+        return _decide(self.category, self.owner_bits, self.owner_id, ctx, snapshot, self.project_id)
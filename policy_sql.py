@@ -0,0 +1,101 @@
+# policy_sql.py
+#
+# Row-level policy pushdown. Translates the compiled policy.yml rules for a
+# Context into SQL, so SQLite filters (WHERE) or redacts (CASE) the task rows
+# a context may not see, instead of every row being fetched and then
+# redacted in Python by PCon / PConBatch. The Python path stays available
+# as the reference implementation (see check_policy_pushdown.py).
+
+import json
+from typing import Any, Dict, Optional, Tuple
+
+from policy_compiler import MEMBER, PROJECT_MEMBER, ROLE_BITS
+from policy_layer import POLICY_STORE, Context, TaskPolicy
+from policy_store import PolicySnapshot
+
+# mode="filter" drops rows ctx may not see; mode="redact" keeps every row
+# and replaces the guarded columns with REDACTED, like PConBatch.reveal.
+FILTER = "filter"
+REDACT = "redact"
+
+REDACTED = "REDACTED"
+
+# Task columns guarded by TaskPolicy; id and project_id are always returned,
+# as in ownership_layer._protect_task_rows.
+TASK_GUARDED_COLUMNS = ("title", "done")
+
+# Membership is ctx.member_of, bound as a JSON array, so SQL and Python
+# decide against the same memberships (those loaded for the request by
+# ownership_layer.with_memberships), not whatever project_members holds now.
+_MEMBER_SQL = "t.project_id IN (SELECT value FROM json_each(:member_of))"
+
+
+def task_predicate(ctx: Context, snapshot: Optional[PolicySnapshot] = None) -> str:
+    """
+    SQL condition over `t` (tasks) and `p` (its project) that is true exactly
+    where TaskPolicy(t.project_id, p.owner_id).check(ctx) would be. Role
+    principals are decided here, so the result is "1" or "0" when the
+    context's role settles every row. Binds :requester and :member_of.
+    """
+    if snapshot is None:
+        snapshot = POLICY_STORE.current()
+    allowed = snapshot.decision_table.get((TaskPolicy.category, ctx.purpose), 0)
+
+    if allowed & ROLE_BITS.get(ctx.role, 0):
+        return "1"
+
+    terms = []
+    if allowed & TaskPolicy.owner_bits:
+        terms.append("p.owner_id = :requester")
+    if allowed & (MEMBER | PROJECT_MEMBER):
+        terms.append(_MEMBER_SQL)
+    return " OR ".join(f"({term})" for term in terms) or "0"
+
+
+def task_view_sql(
+    ctx: Context,
+    project_id: Optional[int] = None,
+    mode: str = FILTER,
+    snapshot: Optional[PolicySnapshot] = None,
+    hidden_owners: Optional[str] = None,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    (sql, params) listing tasks as ctx may see them, optionally limited to
+    one project. Rows come back as (id, project_id, title, done) ordered
+    by id. `hidden_owners` is a subquery of project owners whose tasks are
+    left out entirely (e.g. tombstones.PENDING_SQL). A ctx without
+    member_of is a member of no project.
+    """
+    predicate = task_predicate(ctx, snapshot)
+    params: Dict[str, Any] = {
+        "requester": ctx.user_id,
+        "member_of": json.dumps(sorted(ctx.member_of or ())),
+    }
+
+    if mode == FILTER:
+        columns = "t.id, t.project_id, t.title, t.done"
+        where = [f"({predicate})"] if predicate != "1" else []
+    elif mode == REDACT:
+        params["redacted"] = REDACTED
+        if predicate == "1":
+            guarded = [f"t.{col}" for col in TASK_GUARDED_COLUMNS]
+        else:
+            guarded = [
+                f"CASE WHEN {predicate} THEN t.{col} ELSE :redacted END AS {col}"
+                for col in TASK_GUARDED_COLUMNS
+            ]
+        columns = ", ".join(["t.id", "t.project_id"] + guarded)
+        where = []
+    else:
+        raise ValueError(f"unknown pushdown mode {mode!r}; expected {FILTER!r} or {REDACT!r}")
+
+    if hidden_owners is not None:
+        where.append(f"p.owner_id NOT IN ({hidden_owners})")
+    if project_id is not None:
+        where.append("t.project_id = :project_id")
+        params["project_id"] = project_id
+
+    sql = f"SELECT {columns} FROM tasks t JOIN projects p ON p.id = t.project_id"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return sql + " ORDER BY t.id", params
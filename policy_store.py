@@ -0,0 +1,135 @@
+# policy_store.py
+
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import POLICY_PATH, load_policy_config
+from policy_compiler import DecisionTable, compile_policy_config
+
+
+@dataclass(frozen=True)
+class PolicySnapshot:
+    """
+    One compiled version of policy.yml. Immutable: a request that grabbed a
+    snapshot keeps deciding with it even if a newer one is swapped in.
+    """
+    config: Dict[str, Any]
+    decision_table: DecisionTable
+    generation: int
+    path: Optional[str] = None
+    # (st_mtime_ns, st_size) of the file this was loaded from
+    stamp: Optional[Tuple[int, int]] = None
+
+
+def _stamp(path: str) -> Tuple[int, int]:
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+class PolicyStore:
+    """
+    Holds the current PolicySnapshot and replaces it when policy.yml changes.
+
+    reload() swaps in a newly compiled snapshot atomically (a single
+    reference assignment); poll() reloads only if the file's mtime or size
+    changed; watch() runs poll() on a background thread. A file that fails
+    to load or compile leaves the current snapshot in place and is recorded
+    in `last_error`.
+    """
+
+    def __init__(self, path: str = POLICY_PATH, initial_config: Optional[Dict[str, Any]] = None):
+        self.path = path
+        self.last_error: Optional[Exception] = None
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[PolicySnapshot], None]] = []
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        if initial_config is not None:
+            stamp = _stamp(path) if os.path.exists(path) else None
+            self._snapshot = self._compile(initial_config, 0, stamp)
+        else:
+            self._snapshot = self._load(0)
+
+    # ---- snapshots ----
+    def current(self) -> PolicySnapshot:
+        return self._snapshot
+
+    def _compile(self, config, generation: int, stamp=None) -> PolicySnapshot:
+        return PolicySnapshot(
+            config=config,
+            decision_table=compile_policy_config(config),
+            generation=generation,
+            path=self.path,
+            stamp=stamp,
+        )
+
+    def _load(self, generation: int) -> PolicySnapshot:
+        stamp = _stamp(self.path)
+        return self._compile(load_policy_config(self.path), generation, stamp)
+
+    def reload(self, config: Optional[Dict[str, Any]] = None) -> PolicySnapshot:
+        """
+        Compile `config` (or re-read the policy file) into a new snapshot and
+        make it current. Raises if the file can't be loaded or compiled; the
+        previous snapshot stays current in that case.
+        """
+        with self._lock:
+            generation = self._snapshot.generation + 1
+            try:
+                if config is None:
+                    snapshot = self._load(generation)
+                else:
+                    snapshot = self._compile(config, generation, self._snapshot.stamp)
+            except Exception as e:
+                self.last_error = e
+                raise
+            self.last_error = None
+            self._snapshot = snapshot
+
+        for listener in list(self._listeners):
+            listener(snapshot)
+        return snapshot
+
+    def on_reload(self, listener: Callable[[PolicySnapshot], None]):
+        """Call `listener(snapshot)` after every successful reload."""
+        self._listeners.append(listener)
+
+    # ---- file watching ----
+    def poll(self) -> bool:
+        """Reload if the policy file changed since the current snapshot. True if reloaded."""
+        try:
+            stamp = _stamp(self.path)
+        except OSError as e:
+            self.last_error = e
+            return False
+        if stamp == self._snapshot.stamp:
+            return False
+        try:
+            self.reload()
+        except Exception:
+            # keep serving the old snapshot; last_error says why
+            return False
+        return True
+
+    def watch(self, interval: float = 1.0) -> threading.Thread:
+        """Start polling the policy file every `interval` seconds on a daemon thread."""
+        if self._watcher is not None and self._watcher.is_alive():
+            return self._watcher
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                self.poll()
+
+        self._watcher = threading.Thread(target=run, name="policy-watch", daemon=True)
+        self._watcher.start()
+        return self._watcher
+
+    def stop(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
@@ -0,0 +1,392 @@
+# retention.py
+#
+# Enforcement of the `retention` rules in policy.yml. Each data category's
+# rule compiles into a DELETE that removes at most `chunk_size` rows per
+# statement, so a sweep is a series of short write transactions other
+# writers can interleave with rather than one long lock:
+#
+#   until_account_deletion
+#       rows whose own account (the category's column / fk `owner`) is gone;
+#       `also_owned_by` owners don't extend a row's lifetime
+#   until_project_deletion
+#       rows whose project (the via_project_owner `owner`'s project row) is gone
+#   until_owner_account_deletion_or_project_deletion
+#       rows whose owner account is gone, or, for a row in a project, whose
+#       project or the project's owner is gone
+#
+#   Rows like these are left behind by a parent deleted without SAR
+#   erasure. They are walked in rowid order, each chunk looking at one
+#   window of at most `window` rowids, so each row is examined once per
+#   sweep and no statement scans the whole table. The rows whose ownership
+#   path runs through an expired row (an orphaned project's tasks and
+#   memberships) are deleted with it, in the same transaction.
+#   ttl: {column, days}
+#       rows whose `column` timestamp is older than `days`, oldest first
+#       through an index on `column` (see retention_index_columns)
+#
+#   import retention
+#   report = retention.sweep(conn)                 # one pass
+#   sweeper = retention.RetentionSweeper(interval=3600).start()
+
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import metrics
+from background import BackgroundWorker
+from config import POLICY_CONFIG
+from db import ConnectionManager
+from ownership_graph import OwnershipPlan
+
+# Rules meaning "keep the row while some owner of it still exists"
+OWNER_LIFETIME_RULES = frozenset({
+    "until_account_deletion",
+    "until_project_deletion",
+    "until_owner_account_deletion_or_project_deletion",
+})
+
+# Rows removed per DELETE statement (and per write transaction)
+RETENTION_CHUNK_SIZE = 1000
+
+# Rowids examined per DELETE statement of an owner-lifetime rule
+RETENTION_SCAN_WINDOW = 10000
+
+
+# Rows of the chunk being deleted, bound as a JSON array of rowids
+_IN_CHUNK = "rowid IN (SELECT value FROM json_each(:rowids))"
+
+
+class RetentionError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class RetentionRule:
+    category: str
+    table: str
+    rule: str           # the policy.yml rule name, or "ttl"
+    select_sql: str     # rowids of the next chunk; binds :limit, plus :after and :until, or :cutoff
+    ttl_days: Optional[int] = None
+    # (category, DELETE) for rows owned through the chunk's rows, children
+    # first; binds :rowids like delete_sql of an owner rule
+    dependents: Tuple[Tuple[str, str], ...] = ()
+
+    @property
+    def delete_sql(self) -> str:
+        """The next ttl chunk; for owner rules, the rows in :rowids (a JSON array)."""
+        if self.is_ttl:
+            return f"DELETE FROM {self.table} WHERE rowid IN ({self.select_sql})"
+        return f"DELETE FROM {self.table} WHERE {_IN_CHUNK}"
+
+    @property
+    def is_ttl(self) -> bool:
+        return self.ttl_days is not None
+
+
+def _subject(config: Dict[str, Any]) -> Tuple[str, str]:
+    """(table, id column) of the data subject: the category owned by type `column`."""
+    for cat in ((config or {}).get("data_categories") or {}).values():
+        owner = cat.get("owner") or {}
+        if owner.get("type") == "column":
+            return cat["table"], owner["column"]
+    raise RetentionError("no data category with an owner of type 'column' (the data subject)")
+
+
+def _alive_sql(tp, rule: str, subject_table: str, subject_id: str) -> str:
+    """Condition on `t` (a row of tp.table) that holds while `rule` keeps the row."""
+    owner = tp.paths[0]    # the category's `owner`, not its also_owned_by paths
+    if rule == "until_account_deletion":
+        if owner.parent is not None:
+            raise RetentionError(f"{tp.category}: until_account_deletion needs a column or fk owner")
+        return f"EXISTS (SELECT 1 FROM {subject_table} WHERE {subject_id} = t.{owner.column})"
+    if rule == "until_project_deletion":
+        if owner.parent is None:
+            raise RetentionError(f"{tp.category}: until_project_deletion needs a via_project_owner owner")
+        return f"EXISTS (SELECT 1 FROM {owner.parent.table} WHERE {owner.parent_key} = t.{owner.column})"
+    # until_owner_account_deletion_or_project_deletion: owner_expr is NULL
+    # once the project row is gone, so both cases fail the same EXISTS
+    return f"EXISTS (SELECT 1 FROM {subject_table} WHERE {subject_id} = {owner.owner_expr('t')})"
+
+
+def _dependents(plan: OwnershipPlan, table: str, selected: str = _IN_CHUNK) -> List[Tuple[str, str]]:
+    """(category, DELETE) for the rows owned through the `selected` rows of `table`, children first."""
+    out = []
+    for tp in plan.tables:
+        columns = dict.fromkeys(
+            (path.column, path.parent_key) for path in tp.paths
+            if path.parent is not None and path.parent.table == table
+        )
+        for column, key in columns:
+            where = f"{column} IN (SELECT {key} FROM {table} WHERE {selected})"
+            out += _dependents(plan, tp.table, where)
+            out.append((tp.category, f"DELETE FROM {tp.table} WHERE {where}"))
+    return out
+
+
+def compile_retention_rules(config: Dict[str, Any] = POLICY_CONFIG) -> List[RetentionRule]:
+    """policy.yml retention rules as chunked DELETEs, children before parents."""
+    plan = OwnershipPlan.from_policy(config)
+    subject_table, subject_id = _subject(config)
+    dcats = (config or {}).get("data_categories") or {}
+
+    rules = []
+    for tp in reversed(plan.tables):
+        retention = dcats[tp.category].get("retention") or {}
+        name = retention.get("rule")
+        if name is not None and tp.table != subject_table:
+            if name not in OWNER_LIFETIME_RULES:
+                raise RetentionError(f"{tp.category}: unknown retention rule {name!r}")
+            alive = _alive_sql(tp, name, subject_table, subject_id)
+            rules.append(RetentionRule(tp.category, tp.table, name, (
+                f"SELECT t.rowid FROM {tp.table} t "
+                f"WHERE t.rowid > :after AND t.rowid <= :until AND NOT ({alive}) "
+                f"ORDER BY t.rowid LIMIT :limit"
+            ), dependents=tuple(_dependents(plan, tp.table))))
+
+        ttl = retention.get("ttl")
+        if ttl is not None:
+            column, days = ttl.get("column"), ttl.get("days")
+            if not column or not isinstance(days, int) or days < 0:
+                raise RetentionError(f"{tp.category}: ttl needs a column and a whole number of days")
+            rules.append(RetentionRule(tp.category, tp.table, "ttl", (
+                f"SELECT rowid FROM {tp.table} WHERE {column} < :cutoff "
+                f"ORDER BY {column} LIMIT :limit"
+            ), ttl_days=days))
+    return rules
+
+
+def retention_index_columns(config: Dict[str, Any] = POLICY_CONFIG) -> List[Tuple[str, str]]:
+    """(table, column) for every ttl column; the ttl DELETEs walk these in order."""
+    cols = []
+    for cat in ((config or {}).get("data_categories") or {}).values():
+        ttl = (cat.get("retention") or {}).get("ttl")
+        if ttl and (cat["table"], ttl["column"]) not in cols:
+            cols.append((cat["table"], ttl["column"]))
+    return cols
+
+
+def create_retention_indexes(conn: sqlite3.Connection, config: Dict[str, Any] = POLICY_CONFIG) -> List[str]:
+    names = []
+    for table, column in retention_index_columns(config):
+        name = f"idx_{table}_{column}"
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({column})")
+        names.append(name)
+    conn.commit()
+    return names
+
+
+RETENTION_RULES = compile_retention_rules(POLICY_CONFIG)
+
+
+@dataclass
+class SweepReport:
+    purged: Dict[str, int] = field(default_factory=dict)    # category -> rows deleted
+    chunks: int = 0
+    seconds: float = 0.0
+    complete: bool = True    # False if the time budget or a stop request cut it short
+    kept: Dict[str, int] = field(default_factory=dict)      # category -> expired rows still referenced
+    errors: Dict[str, str] = field(default_factory=dict)    # category -> why it was skipped
+    error: Optional[str] = None    # why the whole pass failed (rolled back, retried next interval)
+
+    @property
+    def total(self) -> int:
+        return sum(self.purged.values())
+
+
+def sweep(
+    conn: sqlite3.Connection,
+    rules: Optional[List[RetentionRule]] = None,
+    chunk_size: int = RETENTION_CHUNK_SIZE,
+    pause: float = 0.0,
+    budget: Optional[float] = None,
+    stop: Optional[threading.Event] = None,
+    now: Optional[str] = None,
+    window: int = RETENTION_SCAN_WINDOW,
+) -> SweepReport:
+    """
+    One retention pass. Every chunk is its own transaction; `pause` seconds
+    are slept between chunks to leave the write lock to others. The pass
+    ends early (complete=False) after `budget` seconds or once `stop` is
+    set; the next pass picks up the remaining rows. `now` overrides the
+    clock ttl cutoffs are measured from (an SQLite datetime string).
+    Owner-lifetime chunks examine at most `window` rowids each, up to the
+    largest rowid in the table when the rule's walk starts.
+    """
+    if rules is None:
+        rules = RETENTION_RULES
+    report = SweepReport()
+    start = time.perf_counter()
+    clock = now or conn.execute("SELECT datetime('now')").fetchone()[0]
+
+    def out_of_time() -> bool:
+        return (
+            (budget is not None and time.perf_counter() - start >= budget)
+            or (stop is not None and stop.is_set())
+        )
+
+    for rule in rules:
+        params: Dict[str, Any] = {"limit": chunk_size}
+        if rule.is_ttl:
+            params["cutoff"] = conn.execute(
+                "SELECT datetime(?, ?)", (clock, f"-{rule.ttl_days} days")
+            ).fetchone()[0]
+        else:
+            params["after"] = 0
+            last = conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {rule.table}").fetchone()[0]
+            conn.commit()
+
+        while True:
+            if out_of_time():
+                report.complete = False
+                break
+            if not rule.is_ttl:
+                if params["after"] >= last:
+                    break
+                params["until"] = params["after"] + window
+            rowids: List[int] = []
+            try:
+                with metrics.timer("retention_chunk_seconds", category=rule.category):
+                    if rule.is_ttl:
+                        examined = conn.execute(rule.delete_sql, params).rowcount
+                        deleted = {rule.category: examined}
+                    else:
+                        rowids = [r[0] for r in conn.execute(rule.select_sql, params)]
+                        examined = len(rowids)
+                        deleted = _delete_chunk(conn, rule, rowids)
+                    conn.commit()
+            except sqlite3.IntegrityError as e:
+                conn.rollback()
+                if rule.is_ttl:
+                    report.errors[rule.category] = str(e)
+                    break
+                # A row is still referenced from outside the ownership graph:
+                # delete the chunk row by row and leave those rows in place.
+                deleted, kept = _delete_one_by_one(conn, rule, rowids)
+                if kept:
+                    report.kept[rule.category] = report.kept.get(rule.category, 0) + kept
+            report.chunks += 1
+            for category, n in deleted.items():
+                if n:
+                    report.purged[category] = report.purged.get(category, 0) + n
+                    if metrics.ENABLED:
+                        metrics.inc("retention_rows_purged_total", n, category=category, rule=rule.rule)
+            if rule.is_ttl:
+                if examined < chunk_size:
+                    break
+            else:
+                # a full chunk may have more matches left in this window
+                params["after"] = max(rowids) if examined == chunk_size else params["until"]
+            if pause:
+                time.sleep(pause)
+        if not report.complete:
+            break
+
+    report.seconds = time.perf_counter() - start
+    if metrics.ENABLED:
+        metrics.inc("retention_sweeps_total", complete=report.complete)
+        metrics.observe("retention_sweep_seconds", report.seconds)
+    return report
+
+
+def _delete_chunk(conn: sqlite3.Connection, rule: RetentionRule, rowids: List[int]) -> Dict[str, int]:
+    """Delete an owner rule's rows `rowids` and their dependents, uncommitted; returns category -> rows deleted."""
+    chunk = {"rowids": json.dumps(rowids)}
+    deleted: Dict[str, int] = {}
+    for category, sql in rule.dependents + ((rule.category, rule.delete_sql),):
+        deleted[category] = deleted.get(category, 0) + conn.execute(sql, chunk).rowcount
+    return deleted
+
+
+def _delete_one_by_one(conn: sqlite3.Connection, rule: RetentionRule, rowids: List[int]) -> Tuple[Dict[str, int], int]:
+    """_delete_chunk for one row at a time in one transaction; returns (category -> rows deleted, rows kept)."""
+    deleted: Dict[str, int] = {}
+    kept = 0
+    conn.execute("BEGIN")
+    for rowid in rowids:
+        conn.execute("SAVEPOINT retention_row")
+        try:
+            for category, n in _delete_chunk(conn, rule, [rowid]).items():
+                deleted[category] = deleted.get(category, 0) + n
+        except sqlite3.IntegrityError:
+            conn.execute("ROLLBACK TO retention_row")
+            kept += 1
+        conn.execute("RELEASE retention_row")
+    conn.commit()
+    return deleted, kept
+
+
+class RetentionSweeper(BackgroundWorker):
+    """
+    Background thread running sweep() every `interval` seconds on its own
+    connection to `db_path` (default: ownership_layer.DB_PATH). The first
+    pass starts right away. `on_report` is called with each SweepReport;
+    the latest one is also kept in `last_report`. A pass that fails is
+    rolled back and retried next interval (see background.BackgroundWorker).
+    """
+
+    name = "retention-sweeper"
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        interval: float = 3600.0,
+        chunk_size: int = RETENTION_CHUNK_SIZE,
+        pause: float = 0.01,
+        budget: Optional[float] = None,
+        rules: Optional[List[RetentionRule]] = None,
+        on_report: Optional[Callable[[SweepReport], None]] = None,
+    ):
+        if db_path is None:
+            import ownership_layer
+            db_path = ownership_layer.DB_PATH
+        super().__init__(db_path, interval, on_report)
+        self.chunk_size = chunk_size
+        self.pause = pause
+        self.budget = budget
+        self.rules = rules
+
+    def _prepare(self, conn: sqlite3.Connection):
+        create_retention_indexes(conn)
+
+    def _pass(self, conn: sqlite3.Connection) -> SweepReport:
+        return sweep(conn, self.rules, self.chunk_size, self.pause, self.budget, self._stop)
+
+    def _failed_report(self, error: str) -> SweepReport:
+        return SweepReport(complete=False, error=error)
+
+
+def format_report(report: SweepReport) -> str:
+    lines = [f"{category:<20} {n:>10}" for category, n in sorted(report.purged.items())]
+    lines += [f"{category:<20} {n:>10} kept (still referenced)" for category, n in sorted(report.kept.items())]
+    lines += [f"{category:<20} skipped: {why}" for category, why in sorted(report.errors.items())]
+    if report.error:
+        lines.append(f"failed: {report.error}")
+    status = "complete" if report.complete else "partial"
+    lines.append(f"{report.total} rows purged in {report.chunks} chunks, {report.seconds:.3f}s ({status})")
+    return "\n".join(lines)
+
+
+def main():
+    import argparse
+
+    import ownership_layer
+
+    parser = argparse.ArgumentParser(description="Run one retention sweep over the database")
+    parser.add_argument("--db", default=ownership_layer.DB_PATH)
+    parser.add_argument("--chunk-size", type=int, default=RETENTION_CHUNK_SIZE)
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between chunks")
+    parser.add_argument("--budget", type=float, default=None, help="stop after this many seconds")
+    args = parser.parse_args()
+
+    manager = ConnectionManager(args.db)
+    conn = manager.connection()
+    create_retention_indexes(conn)
+    print(format_report(sweep(conn, chunk_size=args.chunk_size, pause=args.pause, budget=args.budget)))
+    manager.close_all()
+
+
+if __name__ == "__main__":
+    main()
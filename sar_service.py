@@ -0,0 +1,148 @@
+# sar_service.py
+#
+# asyncio front end for SAR requests. Reads run on a bounded pool of threads,
+# each with its own read-only connection; every deletion goes through one
+# writer thread with one connection, so SQLite never sees competing writers.
+# A request that can't get a slot is rejected (backpressure) rather than
+# queued without bound. A read past its deadline is abandoned, even if it
+# is still waiting in the queue; a deletion is only abandoned while still
+# queued, and one that has started runs to completion and returns its
+# result. A request counts as pending until its thread has finished.
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import ownership_layer
+from db import ConnectionManager
+from policy_layer import Context
+
+
+class ServiceOverloaded(RuntimeError):
+    """Too many requests are already queued or running; try again later."""
+
+
+class SARService:
+    """
+    Concurrent SAR access / deletion over one SQLite database.
+
+      read_workers   threads (and read-only connections) serving sar_access
+      max_pending    requests allowed in flight or queued before new ones
+                     are rejected with ServiceOverloaded
+      timeout        default per-request deadline in seconds (None = no deadline);
+                     for deletions, the deadline by which they must have started
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        read_workers: int = 4,
+        max_pending: int = 64,
+        timeout: Optional[float] = None,
+    ):
+        self.db_path = db_path or ownership_layer.DB_PATH
+        self.max_pending = max_pending
+        self.timeout = timeout
+
+        self._readers = ConnectionManager(self.db_path, read_only=True)
+        self._writer = ConnectionManager(self.db_path)
+        self._read_pool = ThreadPoolExecutor(read_workers, thread_name_prefix="sar-read")
+        self._write_pool = ThreadPoolExecutor(1, thread_name_prefix="sar-write")
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _finished(self, _future):
+        with self._pending_lock:
+            self._pending -= 1
+
+    async def _submit(
+        self, pool: ThreadPoolExecutor, fn: Callable[..., Any], timeout: Optional[float], *args,
+        write: bool = False,
+    ):
+        with self._pending_lock:
+            if self._pending >= self.max_pending:
+                raise ServiceOverloaded(f"{self._pending} SAR requests already pending")
+            self._pending += 1
+
+        if timeout is None:
+            timeout = self.timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        def run():
+            # Still queued when the deadline passed: don't start the work.
+            if deadline is not None and time.monotonic() > deadline:
+                raise asyncio.TimeoutError("SAR request expired in the queue")
+            return fn(*args)
+
+        try:
+            work = pool.submit(run)
+        except BaseException:
+            self._finished(None)
+            raise
+        # Released when the thread is done with it, not when the caller gives up
+        work.add_done_callback(self._finished)
+        future = asyncio.wrap_future(work)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            # cancel() only succeeds while the work is still queued
+            if work.cancel() or not write:
+                raise
+            # A deletion that already started commits anyway: wait for it
+            return await future
+
+    # ---- reads ----
+    def _access(self, user_id: int, ctx: Context):
+        return ownership_layer.sar_access_with_policies(user_id, ctx, conn=self._readers.connection())
+
+    async def sar_access(self, user_id: int, ctx: Context, timeout: Optional[float] = None):
+        return await self._submit(self._read_pool, self._access, timeout, user_id, ctx)
+
+    # ---- writes (serialized on the single writer thread) ----
+    def _delete(self, user_id: int, ctx: Context):
+        ownership_layer.sar_delete_with_policies(user_id, ctx, conn=self._writer.connection())
+
+    def _delete_many(self, user_ids, ctx: Context):
+        return ownership_layer.sar_delete_many_with_policies(user_ids, ctx, conn=self._writer.connection())
+
+    async def sar_delete(self, user_id: int, ctx: Context, timeout: Optional[float] = None):
+        return await self._submit(self._write_pool, self._delete, timeout, user_id, ctx, write=True)
+
+    async def sar_delete_many(
+        self, user_ids: Iterable[int], ctx: Context, timeout: Optional[float] = None
+    ) -> Dict[int, Dict[str, int]]:
+        return await self._submit(self._write_pool, self._delete_many, timeout, list(user_ids), ctx, write=True)
+
+    def close(self):
+        """Wait for running requests, then close the pools and their connections."""
+        self._read_pool.shutdown(wait=True)
+        self._write_pool.shutdown(wait=True)
+        self._readers.close_all()
+        self._writer.close_all()
+
+
+# ---- Module-level front end over a default service for DB_PATH ----
+_service: Optional[SARService] = None
+
+
+def get_service() -> SARService:
+    global _service
+    if _service is None or _service.db_path != ownership_layer.DB_PATH:
+        if _service is not None:
+            _service.close()
+        _service = SARService(ownership_layer.DB_PATH)
+    return _service
+
+
+async def async_sar_access(user_id: int, ctx: Context, timeout: Optional[float] = None):
+    return await get_service().sar_access(user_id, ctx, timeout)
+
+
+async def async_sar_delete(user_id: int, ctx: Context, timeout: Optional[float] = None):
+    return await get_service().sar_delete(user_id, ctx, timeout)
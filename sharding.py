@@ -0,0 +1,314 @@
+# sharding.py
+#
+# Optional sharded storage: the owned tables (projects, tasks,
+# profile_notes, login_events) live in N SQLite shard files, routed by the
+# owning user's id; the shared tables (users, project_members) stay in the
+# global file. Each connection is the global file with exactly one shard
+# ATTACHed, so the unqualified SQL in ownership_layer runs against it
+# unchanged: get_all_data_for / delete_all_data_for on a subject read and
+# write the global file plus that subject's shard only, and writers on
+# different shards hold different file locks.
+#
+# Routing needs no directory. A user's shard is user_id % N, and ids of
+# projects, tasks, notes and events are allocated per shard so that
+# id % N is the shard holding the row: a task's shard follows from its
+# project_id, like a project's from its owner. Each shard file hands out
+# its ids from an id_sequence table, bumped in the inserting transaction,
+# so writers in other processes never get the same id and deleted ids are
+# never reused.
+#
+#   store = ShardedStore("example.db", shards=8)
+#   store.create()
+#   pid = store.add_project(owner_id, "Thesis")
+#   bundle = store.get_all_data_for(owner_id)
+#
+# Not supported on a sharded store: ownership index, change tracking and
+# tombstones (their triggers and tables assume one file), and moving a
+# project to an owner on another shard. With WAL, a commit is atomic per
+# file, not across files, so no write here commits to both files at once:
+# erasure commits table by table in foreign-key order (see
+# delete_all_data_for) and can be re-run after a failure.
+
+import itertools
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+import init_db
+import ownership_layer
+from config import POLICY_CONFIG
+from db import DEFAULT_DB_PATH, DEFAULT_PRAGMAS, ConnectionManager
+from retention import retention_index_columns
+
+# Same tables as init_db, split by file. Foreign keys can't cross files, so
+# only the ones between tables of the same file are kept.
+GLOBAL_SQL = """
+CREATE TABLE users (
+    id      INTEGER PRIMARY KEY,
+    email   TEXT NOT NULL UNIQUE,
+    name    TEXT NOT NULL
+);
+
+CREATE TABLE project_members (
+    project_id INTEGER NOT NULL,             -- projects.id, in shard project_id % N
+    user_id    INTEGER NOT NULL,
+    role       TEXT NOT NULL,
+    PRIMARY KEY (project_id, user_id),
+    FOREIGN KEY (user_id) REFERENCES users(id)
+);
+"""
+
+SHARD_SQL = """
+CREATE TABLE projects (
+    id        INTEGER PRIMARY KEY,
+    owner_id  INTEGER NOT NULL,             -- users.id, in the global file
+    title     TEXT NOT NULL
+);
+
+CREATE TABLE tasks (
+    id         INTEGER PRIMARY KEY,
+    project_id INTEGER NOT NULL,
+    title      TEXT NOT NULL,
+    done       INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (project_id) REFERENCES projects(id)
+);
+
+CREATE TABLE profile_notes (
+    id      INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    note    TEXT NOT NULL
+);
+
+CREATE TABLE login_events (
+    id      INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    ts      TEXT NOT NULL,
+    ip      TEXT
+);
+
+CREATE TABLE id_sequence (
+    tbl     TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL                -- highest id handed out, = shard (mod N)
+);
+"""
+
+GLOBAL_TABLES = ("users", "project_members")
+SHARDED_TABLES = ("projects", "tasks", "profile_notes", "login_events")
+
+DEFAULT_SHARDS = 4
+
+# Pragmas that are per database file, so they are repeated for the attached shard
+_SCHEMA_PRAGMAS = ("journal_mode", "synchronous", "cache_size", "mmap_size")
+
+# Writers on the global file wait for each other instead of failing with
+# "database is locked"
+SHARD_PRAGMAS = dict(DEFAULT_PRAGMAS, busy_timeout=10000)
+
+
+class ShardConnectionManager(ConnectionManager):
+    """Per-thread connections to the global file with one shard attached as `shard`."""
+
+    def __init__(self, global_path: str, shard_path: str, **kwargs):
+        super().__init__(global_path, **kwargs)
+        self.shard_path = shard_path
+
+    def _open(self) -> sqlite3.Connection:
+        conn = super()._open()
+        conn.execute("ATTACH DATABASE ? AS shard", (self.shard_path,))
+        for name in _SCHEMA_PRAGMAS:
+            if name in self.pragmas and not (self.read_only and name == "journal_mode"):
+                conn.execute(f"PRAGMA shard.{name} = {self.pragmas[name]}")
+        return conn
+
+
+def _create_indexes(conn: sqlite3.Connection, tables) -> List[str]:
+    """init_db's ownership / foreign-key / retention indexes, for the tables of one file."""
+    created = []
+    wanted = (
+        init_db.ownership_columns(POLICY_CONFIG)
+        + init_db.foreign_key_columns(conn)
+        + retention_index_columns()
+    )
+    for table, column in wanted:
+        if table not in tables or init_db._is_indexed(conn, table, column):
+            continue
+        name = f"idx_{table}_{column}"
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({column})")
+        created.append(name)
+    return created
+
+
+class ShardedStore:
+    """
+    The global file `path` plus `shards` shard files next to it
+    (example.db -> example.shard0.db, ...). Writes to a shard are also
+    serialized per shard inside the process, and writes to the global file
+    under one global lock (always taken after the shard's).
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, shards: int = DEFAULT_SHARDS, pragmas=None):
+        if shards < 1:
+            raise ValueError("a sharded store needs at least one shard")
+        root, ext = os.path.splitext(path)
+        self.path = path
+        self.shards = shards
+        self.shard_paths = [f"{root}.shard{i}{ext or '.db'}" for i in range(shards)]
+        self.pragmas = dict(SHARD_PRAGMAS if pragmas is None else pragmas)
+
+        self._managers = [
+            ShardConnectionManager(path, shard_path, pragmas=self.pragmas)
+            for shard_path in self.shard_paths
+        ]
+        self._shard_locks = [threading.Lock() for _ in range(shards)]
+        self._global_lock = threading.Lock()
+
+    # ---- routing ----
+    def shard_of(self, user_id: int) -> int:
+        """Shard holding user_id's projects, notes and events."""
+        return user_id % self.shards
+
+    def shard_of_row(self, row_id: int) -> int:
+        """Shard holding the project / task / note / event with this id."""
+        return row_id % self.shards
+
+    def connection(self, shard: int) -> sqlite3.Connection:
+        """This thread's connection to the global file with `shard` attached."""
+        return self._managers[shard].connection()
+
+    def connection_for(self, user_id: int) -> sqlite3.Connection:
+        return self.connection(self.shard_of(user_id))
+
+    @contextmanager
+    def writing(self, shard: int, global_too: bool = False) -> Iterator[sqlite3.Connection]:
+        """Hold `shard`'s write lock (and the global one) around a write; commits on success."""
+        with self._shard_locks[shard]:
+            if global_too:
+                self._global_lock.acquire()
+            conn = self.connection(shard)
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                if global_too:
+                    self._global_lock.release()
+
+    # ---- schema ----
+    def create(self):
+        """Create fresh global and shard files (replacing existing ones) with schema and indexes."""
+        self.close()
+        for path in [self.path] + self.shard_paths:
+            for f in (path, path + "-wal", path + "-shm"):
+                if os.path.exists(f):
+                    os.remove(f)
+
+        for path, sql, tables in [(self.path, GLOBAL_SQL, GLOBAL_TABLES)] + [
+            (p, SHARD_SQL, SHARDED_TABLES) for p in self.shard_paths
+        ]:
+            conn = sqlite3.connect(path)
+            conn.executescript(sql)
+            _create_indexes(conn, tables)
+            conn.commit()
+            conn.close()
+        for shard, path in enumerate(self.shard_paths):
+            conn = sqlite3.connect(path)
+            conn.executemany(
+                "INSERT INTO id_sequence (tbl, last_id) VALUES (?, ?)",
+                ((table, shard) for table in SHARDED_TABLES),
+            )
+            conn.commit()
+            conn.close()
+
+        # The SAR queries must search indexes on every routed connection
+        init_db.check_sar_query_plans(self.connection(0))
+
+    def close(self):
+        for manager in self._managers:
+            manager.close_all()
+
+    # ---- writes ----
+    def _insert_sharded(
+        self, conn: sqlite3.Connection, shard: int, table: str, columns: str, values: tuple,
+        marks: Optional[str] = None,
+    ) -> int:
+        """
+        Insert with the next id in `shard`'s residue class (id % shards == shard),
+        taken from the shard's id_sequence in the same transaction.
+        """
+        if marks is None:
+            marks = ", ".join("?" * len(values))
+        (row_id,) = conn.execute(
+            "UPDATE shard.id_sequence SET last_id = last_id + ? WHERE tbl = ? RETURNING last_id",
+            (self.shards, table),
+        ).fetchone()
+        conn.execute(f"INSERT INTO shard.{table} (id, {columns}) VALUES (?, {marks})", (row_id,) + values)
+        return row_id
+
+    def add_user(self, user_id: int, email: str, name: str):
+        with self.writing(self.shard_of(user_id), global_too=True) as conn:
+            conn.execute("INSERT INTO users (id, email, name) VALUES (?, ?, ?)", (user_id, email, name))
+
+    def add_project(self, owner_id: int, title: str) -> int:
+        shard = self.shard_of(owner_id)
+        with self.writing(shard) as conn:
+            return self._insert_sharded(conn, shard, "projects", "owner_id, title", (owner_id, title))
+
+    def add_task(self, project_id: int, title: str, done: int = 0) -> int:
+        shard = self.shard_of_row(project_id)
+        with self.writing(shard) as conn:
+            return self._insert_sharded(conn, shard, "tasks", "project_id, title, done", (project_id, title, done))
+
+    def add_profile_note(self, user_id: int, note: str) -> int:
+        shard = self.shard_of(user_id)
+        with self.writing(shard) as conn:
+            return self._insert_sharded(conn, shard, "profile_notes", "user_id, note", (user_id, note))
+
+    def add_login_event(self, user_id: int, ip: Optional[str] = None) -> int:
+        shard = self.shard_of(user_id)
+        with self.writing(shard) as conn:
+            return self._insert_sharded(
+                conn, shard, "login_events", "user_id, ts, ip", (user_id, ip), marks="?, datetime('now'), ?"
+            )
+
+    def add_project_member(self, project_id: int, user_id: int, role: str = "viewer"):
+        with self.writing(self.shard_of_row(project_id), global_too=True) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO project_members (project_id, user_id, role) VALUES (?, ?, ?)",
+                (project_id, user_id, role),
+            )
+
+    # ---- SAR ----
+    def get_all_data_for(self, user_id: int) -> Dict[str, List[dict]]:
+        """ownership_layer.get_all_data_for over the global file and user_id's shard."""
+        return ownership_layer.get_all_data_for(user_id, self.connection_for(user_id), use_index=False)
+
+    def sar_access_with_policies(self, user_id: int, ctx):
+        return ownership_layer.sar_access_with_policies(
+            user_id, ctx, self.connection_for(user_id), use_index=False
+        )
+
+    def delete_all_data_for(self, user_id: int):
+        """
+        ownership_layer's SAR deletion, writing only user_id's shard and the
+        global file. The DELETEs run children first and commit whenever the
+        next table lives in the other file, so every commit touches one file.
+        A failure part-way leaves only rows still reachable from the
+        subject's users row, and calling this again finishes the erasure.
+        """
+        shard = self.shard_of(user_id)
+        with self._shard_locks[shard], self._global_lock:
+            conn = self.connection(shard)
+            conn.execute("PRAGMA foreign_keys = ON")
+            order = ownership_layer.OWNERSHIP_PLAN.deletion_order()
+            for _, plans in itertools.groupby(order, key=lambda plan: plan.table in GLOBAL_TABLES):
+                try:
+                    for plan in plans:
+                        conn.execute(plan.delete_sql(), {"subject": user_id})
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
@@ -0,0 +1,200 @@
+# synthetic_data.py
+#
+# Reproducible synthetic dataset for load testing: N users, projects with
+# Zipf-skewed task counts (a few huge projects, a long tail of small ones),
+# memberships, profile notes and login events. Rows are generated lazily and
+# written with executemany inside a single transaction, so millions of rows
+# load in seconds. The same seed always produces the same database.
+#
+#   python synthetic_data.py --db load.db --users 100000
+#   python synthetic_data.py --db load.db --users 20000 --tasks-per-project 50 --zipf 1.2 --seed 7
+
+import argparse
+import contextlib
+import io
+import random
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Tuple
+
+import init_db
+
+
+@dataclass(frozen=True)
+class SyntheticSpec:
+    users: int = 10000
+    projects_per_user: float = 0.5     # projects = users * projects_per_user
+    tasks_per_project: float = 20.0    # mean; the spread follows a Zipf law
+    zipf: float = 1.1                  # skew exponent; 0 gives every project the same count
+    members_per_project: int = 3       # mean; uniform in [0, 2 * mean]
+    notes_per_user: int = 2            # mean; uniform in [0, 2 * mean]
+    events_per_user: int = 5           # mean; uniform in [0, 2 * mean]
+    seed: int = 593
+
+    @property
+    def projects(self) -> int:
+        return max(1, int(self.users * self.projects_per_user))
+
+
+# Login events are spread over this window before EVENT_EPOCH
+EVENT_EPOCH = int(datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp())
+EVENT_WINDOW_SECONDS = 365 * 24 * 3600
+
+
+def zipf_counts(n: int, mean: float, s: float, rng: random.Random) -> List[int]:
+    """
+    n counts averaging `mean`, where the k-th largest is proportional to
+    1 / k**s, handed out to positions in random order.
+    """
+    weights = [1.0 / (k ** s) for k in range(1, n + 1)]
+    scale = n * mean / sum(weights)
+    counts = [int(round(w * scale)) for w in weights]
+    rng.shuffle(counts)
+    return counts
+
+
+# Row generators draw with rng.random() rather than randint/randrange:
+# it is several times cheaper and dominates generation time otherwise.
+def _spread(n: int, mean: int, rng: random.Random) -> Iterator[int]:
+    r = rng.random
+    width = 2 * mean + 1
+    for _ in range(n):
+        yield int(r() * width)
+
+
+def _users(spec: SyntheticSpec) -> Iterator[Tuple]:
+    for uid in range(1, spec.users + 1):
+        yield uid, f"user{uid}@example.com", f"User {uid}"
+
+
+def _owners(spec: SyntheticSpec, rng: random.Random) -> List[int]:
+    r = rng.random
+    return [int(r() * spec.users) + 1 for _ in range(spec.projects)]
+
+
+def _projects(owners: List[int]) -> Iterator[Tuple]:
+    for pid, owner in enumerate(owners, 1):
+        yield pid, owner, f"Project {pid}"
+
+
+def _members(spec: SyntheticSpec, owners: List[int], rng: random.Random) -> Iterator[Tuple]:
+    r = rng.random
+    for pid, (owner, n) in enumerate(zip(owners, _spread(spec.projects, spec.members_per_project, rng)), 1):
+        picked = {int(r() * spec.users) + 1 for _ in range(n)}
+        picked.discard(owner)
+        for uid in sorted(picked):
+            yield pid, uid, "editor" if uid % 2 else "viewer"
+
+
+def _tasks(task_counts: List[int]) -> Iterator[Tuple]:
+    for pid, n in enumerate(task_counts, 1):
+        for i in range(n):
+            yield pid, f"Task {i + 1}", i % 3 == 0
+
+
+def _notes(spec: SyntheticSpec, rng: random.Random) -> Iterator[Tuple]:
+    for uid, n in enumerate(_spread(spec.users, spec.notes_per_user, rng), 1):
+        for i in range(n):
+            yield uid, f"Note {i + 1} for user {uid}"
+
+
+def _events(spec: SyntheticSpec, rng: random.Random) -> Iterator[Tuple]:
+    # ts is bound as unix seconds and formatted by SQLite (see generate)
+    r = rng.random
+    for uid, n in enumerate(_spread(spec.users, spec.events_per_user, rng), 1):
+        for _ in range(n):
+            ip = int(r() * (1 << 24))
+            yield uid, EVENT_EPOCH - int(r() * EVENT_WINDOW_SECONDS), f"10.{ip >> 16}.{(ip >> 8) & 255}.{ip & 255}"
+
+
+def generate(db_path: str, spec: SyntheticSpec = SyntheticSpec()) -> Dict[str, int]:
+    """
+    Recreate `db_path` (schema from init_db) and fill it per `spec`.
+    Returns the number of rows written per table.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_db.init_db(db_path)
+
+    # Separate generators per table, so changing one table's spec does not
+    # reshuffle the others.
+    rng = {name: random.Random(f"{spec.seed}:{name}") for name in
+           ("projects", "tasks", "members", "notes", "events")}
+
+    # Owners are drawn up front: memberships need them to skip the owner
+    owners = _owners(spec, rng["projects"])
+    task_counts = zipf_counts(spec.projects, spec.tasks_per_project, spec.zipf, rng["tasks"])
+
+    inserts = [
+        ("users", "INSERT INTO users (id, email, name) VALUES (?, ?, ?)", _users(spec)),
+        ("projects", "INSERT INTO projects (id, owner_id, title) VALUES (?, ?, ?)",
+         _projects(owners)),
+        ("project_members", "INSERT INTO project_members (project_id, user_id, role) VALUES (?, ?, ?)",
+         _members(spec, owners, rng["members"])),
+        ("tasks", "INSERT INTO tasks (project_id, title, done) VALUES (?, ?, ?)", _tasks(task_counts)),
+        ("profile_notes", "INSERT INTO profile_notes (user_id, note) VALUES (?, ?)", _notes(spec, rng["notes"])),
+        ("login_events", "INSERT INTO login_events (user_id, ts, ip) VALUES (?, datetime(?, 'unixepoch'), ?)",
+         _events(spec, rng["events"])),
+    ]
+
+    conn = sqlite3.connect(db_path)
+    # Bulk load: the rows are consistent by construction, and a crash just
+    # means regenerating, so skip per-row FK checks and fsyncs.
+    conn.execute("PRAGMA foreign_keys = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA cache_size = -262144")
+    counts = {}
+    try:
+        with conn:
+            # Building the ownership indexes once after the load is much
+            # cheaper than maintaining them through millions of random inserts
+            indexes = conn.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx\\_%' ESCAPE '\\'"
+            ).fetchall()
+            for name, _ in indexes:
+                conn.execute(f"DROP INDEX {name}")
+            for table, sql, rows in inserts:
+                counts[table] = conn.executemany(sql, rows).rowcount
+            for _, sql in indexes:
+                conn.execute(sql)
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a reproducible synthetic dataset")
+    parser.add_argument("--db", required=True, help="database file to (re)create")
+    parser.add_argument("--users", type=int, default=SyntheticSpec.users)
+    parser.add_argument("--projects-per-user", type=float, default=SyntheticSpec.projects_per_user)
+    parser.add_argument("--tasks-per-project", type=float, default=SyntheticSpec.tasks_per_project)
+    parser.add_argument("--zipf", type=float, default=SyntheticSpec.zipf)
+    parser.add_argument("--members-per-project", type=int, default=SyntheticSpec.members_per_project)
+    parser.add_argument("--notes-per-user", type=int, default=SyntheticSpec.notes_per_user)
+    parser.add_argument("--events-per-user", type=int, default=SyntheticSpec.events_per_user)
+    parser.add_argument("--seed", type=int, default=SyntheticSpec.seed)
+    args = parser.parse_args()
+
+    spec = SyntheticSpec(
+        users=args.users,
+        projects_per_user=args.projects_per_user,
+        tasks_per_project=args.tasks_per_project,
+        zipf=args.zipf,
+        members_per_project=args.members_per_project,
+        notes_per_user=args.notes_per_user,
+        events_per_user=args.events_per_user,
+        seed=args.seed,
+    )
+    start = time.perf_counter()
+    counts = generate(args.db, spec)
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    for table, n in counts.items():
+        print(f"{table:<16} {n:>12,}")
+    print(f"{'total':<16} {total:>12,} rows in {elapsed:.2f}s ({total / elapsed:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+# tombstones.py
+#
+# Deferred (tombstone-then-purge) SAR deletion. A deletion request only
+# records a tombstone for the subject: one small write, committed at once.
+# While a tombstone is pending, the SAR and view paths in ownership_layer
+# hide every row any of whose owners is tombstoned. A purger then erases
+# the subject's rows table by table in chunks of `batch_size`, each its own
+# short transaction, and stamps the tombstone purged. Tombstones are
+# purged in deadline order, and a tombstone past its deadline is purged in
+# full whatever the time budget, which bounds how long erasure can take.
+
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import change_tracking
+import metrics
+from background import BackgroundWorker
+from ownership_graph import ONE_SUBJECT, OwnershipPlan, TablePlan
+
+TOMBSTONE_TABLE = "sar_tombstones"
+
+TOMBSTONE_DDL = f"""
+CREATE TABLE IF NOT EXISTS {TOMBSTONE_TABLE} (
+    user_id      INTEGER PRIMARY KEY,
+    requested_at TEXT    NOT NULL DEFAULT (datetime('now')),
+    deadline     TEXT    NOT NULL,       -- erasure is complete by this time
+    purged_at    TEXT,                   -- NULL while rows remain
+    rows_purged  INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_{TOMBSTONE_TABLE}_pending
+    ON {TOMBSTONE_TABLE} (deadline) WHERE purged_at IS NULL;
+"""
+
+# Subjects whose rows are hidden: tombstoned and not purged yet
+PENDING_SQL = f"SELECT user_id FROM {TOMBSTONE_TABLE} WHERE purged_at IS NULL"
+
+# How long a tombstoned subject's rows may survive by default
+PURGE_DEADLINE_SECONDS = 3600
+
+# Rows deleted per chunk (and per write transaction) by the purger
+PURGE_BATCH_SIZE = 500
+
+
+def ensure_schema(conn: sqlite3.Connection):
+    conn.executescript(TOMBSTONE_DDL)
+
+
+def visible_select_sql(plan: TablePlan) -> str:
+    """plan.select_sql() without rows that any of their owners has tombstoned."""
+    hidden = " OR ".join(f"{path.owner_expr(plan.table)} IN ({PENDING_SQL})" for path in plan.paths)
+    return f"SELECT * FROM {plan.table} WHERE ({plan.where()}) AND NOT ({hidden})"
+
+
+def chunk_delete_sql(plan: TablePlan) -> str:
+    """DELETE of at most :limit of the subject's rows in plan.table."""
+    return (
+        f"DELETE FROM {plan.table} WHERE rowid IN ("
+        f"SELECT rowid FROM {plan.table} WHERE {plan.where(ONE_SUBJECT)} LIMIT :limit)"
+    )
+
+
+def has_pending(conn: sqlite3.Connection) -> bool:
+    """True if any tombstone still awaits its purge (False before the table exists)."""
+    try:
+        return conn.execute(
+            f"SELECT 1 FROM {TOMBSTONE_TABLE} WHERE purged_at IS NULL LIMIT 1"
+        ).fetchone() is not None
+    except sqlite3.OperationalError:
+        return False
+
+
+def is_pending(conn: sqlite3.Connection, user_id: int) -> bool:
+    try:
+        return conn.execute(
+            f"SELECT 1 FROM {TOMBSTONE_TABLE} WHERE user_id = ? AND purged_at IS NULL", (user_id,)
+        ).fetchone() is not None
+    except sqlite3.OperationalError:
+        return False
+
+
+def tombstone(conn: sqlite3.Connection, user_ids: List[int], deadline_seconds: float = PURGE_DEADLINE_SECONDS) -> int:
+    """
+    Tombstone `user_ids` (pending ones keep their deadline; purged ones are
+    tombstoned afresh). Returns how many new tombstones were written.
+    """
+    ensure_schema(conn)
+    deadline = f"+{int(deadline_seconds)} seconds"
+    cur = conn.executemany(
+        f"INSERT INTO {TOMBSTONE_TABLE} (user_id, deadline) VALUES (?, datetime('now', ?)) "
+        f"ON CONFLICT (user_id) DO UPDATE SET "
+        f"requested_at = datetime('now'), deadline = excluded.deadline, purged_at = NULL, rows_purged = 0 "
+        f"WHERE purged_at IS NOT NULL",
+        ((uid, deadline) for uid in user_ids),
+    )
+    conn.commit()
+    if metrics.ENABLED:
+        metrics.inc("tombstones_created_total", cur.rowcount)
+    return cur.rowcount
+
+
+def status(conn: sqlite3.Connection, user_id: int) -> Dict[str, Any]:
+    """
+    Deletion status of `user_id`:
+      {"state": "none" | "pending" | "purged", "requested_at", "deadline",
+       "purged_at", "rows_purged", "overdue": pending past its deadline}
+    """
+    try:
+        row = conn.execute(
+            f"SELECT requested_at, deadline, purged_at, rows_purged, "
+            f"purged_at IS NULL AND deadline <= datetime('now') "
+            f"FROM {TOMBSTONE_TABLE} WHERE user_id = ?",
+            (user_id,),
+        ).fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    if row is None:
+        return {"state": "none"}
+    requested_at, deadline, purged_at, rows_purged, overdue = row
+    return {
+        "state": "pending" if purged_at is None else "purged",
+        "requested_at": requested_at,
+        "deadline": deadline,
+        "purged_at": purged_at,
+        "rows_purged": rows_purged,
+        "overdue": bool(overdue),
+    }
+
+
+@dataclass
+class PurgeReport:
+    purged: List[int] = field(default_factory=list)        # subjects fully erased this pass
+    rows: Dict[str, int] = field(default_factory=dict)     # table -> rows deleted
+    chunks: int = 0
+    seconds: float = 0.0
+    remaining: int = 0    # tombstones still pending afterwards
+    error: Optional[str] = None    # why the pass failed (rolled back, retried next interval)
+
+
+def purge(
+    conn: sqlite3.Connection,
+    graph: OwnershipPlan,
+    batch_size: int = PURGE_BATCH_SIZE,
+    budget: Optional[float] = None,
+    pause: float = 0.0,
+    stop: Optional[threading.Event] = None,
+) -> PurgeReport:
+    """
+    Erase pending tombstoned subjects, earliest deadline first, in chunks.
+    Stops starting new chunks after `budget` seconds or once `stop` is set,
+    except while the current subject is past its deadline.
+    """
+    report = PurgeReport()
+    start = time.perf_counter()
+    order = graph.deletion_order()
+    deletes = [(plan.table, chunk_delete_sql(plan)) for plan in order]
+    tracking = change_tracking.is_enabled(conn)
+
+    def out_of_time() -> bool:
+        return (
+            (budget is not None and time.perf_counter() - start >= budget)
+            or (stop is not None and stop.is_set())
+        )
+
+    pending = conn.execute(
+        f"SELECT user_id, deadline <= datetime('now') FROM {TOMBSTONE_TABLE} "
+        f"WHERE purged_at IS NULL ORDER BY deadline"
+    ).fetchall()
+    conn.commit()
+
+    for user_id, overdue in pending:
+        if out_of_time() and not overdue:
+            break
+        params = {"subject": user_id, "limit": batch_size}
+        deleted = 0
+        finished = True
+        for table, sql in deletes:
+            while True:
+                if out_of_time() and not overdue:
+                    finished = False
+                    break
+                with metrics.timer("tombstone_chunk_seconds", table=table):
+                    n = conn.execute(sql, params).rowcount
+                    conn.execute(
+                        f"UPDATE {TOMBSTONE_TABLE} SET rows_purged = rows_purged + ? WHERE user_id = ?",
+                        (n, user_id),
+                    )
+                    conn.commit()
+                report.chunks += 1
+                deleted += n
+                if n:
+                    report.rows[table] = report.rows.get(table, 0) + n
+                    if metrics.ENABLED:
+                        metrics.inc("tombstone_rows_purged_total", n, table=table)
+                if n < batch_size:
+                    break
+                if pause:
+                    time.sleep(pause)
+            if not finished:
+                break
+        if not finished:
+            break
+
+        if tracking:
+            conn.execute(change_tracking.forget_subject_sql(ONE_SUBJECT), params)
+        conn.execute(
+            f"UPDATE {TOMBSTONE_TABLE} SET purged_at = datetime('now') WHERE user_id = ?", (user_id,)
+        )
+        conn.commit()
+        report.purged.append(user_id)
+        if metrics.ENABLED:
+            metrics.inc("tombstones_purged_total", overdue=bool(overdue))
+
+    report.remaining = conn.execute(
+        f"SELECT COUNT(*) FROM {TOMBSTONE_TABLE} WHERE purged_at IS NULL"
+    ).fetchone()[0]
+    conn.commit()
+    report.seconds = time.perf_counter() - start
+    metrics.observe("tombstone_purge_seconds", report.seconds)
+    return report
+
+
+class TombstonePurger(BackgroundWorker):
+    """
+    Background thread calling ownership_layer.purge_tombstoned every
+    `interval` seconds on its own connection to `db_path` (default:
+    ownership_layer.DB_PATH). With interval well under the deadline given to
+    tombstone(), every subject is erased by its deadline. `on_report` is
+    called with each PurgeReport; the latest is kept in `last_report`. A
+    pass that fails is rolled back and retried next interval (see
+    background.BackgroundWorker).
+    """
+
+    name = "tombstone-purger"
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        interval: float = 1.0,
+        batch_size: int = PURGE_BATCH_SIZE,
+        budget: Optional[float] = 0.5,
+        pause: float = 0.01,
+        on_report=None,
+    ):
+        import ownership_layer
+
+        self._ownership_layer = ownership_layer
+        super().__init__(db_path or ownership_layer.DB_PATH, interval, on_report)
+        self.batch_size = batch_size
+        self.budget = budget
+        self.pause = pause
+
+    def _pass(self, conn: sqlite3.Connection) -> PurgeReport:
+        return self._ownership_layer.purge_tombstoned(
+            conn, self.batch_size, self.budget, self.pause, self._stop,
+        )
+
+    def _failed_report(self, error: str) -> PurgeReport:
+        return PurgeReport(error=error)